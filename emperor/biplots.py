@@ -6,13 +6,53 @@
 # The full license is in the file LICENSE.md, distributed with this software.
 # ----------------------------------------------------------------------------
 from __future__ import division
-from numpy import argsort, array
 
-from emperor.util import EmperorUnsupportedComputation
+from future.utils import string_types
+from numpy import arange, asarray, concatenate, lexsort, partition, shape
+from scipy.sparse import issparse
+
+from emperor.util import EmperorUnsupportedComputation, iter_row_chunks
 from emperor.sort import sort_taxa_table_by_pcoa_coords
-from emperor.qiime_backports.biplots import (get_taxa_prevalence,
-                                             get_taxa_coords,
-                                             make_biplot_scores_output)
+from emperor.qiime_backports.biplots import (_normalize_samples,
+                                             _project_taxa, _row_sums,
+                                             _scale_prevalence)
+
+
+def _most_prevalent(prevalence, N=0):
+    """Indices of the N most prevalent elements, in decreasing prevalence
+
+    Parameters
+    ----------
+    prevalence : np.ndarray
+         vector with the prevalence of each element
+    N : int, optional
+         number of indices to retrieve, if zero is passed or N is greater
+         than the number of elements, all the indices are retrieved
+
+    Returns
+    -------
+    np.ndarray
+         indices of the N most prevalent elements
+
+    Notes
+    -----
+    Only the N selected elements are sorted, the rest of the vector is
+    partitioned with ``np.partition``. Ties are broken by decreasing index,
+    as in a reversed stable sort of the whole vector, so the result for any
+    N is the beginning of the result for ``N=0``.
+    """
+    prevalence = asarray(prevalence)
+    indices = arange(len(prevalence))
+
+    if 0 < N < len(prevalence):
+        # keep the elements above the cutoff, and the ones tied with it that
+        # have the largest indices
+        cutoff = partition(prevalence, -N)[-N]
+        above = indices[prevalence > cutoff]
+        tied = indices[prevalence == cutoff]
+        indices = concatenate((above, tied[len(above) - N:]))
+
+    return indices[lexsort((-indices, -prevalence[indices]))]
 
 
 def extract_taxa_data(otu_coords, otu_table, lineages, prevalence, N=0):
@@ -50,13 +90,9 @@ def extract_taxa_data(otu_coords, otu_table, lineages, prevalence, N=0):
     Based on qiime.biplots.remove_rare_taxa; though this function opperates on
     generic data that's not in dict forma and returns the appropriate result.
     """
-    # If less than zero or greater than length of taxa, N = fix to max
-    if N <= 0 or N > len(prevalence):
-        N = len(prevalence)
-
-    # get the first N indices to keep from all of the taxa data
-    indices = argsort(prevalence)
-    indices = indices[::-1][:N]
+    # keep the N most prevalent taxa, if N is less than zero or greater than
+    # the number of taxa, all the taxa are kept
+    indices = _most_prevalent(prevalence, N)
 
     # remove the indices that are not needed and return them individually
     out_otu_coords = otu_coords[indices, :]
@@ -73,15 +109,17 @@ def preprocess_otu_table(otu_sample_ids, otu_table, lineages,
 
     Parameters
     ----------
-    otu_sample_ids : array_like
-         sample identifiers for the otu_table
-    otu_table : array_like
-         contingency table
+    otu_sample_ids : array_like or None
+         sample identifiers for the otu_table. When otu_table is a
+         ``biom.Table`` the table's identifiers are used, and this argument
+         can be ``None``
+    otu_table : array_like, scipy.sparse matrix or biom.Table
+         contingency table, sparse tables are never densified
     lineages : list, str
          taxonomic assignments for the OTUs in the otu_table
     coords_data : array_like
          principal coordinates data where the taxa will be mapped
-    coords_data : array_like
+    coords_headers : array_like
          principal coordinates data where the taxa will be mapped
     N : int, optional
          number of most prevalent taxa to keep, by default will use all
@@ -90,8 +128,9 @@ def preprocess_otu_table(otu_sample_ids, otu_table, lineages,
     -------
     otu_coords : np.ndarray
          coordinates representing the N most prevalent taxa in otu_table
-    otu_table : np.ndarray
-         N most prevalent OTUs from the input otu_table
+    otu_table : np.ndarray or scipy.sparse.csr_matrix
+         N most prevalent OTUs from the input otu_table, sparse if the input
+         table was sparse
     otu_lineages : np.ndarray
          taxonomic assignments corresponding to the N most prevalent
          OTUs
@@ -105,14 +144,31 @@ def preprocess_otu_table(otu_sample_ids, otu_table, lineages,
     ------
     EmperorUnsupportedComputation
         If the contingency table contains one or fewer rows.
+    ValueError
+        If otu_table is a ``biom.Table`` and otu_sample_ids is not ``None``
+        nor equal to the table's sample identifiers.
+
+    Notes
+    -----
+    Sparse and ``biom.Table`` inputs are normalized with sparse row and
+    column scalings and projected with a single sparse-dense product, the
+    results match the ones computed from the equivalent dense table.
     """
+    # biom.Table objects carry their own sample identifiers
+    if hasattr(otu_table, 'matrix_data'):
+        table_ids = list(otu_table.ids(axis='sample'))
+        if otu_sample_ids is not None and list(otu_sample_ids) != table_ids:
+            raise ValueError('The sample identifiers do not match the ones in '
+                             'the table')
+        otu_sample_ids = table_ids
+        otu_table = otu_table.matrix_data
 
     # return empty values if any of the taxa data is empty
-    if (otu_sample_ids == []) or (otu_table == array([])) or (lineages == []):
+    if len(otu_sample_ids) == 0 or len(lineages) == 0:
         return [], [], [], [], ''
 
     # this means there's only one or fewer rows in the contingency table
-    if len(otu_table) <= 1 or len(lineages) <= 1:
+    if shape(otu_table)[0] <= 1 or len(lineages) <= 1:
         raise EmperorUnsupportedComputation(
             "Biplots are not supported for "
             "contingency tables with one or fewer rows")
@@ -132,14 +188,86 @@ def preprocess_otu_table(otu_sample_ids, otu_table, lineages,
         coords_headers,
         otu_table, otu_sample_ids)
 
-    # retrieve the prevalence and the coords prior the filtering
-    prevalence = get_taxa_prevalence(otu_table)
-    bi_plot_coords = get_taxa_coords(otu_table, coords_data)
+    # the normalizations and the row selection work on rows
+    if issparse(otu_table):
+        otu_table = otu_table.tocsr()
+
+    # the prevalence is computed for every taxon, but only the N most
+    # prevalent taxa are projected onto the coordinates
+    tax_ratios = _normalize_samples(otu_table)
+    prevalence = _scale_prevalence(_row_sums(tax_ratios))
+    indices = _most_prevalent(prevalence, N)
 
-    o_otu_coords, o_otu_table, o_otu_lineages, o_prevalence =\
-        extract_taxa_data(bi_plot_coords, otu_table, lineages, prevalence, N)
+    o_otu_coords = _project_taxa(tax_ratios[indices], coords_data)
+    o_otu_table = otu_table[indices]
+    o_otu_lineages = [lineages[index] for index in indices]
+    o_prevalence = prevalence[indices]
 
-    lines = '\n'.join(make_biplot_scores_output(
-        {'coord': o_otu_coords, 'lineages': o_otu_lineages}))
+    lines = ''.join(_biplot_scores_chunks(o_otu_coords, o_otu_lineages,
+                                          10000))[:-1]
 
     return o_otu_coords, o_otu_table, o_otu_lineages, o_prevalence, lines
+
+
+def write_biplot_scores(fp, otu_coords, lineages, chunk_size=10000):
+    """Write the biplot scores as a tab-separated table
+
+    Parameters
+    ----------
+    fp : file-like object or str
+        File opened in text mode, or path to the file where the scores will
+        be written.
+    otu_coords : array_like
+        Coordinates for each taxon, one row per taxon.
+    lineages : list, str
+        Taxonomic assignment for each row of ``otu_coords``.
+    chunk_size : int, optional
+        Number of taxa formatted at a time, the table is written to ``fp``
+        one group of rows after the other, and is never held in memory as a
+        single string.
+
+    Raises
+    ------
+    ValueError
+        If ``chunk_size`` is not a positive number.
+
+    Notes
+    -----
+    The table has the same layout as the lines created by
+    ``qiime_backports.biplots.make_biplot_scores_output``, but the values
+    are written with 12 significant digits (``'%.12g'``) and each line is
+    terminated by a newline.
+    """
+    if chunk_size < 1:
+        raise ValueError('The number of rows in a chunk should be positive')
+
+    if isinstance(fp, string_types):
+        with open(fp, 'w') as f:
+            return write_biplot_scores(f, otu_coords, lineages, chunk_size)
+
+    for chunk in _biplot_scores_chunks(otu_coords, lineages, chunk_size):
+        fp.write(chunk)
+
+
+def _biplot_scores_chunks(otu_coords, lineages, chunk_size):
+    """Format the biplot scores table, see ``write_biplot_scores``
+
+    Yields
+    ------
+    str
+        The header line, and then the lines for ``chunk_size`` taxa at a
+        time.
+    """
+    otu_coords = asarray(otu_coords, dtype=float)
+    dimensions = otu_coords.shape[1]
+
+    header = ['pc%d' % (i + 1) for i in range(dimensions)]
+    yield '#Taxon\t%s\n' % '\t'.join(header)
+
+    # a single format string per line, the values are formatted as numbers
+    # instead of calling str on each of them
+    line = '%s' + '\t%.12g' * dimensions + '\n'
+    for names, coords in zip(iter_row_chunks(lineages, chunk_size),
+                             iter_row_chunks(otu_coords, chunk_size)):
+        yield ''.join([line % ((name,) + tuple(row))
+                       for name, row in zip(names, coords.tolist())])
@@ -13,6 +13,13 @@ Classes
     :toctree: generated/
 
     Emperor
+
+Functions
+---------
+.. autosummary::
+    :toctree: generated/
+
+    set_template_bytecode_cache
 """
 # ----------------------------------------------------------------------------
 # Copyright (c) 2013--, emperor development team.
@@ -23,19 +30,24 @@ Classes
 # ----------------------------------------------------------------------------
 from __future__ import division
 
-from os.path import join, basename
+from os.path import join, basename, getmtime
 from distutils.dir_util import copy_tree
 import numpy as np
 import pandas as pd
 
-from jinja2 import FileSystemLoader
+from jinja2 import FileSystemLoader, FileSystemBytecodeCache
 from jinja2.environment import Environment
 from skbio import OrdinationResults
 
 from emperor import __version__ as emperor_version
+from emperor.qiime_backports.util import (_flip_vectors,
+                                          _compute_jn_pcoa_avg_ranges)
 from emperor.util import (get_emperor_support_files_dir,
                           preprocess_coords_file, resolve_stable_url,
-                          validate_and_process_custom_axes)
+                          validate_and_process_custom_axes,
+                          encode_float32_array, dictionary_encode_metadata,
+                          stringify_metadata, write_compressed_json,
+                          iter_row_chunks, json_chunks, strict_json_dumps)
 
 # we are going to use this remote location to load external resources
 REMOTE_URL = ('https://cdn.rawgit.com/biocore/emperor/%s/emperor'
@@ -52,6 +64,37 @@ STANDALONE_PATH = join(get_emperor_support_files_dir(), 'templates',
 JUPYTER_PATH = join(get_emperor_support_files_dir(), 'templates',
                     'jupyter-template.html')
 
+# compiled templates are shared by all Emperor objects, the keys are whether or
+# not the template is for a standalone plot, and the values are tuples with the
+# modification times of the template files and the template object
+_TEMPLATE_CACHE = {}
+_BYTECODE_CACHE = None
+
+
+def set_template_bytecode_cache(directory=None):
+    """Store the compiled Emperor templates on disk
+
+    Parameters
+    ----------
+    directory : str, optional
+        Directory where the compiled templates are written to and read from,
+        this lets separate Python processes skip the compilation step. If
+        ``None``, the templates are only cached in memory.
+
+    Notes
+    -----
+    Regardless of this setting, compiled templates are kept in memory and
+    reused by every ``Emperor`` object until the template files are modified.
+    """
+    global _BYTECODE_CACHE
+
+    if directory is None:
+        _BYTECODE_CACHE = None
+    else:
+        _BYTECODE_CACHE = FileSystemBytecodeCache(directory)
+
+    _TEMPLATE_CACHE.clear()
+
 
 class Emperor(object):
     """Display principal coordinates analysis plots
@@ -178,6 +221,11 @@ class Emperor(object):
     - ``True``" should be used if you intend to embed an Emperor plot in a
     notebook and then publish it using http://nbviewer.jupyter.org.
 
+    The processed coordinates and metadata are reused every time a plot is
+    displayed, unless the ``ordination``, ``jackknifed``, ``mf`` or
+    ``dimensions`` attributes are replaced. Changes made in-place to any of
+    these objects are not detected, hence they should be replaced instead.
+
     Raises
     ------
     ValueError
@@ -255,23 +303,54 @@ class Emperor(object):
                             'OrdinationResults instances.')
 
         master_ids = self.ordination.samples.index
-        master = set(self.ordination.samples.index)
+
+        # replicates usually share a few orderings, so the indexer to align
+        # each ordering with the *master* ordination is only computed once
+        indexers = {}
 
         aligned = []
 
         for i, ord_res in enumerate(self.jackknifed):
-            other = set(ord_res.samples.index)
-
-            # samples must be represented identically
-            if master != other:
-                raise ValueError('The ordination at index (%d) does not '
-                                 'represent the exact same samples. Mismatches'
-                                 ' are: %s.' % (i, ', '.join(master - other)))
-
-            # we need to ensure the copy we have is aligned one-to-one with the
-            # *master* ordination, making copies might be inefficient for large
-            # datasets
-            ord_res.samples = ord_res.samples.loc[master_ids].copy()
+            ids = ord_res.samples.index
+
+            # no need to copy replicates that are already aligned
+            if ids.equals(master_ids):
+                aligned.append(ord_res)
+                continue
+
+            key = tuple(ids)
+            indexer = indexers.get(key)
+
+            if indexer is None:
+                if ids.is_unique:
+                    indexer = ids.get_indexer(master_ids)
+
+                # samples must be represented identically
+                if (indexer is None or len(ids) != len(master_ids) or
+                   (indexer == -1).any()):
+                    duplicated = ids[ids.duplicated()].unique()
+                    if len(duplicated):
+                        raise ValueError('The ordination at index (%d) has '
+                                         'duplicated samples: %s.' %
+                                         (i, ', '.join(map(str, sorted(
+                                          duplicated, key=str)))))
+
+                    duplicated = master_ids[master_ids.duplicated()].unique()
+                    if len(duplicated):
+                        raise ValueError('The ordination has duplicated '
+                                         'samples: %s.' %
+                                         ', '.join(map(str, sorted(
+                                          duplicated, key=str))))
+
+                    master, other = set(master_ids), set(ids)
+                    raise ValueError('The ordination at index (%d) does not '
+                                     'represent the exact same samples. '
+                                     'Mismatches are: %s.' %
+                                     (i, ', '.join(map(str, sorted(
+                                      master ^ other, key=str)))))
+                indexers[key] = indexer
+
+            ord_res.samples = ord_res.samples.take(indexer)
             aligned.append(ord_res)
         self.jackknifed = aligned
 
@@ -291,7 +370,8 @@ class Emperor(object):
         copy_tree(get_emperor_support_files_dir(), target)
 
     def make_emperor(self, standalone=False, custom_axes=None,
-                     jackknifing_method='IQR'):
+                     jackknifing_method='IQR', binary_coords=False,
+                     columnar_metadata=False, data_dir=None):
         """Build an emperor plot
 
         Parameters
@@ -306,6 +386,24 @@ class Emperor(object):
             file). Valid values are ``"IQR"`` (for inter-quartile ranges) and
             ``"sdev"`` (for standard deviation). This argument is ignored if
             ``self.jackknifed`` is ``None`` or an empty list.
+        binary_coords : bool, optional
+            Whether the coordinates and confidence intervals should be embedded
+            as base64-encoded float32 buffers instead of JSON lists. This
+            produces considerably smaller documents for large ordinations, at
+            the expense of single-precision values. Defaults to ``False``.
+        columnar_metadata : bool, optional
+            Whether the sample metadata should be embedded as
+            dictionary-encoded columns, i.e. a single table of distinct values
+            and a list of integer codes per column, instead of one list of
+            strings per sample. Defaults to ``False``.
+        data_dir : str, optional
+            Directory where the coordinates and the sample information are
+            written to as gzip-compressed JSON files, instead of being inlined
+            in the plot. The plot fetches these files when it is loaded, and
+            refers to them with relative paths, so it should be saved in the
+            same directory. Files are named after their contents, hence plots
+            that share the same sample information also share the file.
+            Only supported when ``standalone`` is ``True``.
 
         Returns
         -------
@@ -319,6 +417,7 @@ class Emperor(object):
             sample information.
         ValueError
             If any of the ``custom_axes`` have non-numeric values.
+            If ``data_dir`` is used for a plot that is not standalone.
 
         Notes
         -----
@@ -328,18 +427,126 @@ class Emperor(object):
         that refers to resources locally. In this case you will need to copy
         the support files by calling the ``copy_support_files`` method.
 
+        Plots that use ``data_dir`` load their data asynchronously, and most
+        browsers only allow this when the files are served over HTTP, for
+        example with ``python -m http.server``. The files are fetched and
+        decompressed with the ``fetch`` and ``DecompressionStream`` APIs
+        (the latter is not needed if the files are served with a
+        ``Content-Encoding: gzip`` header). Older browsers, and PhantomJS,
+        lack these APIs and show an error message instead of the plot. Plots
+        written without ``data_dir`` don't have this requirement.
+
         See Also
         --------
         emperor.core.Emperor.copy_support_files
         """
 
+        main_template, context = self._render_context(standalone, custom_axes,
+                                                      jackknifing_method,
+                                                      binary_coords,
+                                                      columnar_metadata,
+                                                      data_dir)
+
+        return main_template.render(**context)
+
+    def write_emperor(self, fp, standalone=False, custom_axes=None,
+                      jackknifing_method='IQR', binary_coords=False,
+                      columnar_metadata=False, data_dir=None,
+                      chunk_size=10000):
+        """Write an emperor plot to a file
+
+        Parameters
+        ----------
+        fp : file-like object or str
+            File opened in text mode, or path to the file where the plot is
+            written to.
+        standalone, custom_axes, jackknifing_method : optional
+            See ``make_emperor``.
+        binary_coords, columnar_metadata, data_dir : optional
+            See ``make_emperor``.
+        chunk_size : int, optional
+            Number of samples that are serialized at a time. Defaults to
+            10,000.
+
+        Raises
+        ------
+        KeyError
+            If one or more of the ``custom_axes`` names are not present in the
+            sample information.
+        ValueError
+            If any of the ``custom_axes`` have non-numeric values.
+            If ``data_dir`` is used for a plot that is not standalone.
+            If ``chunk_size`` is not a positive number.
+
+        Notes
+        -----
+        The plot is identical to the output of ``make_emperor``, but it is
+        written in pieces as it is rendered. The sample identifiers,
+        coordinates, confidence intervals and metadata are serialized
+        ``chunk_size`` samples at a time, which avoids holding the complete
+        document (and the complete JSON representation of the data) in
+        memory. Encoded coordinates and metadata (i.e. ``binary_coords`` and
+        ``columnar_metadata``) are written at once.
+
+        See Also
+        --------
+        emperor.core.Emperor.make_emperor
+        """
+        if chunk_size < 1:
+            raise ValueError('The chunk size should be a positive number')
+
+        main_template, context = self._render_context(standalone, custom_axes,
+                                                      jackknifing_method,
+                                                      binary_coords,
+                                                      columnar_metadata,
+                                                      data_dir, chunk_size)
+
+        main_template.stream(**context).dump(fp)
+
+    def _render_context(self, standalone, custom_axes, jackknifing_method,
+                        binary_coords, columnar_metadata, data_dir,
+                        chunk_size=None):
+        """Get the template and the variables needed to render a plot
+
+        Parameters
+        ----------
+        standalone, custom_axes, jackknifing_method : optional
+            See ``make_emperor``.
+        binary_coords, columnar_metadata, data_dir : optional
+            See ``make_emperor``.
+        chunk_size : int, optional
+            See ``_process_data``, ignored when ``data_dir`` is used.
+
+        Returns
+        -------
+        jinja2.Template
+            Template where the plot is created.
+        dict
+            Variables to render the template with.
+        """
         if custom_axes is None:
             custom_axes = []
 
+        if data_dir is not None and not standalone:
+            raise ValueError('Data files can only be written for standalone '
+                             'plots')
+
         main_template = self._get_template(standalone)
 
+        # the data files are written at once
+        if data_dir is not None:
+            chunk_size = None
+
         coord_ids, coords, pct_var, ci, headers, metadata, names = \
-            self._process_data(custom_axes, jackknifing_method)
+            self._process_data(custom_axes, jackknifing_method, binary_coords,
+                               columnar_metadata, chunk_size)
+
+        if data_dir is not None:
+            data_files = self._write_data_files(data_dir, coord_ids, coords,
+                                                pct_var, ci, headers,
+                                                metadata, names)
+        else:
+            data_files = None
 
         # yes, we could have used UUID, but we couldn't find an easier way to
         # test that deterministically and with this approach we can seed the
@@ -347,19 +554,47 @@ class Emperor(object):
         plot_id = 'emperor-notebook-' + str(hex(np.random.randint(2**32)))
 
         # need to do something about low and high
-        plot = main_template.render(coords_ids=coord_ids, coords=coords,
-                                    pct_var=pct_var, ci=ci,
-                                    md_headers=headers, metadata=metadata,
-                                    plot_id=plot_id,
-                                    axes_names=names,
-                                    base_url=self.base_url,
-                                    logic_template_path=basename(LOGIC_PATH),
-                                    style_template_path=basename(STYLE_PATH),
-                                    width=self.width,
-                                    height=self.height,
-                                    settings=self.settings)
-
-        return plot
+        context = dict(coords_ids=coord_ids, coords=coords, pct_var=pct_var,
+                       ci=ci, md_headers=headers, metadata=metadata,
+                       plot_id=plot_id, axes_names=names,
+                       base_url=self.base_url,
+                       logic_template_path=basename(LOGIC_PATH),
+                       style_template_path=basename(STYLE_PATH),
+                       width=self.width, height=self.height,
+                       settings=self.settings, data_files=data_files)
+
+        return main_template, context
+
+    def _write_data_files(self, data_dir, coord_ids, coords, pct_var, ci,
+                          headers, metadata, names):
+        """Write the plot data as separate files
+
+        Parameters
+        ----------
+        data_dir : str
+            Directory where the files are written to.
+        coord_ids, coords, pct_var, ci, headers, metadata, names
+            The processed data, as returned by ``_process_data``.
+
+        Returns
+        -------
+        dict
+            Names of the files with the ``'decomposition'`` and the
+            ``'metadata'`` data, relative to ``data_dir``.
+        """
+        decomposition = {'decompositions': [{'sample_ids': coord_ids,
+                                             'coordinates': coords,
+                                             'axes_names': names,
+                                             'percents_explained': pct_var,
+                                             'ci': ci,
+                                             'type': 'ordination'}]}
+        metadata = {'metadata_headers': headers, 'metadata': metadata}
+
+        return {'decomposition': write_compressed_json(decomposition,
+                                                       data_dir,
+                                                       'decomposition'),
+                'metadata': write_compressed_json(metadata, data_dir,
+                                                  'metadata')}
 
     def _get_template(self, standalone=False):
         """Get the jinja template object
@@ -374,20 +609,46 @@ class Emperor(object):
         -------
         jinja2.Template
             Template where the plot is created.
+
+        Notes
+        -----
+        Templates are compiled once and cached at the module level. The cache
+        is invalidated when any of the template files is modified.
+
+        See Also
+        --------
+        emperor.core.set_template_bytecode_cache
         """
+        standalone = bool(standalone)
+
+        if standalone:
+            main_path = STANDALONE_PATH
+        else:
+            main_path = JUPYTER_PATH
+
+        mtimes = tuple(getmtime(path) for path in (main_path, STYLE_PATH,
+                                                   LOGIC_PATH))
+
+        cached = _TEMPLATE_CACHE.get(standalone)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+
         # based on: http://stackoverflow.com/a/6196098
         loader = FileSystemLoader(join(get_emperor_support_files_dir(),
                                        'templates'))
+        env = Environment(loader=loader, bytecode_cache=_BYTECODE_CACHE)
+        env.filters['json_chunks'] = json_chunks
+        # the data is parsed with JSON.parse, so it has to be strict JSON
+        env.policies['json.dumps_function'] = strict_json_dumps
 
-        if standalone:
-            main_path = basename(STANDALONE_PATH)
-        else:
-            main_path = basename(JUPYTER_PATH)
-        env = Environment(loader=loader)
+        template = env.get_template(basename(main_path))
+        _TEMPLATE_CACHE[standalone] = (mtimes, template)
 
-        return env.get_template(main_path)
+        return template
 
-    def _process_data(self, custom_axes, jackknifing_method):
+    def _process_data(self, custom_axes, jackknifing_method,
+                      binary_coords=False, columnar_metadata=False,
+                      chunk_size=None):
         """Handle the coordinates data
 
         Parameters
@@ -400,23 +661,36 @@ class Emperor(object):
             file). Valid values are ``"IQR"`` (for inter-quartile ranges) and
             ``"sdev"`` (for standard deviation). This argument is ignored if
             ``self.jackknifed`` is ``None`` or an empty list.
+        binary_coords : bool, optional
+            Whether the coordinates and confidence intervals should be encoded
+            with ``emperor.util.encode_float32_array`` instead of being
+            converted to lists.
+        columnar_metadata : bool, optional
+            Whether the metadata should be encoded with
+            ``emperor.util.dictionary_encode_metadata`` instead of being
+            converted to a list of lists.
+        chunk_size : int, optional
+            If provided, the sample identifiers, and the coordinates,
+            confidence intervals and metadata that would be converted to lists
+            are instead returned as generators of lists with at most
+            ``chunk_size`` rows each, see ``emperor.util.json_chunks``.
 
         Returns
         -------
         list of str
             Sample identifiers in the ordination.
-        list of lists of floats
+        list of lists of floats or dict
             Matrix of coordinates in the ordination data with custom_axes if
             provided.
         list of float
             either the eigenvalues of the input coordinates or the average
             eigenvalues of the multiple coords that were passed in
-        list of lists floats
+        list of lists floats or dict
             coordinates representing the span of each ellipse on every axis;
             None if no jackknifing is applied
         list of str
             Name of the metadata columns and the index name.
-        list of lists of str
+        list of lists of str or dict
             Data in ``mf``.
         list of str
             Names of the dimensions in the resulting ordination.
@@ -425,11 +699,239 @@ class Emperor(object):
         -----
         This method is exercised by testing the ``make_emperor`` method, and is
         not intended to be used by end-users.
+
+        The processed arrays are cached by the number of dimensions and by the
+        values of ``custom_axes`` and ``jackknifing_method``, only the arrays
+        for the last combination of these values are kept. The arrays are
+        discarded when ``ordination``, ``jackknifed`` or ``mf`` are replaced.
+        The lists and encoded objects are created every time, so the caller
+        can modify them.
+        """
+        key = (self.dimensions, tuple(custom_axes), jackknifing_method)
+
+        if self._processed_arrays is None or self._processed_arrays[0] != key:
+            # free the previous arrays before computing the new ones
+            self._processed_arrays = None
+            self._processed_arrays = \
+                (key, self._process_arrays(custom_axes, jackknifing_method))
+
+        coord_ids, coords, pct_var, ci, headers, mf, names = \
+            self._processed_arrays[1]
+
+        if chunk_size is None:
+            def to_list(data):
+                return data.tolist()
+        else:
+            def to_list(data):
+                return (chunk.tolist() for chunk in
+                        iter_row_chunks(data, chunk_size))
+
+        coord_ids = to_list(coord_ids)
+
+        if binary_coords:
+            coords = encode_float32_array(coords)
+            if ci is not None:
+                ci = encode_float32_array(ci)
+        else:
+            coords = to_list(coords)
+            if ci is not None:
+                ci = to_list(ci)
+
+        if columnar_metadata:
+            metadata = dictionary_encode_metadata(mf)
+        elif chunk_size is None:
+            metadata = stringify_metadata(mf).tolist()
+        else:
+            metadata = (stringify_metadata(chunk).tolist() for chunk in
+                        iter_row_chunks(mf, chunk_size))
+
+        return (coord_ids, coords, list(pct_var), ci, list(headers), metadata,
+                list(names))
+
+    def _process_arrays(self, custom_axes, jackknifing_method):
+        """Compute the coordinates data without converting it to lists
+
+        Parameters
+        ----------
+        custom_axes : list of str, optional
+            Custom axes to embed in the ordination.
+        jackknifing_method : {'IQR', 'sdef'}, optional
+            See ``_process_data``.
+
+        Returns
+        -------
+        pd.Index
+            Sample identifiers in the ordination.
+        np.ndarray
+            Matrix of coordinates in the ordination data with custom_axes if
+            provided.
+        list of float
+            either the eigenvalues of the input coordinates or the average
+            eigenvalues of the multiple coords that were passed in
+        np.ndarray
+            coordinates representing the span of each ellipse on every axis;
+            None if no jackknifing is applied
+        list of str
+            Name of the metadata columns and the index name.
+        pd.DataFrame
+            The metadata, with the ``custom_axes`` columns as numeric types.
+        list of str
+            Names of the dimensions in the resulting ordination.
+
+        Notes
+        -----
+        The data is processed by ``_process_arrays_native`` unless there are
+        repeated sample identifiers, in which case the QIIME-based
+        ``_process_arrays_legacy`` is used.
         """
         if self.jackknifed and len(custom_axes) > 1:
             raise ValueError("Jackknifed plots are limited to one custom "
                              "axis.")
 
+        headers, mf = self._prepare_map(custom_axes)
+
+        # the legacy engine looks up the metadata of repeated samples by
+        # position in a list, so it is still used for those (unusual) cases
+        if mf.index.is_unique and self.ordination.samples.index.is_unique:
+            engine = self._process_arrays_native
+        else:
+            engine = self._process_arrays_legacy
+
+        coord_ids, c_data, c_pct, ci = engine(headers, mf, custom_axes,
+                                              jackknifing_method)
+
+        dims = self.dimensions
+        names = self.ordination.samples.columns[:dims].values.tolist()
+        c_pct = c_pct.tolist()
+
+        if custom_axes:
+            names = custom_axes + names
+
+            c_pct = ([-1] * len(custom_axes)) + c_pct
+
+        return coord_ids, c_data, c_pct, ci, headers, mf, names
+
+    def _process_arrays_native(self, headers, mf, custom_axes,
+                               jackknifing_method):
+        """Compute the coordinates data with NumPy arrays and pandas indexes
+
+        Parameters
+        ----------
+        headers : list of str
+            Name of the metadata columns and the index name.
+        mf : pd.DataFrame
+            The metadata, with the ``custom_axes`` columns as numeric types,
+            and a unique index.
+        custom_axes : list of str
+            Custom axes to embed in the ordination.
+        jackknifing_method : {'IQR', 'sdef'}
+            See ``_process_data``.
+
+        Returns
+        -------
+        pd.Index
+            Sample identifiers in the ordination.
+        np.ndarray
+            Matrix of coordinates in the ordination data with custom_axes if
+            provided.
+        np.ndarray
+            Percent explained by each axis.
+        np.ndarray
+            coordinates representing the span of each ellipse on every axis;
+            None if no jackknifing is applied
+
+        Notes
+        -----
+        The results are the same as with ``_process_arrays_legacy``, but the
+        metadata is never converted to lists of strings. Samples with missing
+        coordinates are removed from the identifiers and the confidence
+        intervals, as well as from the coordinates.
+        """
+        dims = self.dimensions
+
+        coord_ids = self.ordination.samples.index
+        c_pct = self.ordination.proportion_explained.values[:dims] * 100
+        low, high = None, None
+
+        def scaled(ordination):
+            coords = ordination.samples.values[:, :dims]
+            return coords / np.max(np.abs(coords))
+
+        if self.jackknifed:
+            # the replicates are aligned with the master ordination, which is
+            # included in the summary and decides the signs of the axes
+            stack = np.array([scaled(ordination) for ordination in
+                              [self.ordination] + self.jackknifed])
+            c_data, low, high = _compute_jn_pcoa_avg_ranges(
+                _flip_vectors(stack, stack[0]), jackknifing_method)
+        else:
+            c_data = scaled(self.ordination)
+
+        if custom_axes:
+            custom = mf[custom_axes]
+            if not custom.index.equals(coord_ids):
+                custom = custom.loc[coord_ids]
+
+            c_data = np.hstack([custom.values.astype(float), c_data])
+
+            keep = ~np.isnan(c_data).any(axis=1)
+            if not keep.all():
+                c_data, coord_ids = c_data[keep], coord_ids[keep]
+                if low is not None:
+                    low, high = low[keep], high[keep]
+
+            # scale the custom axes to the range of the first axis
+            axes = len(custom_axes)
+            to_mn = c_data[:, axes].min()
+            to_mx = 2 * c_data[:, axes].max()
+
+            from_mn = c_data[:, :axes].min(axis=0)
+            from_mx = c_data[:, :axes].max(axis=0)
+
+            custom = (c_data[:, :axes] - from_mn) / (from_mx - from_mn)
+            c_data[:, :axes] = custom * (to_mx - to_mn) + to_mn
+
+            # there's no variation in the custom axes, but WebGL needs a
+            # non-zero span to draw the ellipsoids
+            if low is not None:
+                low[:, :axes] = 0
+                high[:, :axes] = 0.00001
+
+        if c_pct[0] < 1.0:
+            c_pct = c_pct * 100
+
+        ci = None if low is None else np.abs(high - low)
+
+        return coord_ids, c_data, c_pct, ci
+
+    def _process_arrays_legacy(self, headers, mf, custom_axes,
+                               jackknifing_method):
+        """Compute the coordinates data with the legacy QIIME structures
+
+        Parameters
+        ----------
+        headers : list of str
+            Name of the metadata columns and the index name.
+        mf : pd.DataFrame
+            The metadata, with the ``custom_axes`` columns as numeric types.
+        custom_axes : list of str
+            Custom axes to embed in the ordination.
+        jackknifing_method : {'IQR', 'sdef'}
+            See ``_process_data``.
+
+        Returns
+        -------
+        pd.Index
+            Sample identifiers in the ordination.
+        np.ndarray
+            Matrix of coordinates in the ordination data with custom_axes if
+            provided.
+        np.ndarray
+            Percent explained by each axis.
+        np.ndarray
+            coordinates representing the span of each ellipse on every axis;
+            None if no jackknifing is applied
+        """
         # turn modern data into legacy data
         dims = self.dimensions
 
@@ -457,26 +959,24 @@ class Emperor(object):
 
             c_pct = data.proportion_explained[:dims] * 100
 
-        headers, metadata = self._to_legacy_map(custom_axes)
+        # the legacy structure is only needed to add the custom axes, so it
+        # only includes those columns
+        m_headers = headers[:1] + list(custom_axes)
+        if custom_axes:
+            m_data = stringify_metadata(mf[custom_axes]).tolist()
+        else:
+            m_data = []
 
         c_headers, c_data, _, c_pct, low, high, _ = \
             preprocess_coords_file(c_headers, c_data, c_eigenvals, c_pct,
-                                   headers, metadata, custom_axes,
+                                   m_headers, m_data, custom_axes,
                                    jackknifing_method, False)
 
-        names = self.ordination.samples.columns[:dims].values.tolist()
-        c_pct = c_pct.tolist()
-
-        if custom_axes:
-            names = custom_axes + names
-
-            c_pct = ([-1] * len(custom_axes)) + c_pct
-
         if low is not None or high is not None:
-            ci = np.abs(high - low).tolist()
+            ci = np.abs(high - low)
 
-        return (self.ordination.samples.index.tolist(), c_data.tolist(),
-                c_pct, ci, headers, metadata, names)
+        return (self.ordination.samples.index, c_data, np.asarray(c_pct),
+                ci)
 
     def _to_legacy_map(self, custom_axes=None):
         """Helper method to convert Pandas dataframe to legacy QIIME structure
@@ -493,6 +993,29 @@ class Emperor(object):
         list of list of str
             Data in ``mf``.
         """
+        headers, mf = self._prepare_map(custom_axes)
+
+        # convert one column at a time and transpose once, instead of
+        # converting every row in a Python-level loop
+        metadata = stringify_metadata(mf).tolist()
+
+        return headers, metadata
+
+    def _prepare_map(self, custom_axes=None):
+        """Helper method to get the metadata headers and validated data
+
+        Parameters
+        ----------
+        custom_axes : list of str, optional
+            Custom axes to embed in the ordination.
+
+        Returns
+        -------
+        list of str
+            Name of the metadata columns and the index name.
+        pd.DataFrame
+            The metadata with the ``custom_axes`` columns as numeric types.
+        """
         mf = self.mf
         # there's a bug in old versions of Pandas that won't allow us to rename
         # a DataFrame's index, newer versions i.e 0.18 work just fine but 0.14
@@ -506,10 +1029,39 @@ class Emperor(object):
             mf = validate_and_process_custom_axes(mf, custom_axes)
 
         headers = [str(c) for c in [index_name] + mf.columns.tolist()]
-        metadata = mf.apply(lambda x: [str(x.name)] +
-                            x.astype('str').tolist(),
-                            axis=1).values.tolist()
-        return headers, metadata
+        return headers, mf
+
+    def _category_index(self, category):
+        """Get the distinct values of a metadata category
+
+        Parameters
+        ----------
+        category: str
+            The metadata category to index.
+
+        Returns
+        -------
+        pd.Index
+            The distinct values in ``category``, in order of appearance and
+            excluding missing values.
+        np.ndarray
+            The position in the distinct values of every sample's value, or
+            ``-1`` for missing values.
+        np.ndarray
+            The number of samples with each of the distinct values.
+
+        Notes
+        -----
+        The index is computed once per category, and is shared by all the
+        methods that modify the plot, until ``mf`` is replaced.
+        """
+        if category not in self._categories:
+            codes, values = pd.factorize(self.mf[category])
+            counts = np.bincount(codes[codes >= 0], minlength=len(values))
+
+            self._categories[category] = (values, codes, counts)
+
+        return self._categories[category]
 
     def _base_data_checks(self, category, data, d_type):
         """Perform common checks in the methods that modify the plot
@@ -543,19 +1095,24 @@ class Emperor(object):
         if data is None or not data:
             return {}
 
-        present = set(self.mf[category].value_counts().index)
+        present = self._category_index(category)[0]
         given = set(data.keys())
 
-        if present != given:
-            if present.issubset(given):
+        # the lookups in the index are hashed, so comparing the categories
+        # doesn't depend on the number of samples
+        extra = [value for value in given if value not in present]
+        if extra or len(given) != len(present):
+            missing = [value for value in present if value not in given]
+
+            if not missing:
                 raise ValueError('More categories present in the provided '
                                  'data, the following categories were '
                                  'not found in the metadata: %s.' %
-                                 ', '.join(given - present))
-            elif given.issubset(present):
+                                 ', '.join(extra))
+            elif not extra:
                 raise ValueError('The following categories are not present'
                                  ' in the provided data: %s' %
-                                 ', '.join(present - given))
+                                 ', '.join(missing))
 
         # isinstance won't recognize numpy dtypes that are still valid
         if not all(np.issubdtype(type(v), d_type) for v in data.values()):
@@ -747,7 +1304,7 @@ class Emperor(object):
         emperor.core.Emperor.set_axes
         """
         if isinstance(visibilities, list) and category in self.mf:
-            cats = self.mf[category].unique()
+            cats = self._category_index(category)[0]
             visibilities = {c: c in visibilities for c in cats}
 
         visibilities = self._base_data_checks(category, visibilities, bool)
@@ -1158,3 +1715,38 @@ class Emperor(object):
     @settings.deleter
     def settings(self):
         self._settings = {}
+
+    @property
+    def ordination(self):
+        """The ordination results that are displayed"""
+        return self._ordination
+
+    @ordination.setter
+    def ordination(self, ordination):
+        self._ordination = ordination
+        self._clear_processed()
+
+    @property
+    def jackknifed(self):
+        """List of jackknifed ordination results, or None"""
+        return self._jackknifed
+
+    @jackknifed.setter
+    def jackknifed(self, jackknifed):
+        self._jackknifed = jackknifed
+        self._clear_processed()
+
+    @property
+    def mf(self):
+        """The sample metadata, aligned with the ordination"""
+        return self._mf
+
+    @mf.setter
+    def mf(self, mf):
+        self._mf = mf
+        self._categories = {}
+        self._clear_processed()
+
+    def _clear_processed(self):
+        """Forget the processed data, so it is computed again when needed"""
+        self._processed_arrays = None
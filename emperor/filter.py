@@ -6,7 +6,9 @@
 # The full license is in the file LICENSE.md, distributed with this software.
 # ----------------------------------------------------------------------------
 from __future__ import division
-from numpy import array
+from itertools import compress
+
+from numpy import asarray, fromiter
 
 
 def filter_samples_from_coords(headers, coords,
@@ -37,26 +39,9 @@ def filter_samples_from_coords(headers, coords,
     ValueError
         If all the samples are filtered out
     """
-    out_coord_ids, out_coords = [], []
-
-    # define the strategy to take for each of the iterations
-    if negate:
-        def keep_sample(s):
-            return s not in valid_sample_ids
-    else:
-        def keep_sample(s):
-            return s in valid_sample_ids
+    mask = _samples_mask(headers, valid_sample_ids, negate)
 
-    for sample_id, coord in zip(headers, coords):
-        if keep_sample(sample_id):
-            out_coord_ids.append(sample_id)
-            out_coords.append(array(coord))
-
-    # do not allow empty sets as return values, raise an exception
-    if len(out_coord_ids) < 1:
-        raise ValueError("All samples have been filtered out")
-
-    return out_coord_ids, array(out_coords)
+    return _apply_samples_mask(headers, coords, mask)
 
 
 def keep_samples_from_pcoa_data(headers, coords, sample_ids):
@@ -85,9 +70,17 @@ def keep_samples_from_pcoa_data(headers, coords, sample_ids):
     if type(coords) == list:
         out_coords, out_headers = [], []
 
+        # replicates usually list the samples in the same order, so the mask
+        # is only computed once per distinct order
+        masks = {}
+
         for single_headers, single_coords in zip(headers, coords):
-            a, b = filter_samples_from_coords(single_headers, single_coords,
-                                              sample_ids)
+            key = tuple(single_headers)
+            if key not in masks:
+                masks[key] = _samples_mask(single_headers, sample_ids)
+
+            a, b = _apply_samples_mask(single_headers, single_coords,
+                                       masks[key])
 
             out_headers.append(a)
             out_coords.append(b)
@@ -98,3 +91,30 @@ def keep_samples_from_pcoa_data(headers, coords, sample_ids):
                                                              coords,
                                                              sample_ids)
         return out_headers, out_coords
+
+
+def _samples_mask(headers, sample_ids, negate=False):
+    """Boolean mask of the headers that are (or aren't) in sample_ids"""
+    sample_ids = set(sample_ids)
+    mask = fromiter((s in sample_ids for s in headers), dtype=bool,
+                    count=len(headers))
+
+    if negate:
+        mask = ~mask
+
+    return mask
+
+
+def _apply_samples_mask(headers, coords, mask):
+    """Select the headers and rows of coords where mask is True
+
+    Raises
+    ------
+    ValueError
+        If all the samples are filtered out
+    """
+    # do not allow empty sets as return values, raise an exception
+    if not mask.any():
+        raise ValueError("All samples have been filtered out")
+
+    return list(compress(headers, mask)), asarray(coords)[mask]
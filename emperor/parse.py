@@ -7,10 +7,14 @@
 # ----------------------------------------------------------------------------
 from __future__ import division
 
+from multiprocessing import Pool
+
+import pandas as pd
 from skbio import OrdinationResults
 from skbio.io import FileFormatError, IOSourceError
 
 from emperor.qiime_backports.parse import parse_coords as qiime_parse_coords
+from emperor.util import guess_coordinates_files
 
 
 def parse_coords(lines):
@@ -27,8 +31,13 @@ def parse_coords(lines):
     skbio.stats.ordination.OrdinationResults.read
 
     Strategy: read the file using skbio's parser and return the objects
-              we want
+              we want, files starting with a "pc vector number" line are in
+              the legacy QIIME format and are read with the QIIME parser,
+              without trying skbio's parser first
     """
+    if _first_line(lines).startswith('pc vector number'):
+        return qiime_parse_coords(lines)
+
     try:
         pcoa_results = OrdinationResults.read(lines)
         return (pcoa_results.samples.index.tolist(),
@@ -41,3 +50,131 @@ def parse_coords(lines):
             # looks like we have a list of lines, not a file-like object
             pass
         return qiime_parse_coords(lines)
+
+
+def _first_line(lines):
+    """Retrieve the first line of a list of lines or a file-like object
+
+    Parameters
+    ----------
+    lines : list of str or file-like object
+        Lines to inspect, file-like objects are rewound to their original
+        position.
+
+    Returns
+    -------
+    str
+        The first line, or an empty string if it can't be retrieved without
+        consuming ``lines``.
+    """
+    if isinstance(lines, list):
+        return lines[0] if lines else ''
+
+    try:
+        position = lines.tell()
+        first = lines.readline()
+        lines.seek(position)
+    except (AttributeError, IOError, ValueError):
+        return ''
+
+    return first if isinstance(first, str) else ''
+
+
+def parse_jackknifed_coords(dir_path, processes=None):
+    """Parse a directory of jackknifed coordinates files in parallel
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the directory with the coordinates files, as found by
+        ``emperor.util.guess_coordinates_files``. The files can be in any of
+        the formats supported by ``parse_coords``.
+    processes : int, optional
+        Number of worker processes used to parse the files. Defaults to the
+        number of CPUs, when set to ``1`` the files are parsed in the current
+        process.
+
+    Returns
+    -------
+    list of skbio.OrdinationResults
+        One object per file, sorted by file name. The samples in every object
+        are in the same order as in the first object.
+
+    Raises
+    ------
+    ValueError
+        If no coordinates files are found.
+        If the files don't represent the exact same samples.
+        If a file has duplicated sample identifiers.
+
+    Notes
+    -----
+    Proportions explained larger than one are assumed to be percentages, and
+    are divided by 100.
+
+    Examples
+    --------
+    The first file can be used as the *master* ordination:
+
+    >>> from emperor import Emperor
+    >>> from emperor.parse import parse_jackknifed_coords
+    >>> ordinations = parse_jackknifed_coords('unweighted_unifrac_pc/')
+    >>> emp = Emperor(ordinations[0], mf, jackknifed=ordinations[1:])
+    """
+    fps = sorted(guess_coordinates_files(dir_path))
+
+    if not fps:
+        raise ValueError('No coordinates files were found in %s' % dir_path)
+
+    if processes == 1:
+        results = [_parse_coords_file(fp) for fp in fps]
+    else:
+        pool = Pool(processes)
+        try:
+            results = pool.map(_parse_coords_file, fps)
+        finally:
+            pool.close()
+            pool.join()
+
+    for fp, result in zip(fps, results):
+        index = result.samples.index
+        if not index.is_unique:
+            duplicated = sorted(set(index[index.duplicated()]), key=str)
+            raise ValueError('The coordinates in %s have duplicated sample '
+                             'identifiers: %s' %
+                             (fp, ', '.join(map(str, duplicated))))
+
+    ids = results[0].samples.index
+    for fp, result in zip(fps, results):
+        if not result.samples.index.equals(ids):
+            if set(result.samples.index) != set(ids):
+                raise ValueError('The coordinates in %s do not represent the'
+                                 ' same samples as in %s.' % (fp, fps[0]))
+            result.samples = result.samples.loc[ids]
+
+    return results
+
+
+def _parse_coords_file(fp):
+    """Parse a coordinates file into an OrdinationResults object
+
+    Parameters
+    ----------
+    fp : str
+        Path to the coordinates file.
+
+    Returns
+    -------
+    skbio.OrdinationResults
+        The ordination in the file.
+    """
+    with open(fp, 'r') as f:
+        ids, coords, eigvals, pct = parse_coords(f)
+
+    if len(pct) and pct[0] >= 1.0:
+        pct = pct / 100.0
+
+    return OrdinationResults('PCoA', 'Principal Coordinate Analysis',
+                             eigvals=pd.Series(eigvals),
+                             samples=pd.DataFrame(coords, index=ids),
+                             proportion_explained=pd.Series(pct))
@@ -11,16 +11,62 @@ __email__ = "daniel.knights@colorado.edu"
 __status__ = "Development"
 
 from emperor.qiime_backports.parse import parse_otu_table
-from numpy import array, apply_along_axis, dot,delete, argsort
+from numpy import array, dot,delete, argsort, asarray
+from scipy.sparse import issparse, diags
 import numpy as np
 
+
+def _normalize_samples(tax_counts):
+    """Returns tax_counts scaled so that each sample (column) sums to 1
+
+    scipy.sparse tables are scaled as sparse matrices and never densified.
+    """
+    if issparse(tax_counts):
+        tax_counts = tax_counts.tocsr().astype(float)
+        sample_sums = asarray(tax_counts.sum(axis=0)).ravel()
+        return tax_counts.dot(diags(1. / sample_sums)).tocsr()
+    tax_counts = asarray(tax_counts, dtype=float)
+    return tax_counts / tax_counts.sum(axis=0)
+
+
+def _row_sums(tax_ratios):
+    """Returns the sum of each row of a dense or scipy.sparse matrix"""
+    return asarray(tax_ratios.sum(axis=1)).ravel()
+
+
+def _project_taxa(tax_ratios, sample_coords):
+    """Returns the PCoA coords of each row of sample-normalized tax_ratios
+
+    The rows can be any subset of a table normalized with _normalize_samples.
+    """
+    # normalize taxa counts along each column/taxa (i.e. to make PCoA score
+    # contributions sum to 1)
+    taxa_sums = _row_sums(tax_ratios)
+    if issparse(tax_ratios):
+        tax_ratios = diags(1. / taxa_sums).dot(tax_ratios)
+    else:
+        tax_ratios = tax_ratios / taxa_sums[:, np.newaxis]
+    return asarray(tax_ratios.dot(asarray(sample_coords, dtype=float)))
+
+
+def _scale_prevalence(lineage_sums):
+    """Returns the lineage sums as portions of the total, scaled from 0 to 1"""
+    total_count = lineage_sums.sum()
+    prevalence = lineage_sums / float(total_count)
+    # scale prevalence from 0 to 1
+    prevalence = ((prevalence - prevalence.min()) /
+                  (prevalence.max() - prevalence.min()))
+    return prevalence
+
 def get_taxa_coords(tax_counts,sample_coords):
-    """Returns the PCoA coords of each taxon based on the coords of the samples."""
+    """Returns the PCoA coords of each taxon based on the sample coords.
+
+    tax_counts can be a dense array or a scipy.sparse matrix; the sparse
+    normalizations are row/column scalings followed by a single sparse-dense
+    product.
+    """
     # normalize taxa counts along each row/sample (i.e. to get relative abundance)
-    tax_counts = apply_along_axis(lambda x: x/float(sum(x)), 0, tax_counts)
-    # normalize taxa counts along each column/taxa (i.e. to make PCoA score contributions sum to 1)
-    tax_ratios = apply_along_axis(lambda x: x/float(sum(x)), 1, tax_counts)
-    return(dot(tax_ratios,sample_coords))
+    return _project_taxa(_normalize_samples(tax_counts), sample_coords)
 
 def get_taxa_prevalence(tax_counts):
     """Returns the each lineage's portion of the total count 
@@ -28,14 +74,10 @@ def get_taxa_prevalence(tax_counts):
     takes an otu_table (rows = otus), normalizes samples to equal counts,
     and returns each otu's relative representation in this normalized otu table,
     scaled such that the rarest otu is 0, most prominent is 1
+
+    tax_counts can be a dense array or a scipy.sparse matrix.
     """
-    tax_ratios = apply_along_axis(lambda x: x/float(sum(x)), 0, tax_counts)
-    lineage_sums = apply_along_axis(lambda x: sum(x), 1, tax_ratios)
-    total_count = sum(lineage_sums)
-    prevalence = lineage_sums / float(total_count)
-    # scale prevalence from 0 to 1
-    prevalence = (prevalence - min(prevalence)) / (max(prevalence) - min(prevalence))
-    return prevalence
+    return _scale_prevalence(_row_sums(_normalize_samples(tax_counts)))
 
 def make_biplot_scores_output(taxa):
     """Create convenient output format of taxon biplot coordinates
@@ -45,7 +87,7 @@ def make_biplot_scores_output(taxa):
        output is a list of lines, each containing coords for one taxon
     """
     output = []
-    ndims = len(taxa['coord'][1])
+    ndims = len(taxa['coord'][0])
     header = '#Taxon\t' + '\t'.join(['pc%d' %(i+1) for i in range(ndims)])
     output.append(header)
     for i, taxon in enumerate(taxa['lineages']):
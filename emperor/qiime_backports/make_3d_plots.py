@@ -10,8 +10,8 @@ __maintainer__ = "Yoshiki Vazquez Baeza"
 __email__ = "yoshiki89@gmail.com"
 __status__ = "Development"
 
-from numpy import (array, append, transpose, column_stack, hstack,
-    apply_along_axis, nan, isnan, asarray)
+from numpy import array, hstack, apply_along_axis, isnan, asarray
+from pandas import DataFrame, Index, to_numeric
 
 def get_custom_coords(axis_names,mapping, coords):
     """Gets custom axis coords from the mapping file.
@@ -22,29 +22,39 @@ def get_custom_coords(axis_names,mapping, coords):
         mapping, the mapping file object (with list of headers in element 0)
         coords, the PCoA coords object, with coords matrix in element 1
     """
-    for i, axis in enumerate(reversed(axis_names)):
+    for axis in reversed(axis_names):
         if not axis in mapping[0]:
             raise ValueError('Warning: could not find custom axis %s in map '
                              'headers: %s' % (axis, mapping[0]))
-        else:
-            # get index of column in mapping file
-            col_idx = mapping[0].index(axis)
-            # extract column data
-            col = list(zip(*mapping[1:]))[col_idx]
-            sample_IDs = list(zip(*mapping[1:]))[0]
-            new_coords = array([])
-            # load custom coord for this axis for each sample ID 
-            for id in coords[0]:
-                if id in sample_IDs:
-                    row_idx = list(sample_IDs).index(id)
-                    try:
-                        as_float = float(col[row_idx])
-                        new_coords = append(new_coords,as_float)
-                    except ValueError:
-                        new_coords = append(new_coords,nan)
-            new_coords = transpose(column_stack(new_coords))
-            # append new coords to beginning column of coords matrix
-            coords[1] = hstack((new_coords,coords[1]))
+
+    if not axis_names:
+        return
+
+    # index the rows by sample ID once, the first row wins for repeated IDs
+    rows = DataFrame(mapping[1:])
+    rows.index = rows[0]
+    rows = rows[~rows.index.duplicated()]
+
+    ids = Index(coords[0])
+    missing = ids[~ids.isin(rows.index)]
+    if len(missing):
+        raise ValueError('Could not find the following samples in the map: '
+                         '%s' % ', '.join(missing))
+
+    # get index of each column in mapping file
+    col_idxs = [mapping[0].index(axis) for axis in axis_names]
+
+    # load custom coords for all axes and sample IDs at once, values that are
+    # not numeric are loaded as nan
+    new_coords = rows.loc[ids, col_idxs]
+    try:
+        new_coords = new_coords.values.astype(float)
+    except (TypeError, ValueError):
+        new_coords = new_coords.apply(to_numeric,
+                                      errors='coerce').values.astype(float)
+
+    # append new coords to beginning columns of coords matrix
+    coords[1] = hstack((new_coords, coords[1]))
 
 def remove_nans(coords):
     """Deletes any samples with NANs in their coordinates"""
@@ -12,7 +12,7 @@ __email__ = "gregcaporaso@gmail.com"
 __status__ = "Development"
 
 
-from numpy import asarray
+from numpy import asarray, loadtxt
 
 class QiimeParseError(Exception):
     pass
@@ -230,7 +230,8 @@ def parse_coords(lines):
     - eigvals
     - % variation explained
 
-    Strategy: just read the file into memory, find the lines we want
+    Strategy: just read the file into memory, find the lines we want, the
+    per-sample coords are handed to numpy's loadtxt in a single call
     """
 
     lines = list(lines)
@@ -241,26 +242,58 @@ def parse_coords(lines):
         raise QiimeParseError("The line with the vector number was not found"
             ", this information is required in coordinates files")
 
-    lines = [l.strip() for l in lines[1:]] # discard first line, which is a label
-    lines = [_f for _f in lines if _f] # remove any blank lines
+    # the eigvals and % variation are the last two non-blank lines
+    footer, end = [], len(lines)
+    while end > 1 and len(footer) < 2:
+        end -= 1
+        if lines[end].strip():
+            footer.insert(0, lines[end].strip())
 
     # check on this information post removal of blank lines
-    if not lines[-2].startswith('eigvals'):
+    if len(footer) < 2 or not footer[0].startswith('eigvals'):
         raise QiimeParseError("The line containing the eigenvalues was not "
             "found, this information is required in coordinates files")
-    if not lines[-1].startswith('% variation'):
+    if not footer[1].startswith('% variation'):
         raise QiimeParseError("The line with the percent of variation explained"
             " was not found, this information is required in coordinates files")
 
     #now last 2 lines are eigvals and % variation, so read them
-    eigvals = asarray(lines[-2].split('\t')[1:], dtype=float)
-    pct_var = asarray(lines[-1].split('\t')[1:], dtype=float)
+    eigvals = asarray(footer[0].split('\t')[1:], dtype=float)
+    pct_var = asarray(footer[1].split('\t')[1:], dtype=float)
 
     #finally, dump the rest of the lines into a table
+    try:
+        return _parse_coords_table(lines[1:end]) + (eigvals, pct_var)
+    except ValueError:
+        # odd spacing or missing fields, let the line by line parser sort it
+        # out or raise a meaningful error
+        pass
+
     header, result = [], []
-    for line in lines[:-2]:
+    for line in lines[1:end]:
+        line = line.strip()
+        if not line:
+            continue
         fields = [f.strip() for f in line.split('\t')]
         header.append(fields[0])
         result.append([float(f) for f in fields[1:]])
 
     return header, asarray(result), eigvals, pct_var
+
+def _parse_coords_table(lines):
+    """Parse the per-sample lines of a coords file with numpy's C reader
+
+    Returns the list of sample labels and the array of coords, raises a
+    ValueError if a value can't be converted to float or if the number of
+    fields changes from one line to the next.
+    """
+    lines = [l for l in lines if l.strip()]
+    if not lines:
+        return [], asarray([])
+
+    header = [l.split('\t', 1)[0].strip() for l in lines]
+    # the labels are read separately, the converter only keeps the column
+    # count in check so ragged lines are rejected
+    coords = loadtxt(lines, delimiter='\t', comments=None, ndmin=2,
+                     converters={0: lambda label: 0})
+    return header, coords[:, 1:]
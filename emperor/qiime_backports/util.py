@@ -9,6 +9,8 @@ __maintainer__ = "Yoshiki Vazquez Baeza"
 __email__ = "yoshik89@gmail.com"
 __status__ = "Development"
 
+from tempfile import TemporaryFile
+
 from scipy.spatial import procrustes
 
 from emperor.qiime_backports.parse import parse_mapping_file_to_dict
@@ -16,7 +18,8 @@ from emperor.qiime_backports.parse import parse_mapping_file_to_dict
 from numpy.ma.extras import apply_along_axis
 from numpy.ma import MaskedArray
 from numpy import (shape, vstack, zeros, sum as numpy_sum, sort as numpy_sort,
-    nan as numpy_nan, array, median, average)
+    nan as numpy_nan, array, median, average, asarray, where, newaxis, add,
+    subtract, abs as numpy_abs, full, memmap)
 
 def is_valid_git_refname(refname):
     """check if a string is a valid branch-name/ref-name for git
@@ -277,35 +280,76 @@ class MetadataMap():
                 raise ValueError("Could not find the following sample IDs in "
                                  "metadata map: %s" % ', '.join(extra_samples))
 
-def summarize_pcoas(master_pcoa, support_pcoas, method='IQR', apply_procrustes=True):
+def summarize_pcoas(master_pcoa, support_pcoas, method='IQR', apply_procrustes=True,
+                    memmap_dir=None, block_size=None):
     """returns the average PCoA vector values for the support pcoas
 
     Also returns the ranges as calculated with the specified method.
     The choices are:
         IQR: the Interquartile Range
         ideal fourths: Ideal fourths method as implemented in scipy
+        sdev: the standard deviation
+
+    memmap_dir: if provided, the support pcoas are processed one at a time
+        and written to a temporary file in this directory, instead of being
+        stacked in memory. support_pcoas can then be any iterable (e.g. a
+        generator that parses each replicate when needed), and the ranges are
+        computed from a memory map of the file in blocks of samples.
+    block_size: number of samples summarized at a time, see
+        _compute_jn_pcoa_avg_ranges. When memmap_dir is provided, it defaults
+        to as many samples as fit in about 64 MB of replicate data.
+
+    Raises a ValueError if support_pcoas is empty.
     """
-    if apply_procrustes:
-        # perform procrustes before averaging
-        support_pcoas = [list(sp) for sp in support_pcoas]
-        master_pcoa = list(master_pcoa)
-        for i, pcoa in enumerate(support_pcoas):
-            master_std, pcoa_std, m_squared = procrustes(master_pcoa[1],pcoa[1])
-            support_pcoas[i][1] = pcoa_std
-        master_pcoa[1] = master_std
-
     m_matrix = master_pcoa[1]
-    m_eigvals = master_pcoa[2]
     m_names = master_pcoa[0]
-    jn_flipped_matrices = []
+
+    if apply_procrustes:
+        # the standardized master matrix doesn't depend on the second matrix
+        m_matrix = procrustes(m_matrix, m_matrix)[0]
+
     all_eigvals = []
-    for rep in support_pcoas:
-        matrix = rep[1]
-        eigvals = rep[2]
-        all_eigvals.append(eigvals)
-        jn_flipped_matrices.append(_flip_vectors(matrix, m_matrix))
-    matrix_average, matrix_low, matrix_high = _compute_jn_pcoa_avg_ranges(\
-            jn_flipped_matrices, method)
+
+    def replicates():
+        for rep in support_pcoas:
+            all_eigvals.append(rep[2])
+            if apply_procrustes:
+                # perform procrustes before averaging
+                yield procrustes(master_pcoa[1], rep[1])[1]
+            else:
+                yield rep[1]
+
+    if memmap_dir is None:
+        matrices = list(replicates())
+        if not matrices:
+            raise ValueError("At least one support PCoA is required")
+
+        # flip the signs of all the replicates at once
+        jn_flipped_matrices = _flip_vectors(array(matrices, dtype=float),
+                                            m_matrix)
+        matrix_average, matrix_low, matrix_high = \
+            _compute_jn_pcoa_avg_ranges(jn_flipped_matrices, method,
+                                        block_size)
+    else:
+        with TemporaryFile(dir=memmap_dir) as f:
+            for matrix in replicates():
+                _flip_vectors(matrix, m_matrix).tofile(f)
+            f.flush()
+
+            # checked before the size of the blocks is computed
+            if not all_eigvals:
+                raise ValueError("At least one support PCoA is required")
+
+            x, y = shape(m_matrix)
+            if block_size is None:
+                block_size = max(1, (8 * 1024 ** 2) // (len(all_eigvals) * y))
+
+            stack = memmap(f, dtype=float, mode='r',
+                           shape=(len(all_eigvals), x, y))
+            matrix_average, matrix_low, matrix_high = \
+                _compute_jn_pcoa_avg_ranges(stack, method, block_size)
+            del stack
+
     #compute average eigvals
     all_eigvals_stack = vstack(all_eigvals)
     eigval_sum = numpy_sum(all_eigvals_stack, axis=0)
@@ -313,57 +357,75 @@ def summarize_pcoas(master_pcoa, support_pcoas, method='IQR', apply_procrustes=T
     return matrix_average, matrix_low, matrix_high, eigval_average, m_names
 
 def _flip_vectors(jn_matrix, m_matrix):
-    """transforms PCA vectors so that signs are correct"""
-    m_matrix_trans = m_matrix.transpose()
-    jn_matrix_trans = jn_matrix.transpose()
-    new_matrix= zeros(jn_matrix_trans.shape, float)
-    for i, m_vector in enumerate(m_matrix_trans):
-        jn_vector = jn_matrix_trans[i]
-        disT = list(m_vector - jn_vector)
-        disT = sum(map(abs, disT))
-        jn_flip = jn_vector*[-1]
-        disF = list(m_vector - jn_flip)
-        disF = sum(map(abs, disF))
-        if disT > disF:
-            new_matrix[i] = jn_flip
-        else:
-            new_matrix[i] = jn_vector
-    return new_matrix.transpose()
+    """transforms PCA vectors so that signs are correct
+
+    jn_matrix can be a single matrix or a stack of matrices (one per
+    replicate), the signs of every axis in every matrix are computed at once.
+    An axis is flipped when the flipped vector is closer to the master vector
+    (as measured by the sum of the absolute differences).
+    """
+    jn_matrix = asarray(jn_matrix, dtype=float)
+    m_matrix = asarray(m_matrix, dtype=float)
+
+    # distances are summed over the samples, leaving one value per axis, the
+    # same buffer is reused to limit the memory used by large stacks
+    buf = subtract(m_matrix, jn_matrix)
+    dis_t = numpy_abs(buf, out=buf).sum(axis=-2)
+    buf = add(m_matrix, jn_matrix, out=buf)
+    dis_f = numpy_abs(buf, out=buf).sum(axis=-2)
 
-def _compute_jn_pcoa_avg_ranges(jn_flipped_matrices, method):
+    signs = where(dis_t > dis_f, -1.0, 1.0)
+    return jn_matrix * signs[..., newaxis, :]
+
+def _compute_jn_pcoa_avg_ranges(jn_flipped_matrices, method, block_size=None):
     """Computes PCoA average and ranges for jackknife plotting
 
     returns 1) an array of jn_averages
              2) an array of upper values of the ranges
             3) an array of lower values for the ranges
 
+    jn_flipped_matrices: list of matrices or an array of stacked matrices
+        with shape (replicates, samples, axes), including a numpy.memmap.
     method: the method by which to calculate the range
         IQR: Interquartile Range
         ideal fourths: Ideal fourths method as implemented in scipy
+        sdev: the standard deviation
+    block_size: if provided, the samples are summarized in blocks of this
+        size, so only block_size samples from every replicate are loaded in
+        memory at a time.
     """
-    x, y = shape(jn_flipped_matrices[0])
-    matrices = len(jn_flipped_matrices)
-
-    summary_matrix = array(jn_flipped_matrices).reshape(matrices, x * y)
-    matrix_average = average(jn_flipped_matrices, axis=0)
-
-    if method == 'IQR':
-        result = matrix_IQR(summary_matrix)
-        matrix_low = result[0].reshape(x, y)
-        matrix_high = result[1].reshape(x, y)
-    elif method == 'ideal_fourths':
-        result = idealfourths(summary_matrix, axis=0)
-        matrix_low = result[0].reshape(x, y)
-        matrix_high = result[1].reshape(x, y)
-    elif method == "sdev":
-        # calculate std error for each sample in each dimension
-        sdevs = zeros(shape=[x, y])
-        for j in range(y):
-            for i in range(x):
-                vals = array([pcoa[i][j] for pcoa in jn_flipped_matrices])
-                sdevs[i, j] = vals.std(ddof=1)
-        matrix_low = -sdevs/2
-        matrix_high = sdevs/2
+    stack = asarray(jn_flipped_matrices, dtype=float)
+    matrices, x, y = stack.shape
+
+    if method not in ('IQR', 'ideal_fourths', 'sdev'):
+        raise ValueError("Unknown method to compute the ranges: %s" % method)
+
+    if block_size is None:
+        block_size = x
+
+    matrix_average = zeros((x, y))
+    matrix_low = zeros((x, y))
+    matrix_high = zeros((x, y))
+
+    for start in range(0, x, block_size):
+        rows = slice(start, start + block_size)
+
+        # a copy, so the block is in memory and can be sorted in-place
+        block = array(stack[:, rows])
+        matrix_average[rows] = average(block, axis=0)
+
+        if method == 'sdev':
+            # calculate std error for each sample in each dimension
+            sdevs = block.std(axis=0, ddof=1)
+            matrix_low[rows] = -sdevs/2
+            matrix_high[rows] = sdevs/2
+        else:
+            block.sort(axis=0)
+            if method == 'IQR':
+                matrix_low[rows], matrix_high[rows] = _sorted_IQR(block)
+            else:
+                matrix_low[rows], matrix_high[rows] = \
+                    _sorted_idealfourths(block)
 
     return matrix_average, matrix_low, matrix_high
 
@@ -393,13 +455,36 @@ def IQR(x):
 def matrix_IQR(x):
     """calculates the IQR for each column in an array
     """
-    num_cols = x.shape[1]
-    min_vals = zeros(num_cols)
-    max_vals = zeros(num_cols)
-    for i in range(x.shape[1]):
-        col = x[:, i]
-        min_vals[i], max_vals[i] = IQR(col)
-    return min_vals, max_vals
+    return _sorted_IQR(numpy_sort(x, axis=0))
+
+def _sorted_IQR(x):
+    """calculates the IQR along the first axis of an array sorted on that axis
+
+    The values are the same as with IQR, computed for all the columns at once.
+    """
+    #split values into lower and upper portions at the median
+    n = x.shape[0]
+    midpoint = n // 2
+    low_vals = x[:midpoint]
+    high_vals = x[midpoint + n % 2:]
+    #find the median of the low and high values
+    return median(low_vals, axis=0), median(high_vals, axis=0)
+
+def _sorted_idealfourths(x):
+    """ideal fourths along the first axis of an array sorted on that axis
+
+    The values are the same as with idealfourths, computed for all the
+    columns at once.
+    """
+    n = x.shape[0]
+    if n < 3:
+        return full(x.shape[1:], numpy_nan), full(x.shape[1:], numpy_nan)
+    (j,h) = divmod(n/4. + 5/12.,1)
+    j = int(j)
+    qlo = (1-h)*x[j-1] + h*x[j]
+    k = n - j
+    qup = (1-h)*x[k] + h*x[k-1]
+    return qlo, qup
 
 def idealfourths(data, axis=None):
     """This function returns an estimate of the lower and upper quartiles of the data along
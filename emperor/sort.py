@@ -7,7 +7,8 @@
 # ----------------------------------------------------------------------------
 from __future__ import division
 
-from numpy import zeros
+from numpy import asarray, array
+from scipy.sparse import issparse
 import re
 
 
@@ -21,8 +22,8 @@ def sort_taxa_table_by_pcoa_coords(coords_header, otu_table, otu_header):
     ----------
     coords_header: list of str
         sample ids that are present in principal coordinates data
-    otu_table: numpy array
-        numpy array with the data for an otu table
+    otu_table: numpy array or scipy.sparse matrix
+        numpy array with the data for an otu table, the samples are columns
     otu_header: list of str
         sample ids present in the otu table
 
@@ -31,25 +32,32 @@ def sort_taxa_table_by_pcoa_coords(coords_header, otu_table, otu_header):
     sorted_otu_headers: list of str
         sample ids that were present in the coords_header list, the order in
         this table matches the order of the coordinates data
-    sorted_otu_table: numpy array
+    sorted_otu_table: numpy array or scipy.sparse.csc_matrix
         otu table data with columns belonging to the sample ids in the
-        sorted_otu_headers list
-    """
-
-    sorted_otu_headers = []
+        sorted_otu_headers list, sparse tables are not densified
 
-    # the size of the otu table can be pre-allocated for better memory usage
-    matching_headers = len(set(coords_header) & set(otu_header))
-    sorted_otu_table = zeros([otu_table.shape[0], matching_headers])
+    Notes
+    -----
+    If a sample id is repeated in otu_header, the first column is used.
+    """
 
-    # iterate through the available sample ids in the coordinates file and work
-    # only with the ones that are present in the coords and the otu table; the
-    # order of the ids is important hence iterate through the original list
-    for i, element in enumerate(coords_header):
-        if element in otu_header:
-            current_index = otu_header.index(element)
-            sorted_otu_table[:, i] = otu_table[:, current_index]
-            sorted_otu_headers.append(element)
+    # map each sample id to its column, so the lookups are constant time
+    columns = {}
+    for i, element in enumerate(otu_header):
+        columns.setdefault(element, i)
+
+    # work only with the ids that are present in the coords and the otu table;
+    # the order of the ids is important hence iterate through the original list
+    sorted_otu_headers = [element for element in coords_header
+                          if element in columns]
+    indices = array([columns[element] for element in sorted_otu_headers],
+                    dtype=int)
+
+    # gather all the columns at once
+    if issparse(otu_table):
+        sorted_otu_table = otu_table.tocsc()[:, indices].astype(float)
+    else:
+        sorted_otu_table = asarray(otu_table, dtype=float)[:, indices]
 
     return sorted_otu_headers, sorted_otu_table
 
@@ -485,7 +485,7 @@ define([
       data[p.name] = p.metadata;
 
       // get the view's position, not the metadata's position
-      pos = view.markers[p.idx].position;
+      pos = view.getMarkerPosition(p.idx);
       positions[p.name] = {'name': p.name, 'color': 0, 'x': pos.x,
                            'y': pos.y, 'z': pos.z};
     }
@@ -5,10 +5,8 @@ define([
     'view',
     'viewcontroller',
     'color-editor',
-    'chroma',
-    'three'
-], function($, _, util, DecompositionView, ViewControllers, Color, chroma,
-            THREE) {
+    'chroma'
+], function($, _, util, DecompositionView, ViewControllers, Color, chroma) {
 
   // we only use the base attribute class, no need to get the base class
   var EmperorAttributeABC = ViewControllers.EmperorAttributeABC;
@@ -541,19 +539,7 @@ define([
    */
   ColorViewController.prototype.setPlottableAttributes =
   function(scope, color, group) {
-
-    var idx, hasConfidenceIntervals;
-
-    hasConfidenceIntervals = scope.decomp.hasConfidenceIntervals();
-
-    _.each(group, function(element) {
-      idx = element.idx;
-      scope.markers[idx].material.color = new THREE.Color(color);
-
-      if (hasConfidenceIntervals) {
-        scope.ellipsoids[idx].material.color = new THREE.Color(color);
-      }
-    });
+    scope.setGroupColor(color, group);
     scope.needsUpdate = true;
   };
 
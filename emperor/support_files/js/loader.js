@@ -0,0 +1,334 @@
+/** @module loader */
+define(['underscore', 'util', 'model'], function(_, util, model) {
+  var DecompositionModel = model.DecompositionModel;
+
+  /**
+   *
+   * Names of the static `DecompositionModel` functions needed to prepare the
+   * data, these are copied into the worker's source code.
+   *
+   * @type {String[]}
+   * @private
+   */
+  var MODEL_FUNCTIONS = ['prepareData', '_flattenRows', '_ranges',
+                         '_encodeMetadata', '_codesArray'];
+
+  /**
+   *
+   * Size (in characters) of the embedded data above which the data is
+   * decoded in a web worker. Smaller plots are decoded faster than a worker
+   * can be started.
+   *
+   * @type {Integer}
+   * @default
+   */
+  var WORKER_MIN_SIZE = 4 * 1024 * 1024;
+
+  /**
+   *
+   * Check if the browser can decode the data in a web worker.
+   *
+   * @return {Boolean} Whether the `Worker`, `Blob`, `Promise` and
+   * `URL.createObjectURL` APIs are available.
+   * @function canUseWorker
+   */
+  function canUseWorker() {
+    return typeof Worker !== 'undefined' && typeof Blob !== 'undefined' &&
+           typeof Promise !== 'undefined' && typeof URL !== 'undefined' &&
+           typeof URL.createObjectURL === 'function';
+  }
+
+  /**
+   *
+   * Merge the attributes of a list of objects into a single object.
+   *
+   * @param {Object[]} objects The objects to merge, later objects take
+   * precedence.
+   *
+   * @return {Object} An object with the attributes of all the objects.
+   * @function mergeData
+   */
+  function mergeData(objects) {
+    var data = {}, key, i;
+
+    for (i = 0; i < objects.length; i++) {
+      for (key in objects[i]) {
+        data[key] = objects[i][key];
+      }
+    }
+
+    return data;
+  }
+
+  /**
+   *
+   * Parse the embedded plot data in the main thread.
+   *
+   * @param {Object[]} sources Objects with a `text` attribute with a JSON
+   * string, see `decodeData`.
+   *
+   * @return {Object} The merged plot data, with the `decompositions`,
+   * `metadata_headers` and `metadata` attributes.
+   * @function parseData
+   */
+  function parseData(sources) {
+    return mergeData(_.map(sources, function(source) {
+      return JSON.parse(source.text);
+    }));
+  }
+
+  /**
+   *
+   * Load, parse and decode the plot data.
+   *
+   * This function only refers to `util`, `DecompositionModel` and
+   * `mergeData`, and it can be executed in a web worker (see
+   * `workerSource`). It requires support for promises.
+   *
+   * @param {Object[]} sources Where to read the data from. Each object has
+   * either a `url` attribute with the location of a (possibly gzip-compressed)
+   * JSON file, or a `text` attribute with a JSON string. The attributes of all
+   * the parsed objects are merged.
+   * @param {Function} progress A function called with a short description of
+   * each step.
+   *
+   * @return {Promise} A promise that resolves to an object with the
+   * `metadata_headers` and the `decompositions` of the plot. The coordinates,
+   * confidence intervals and metadata of each decomposition are replaced by a
+   * `columns` attribute (see `DecompositionModel.prepareData`).
+   * @function decodeData
+   */
+  function decodeData(sources, progress) {
+    progress('Loading the data');
+
+    return Promise.all(sources.map(function(source) {
+      if (source.url !== undefined) {
+        return util.fetchJSON(source.url);
+      }
+      return JSON.parse(source.text);
+    })).then(function(loaded) {
+      var data = mergeData(loaded), result, decomposition, key, i;
+
+      result = {'metadata_headers': data.metadata_headers,
+                'decompositions': []};
+
+      for (i = 0; i < data.decompositions.length; i++) {
+        decomposition = {};
+        for (key in data.decompositions[i]) {
+          if (key !== 'coordinates' && key !== 'ci') {
+            decomposition[key] = data.decompositions[i][key];
+          }
+        }
+
+        decomposition.columns = DecompositionModel.prepareData(
+          data.decompositions[i], data.metadata_headers, data.metadata,
+          progress);
+        result.decompositions.push(decomposition);
+      }
+
+      return result;
+    });
+  }
+
+  /**
+   *
+   * List the buffers of the typed arrays in the decoded data.
+   *
+   * @param {Object} result The object produced by `decodeData`.
+   *
+   * @return {ArrayBuffer[]} The distinct buffers, these can be transferred
+   * instead of copied when the data is sent to the main thread.
+   * @function transferables
+   */
+  function transferables(result) {
+    var buffers = [];
+
+    function add(array) {
+      if (buffers.indexOf(array.buffer) === -1) {
+        buffers.push(array.buffer);
+      }
+    }
+
+    result.decompositions.forEach(function(decomposition) {
+      add(decomposition.columns.coordinates);
+      add(decomposition.columns.ci);
+      decomposition.columns.metadata.codes.forEach(add);
+    });
+
+    return buffers;
+  }
+
+  /**
+   *
+   * Entry point of the worker.
+   *
+   * The worker expects a single message with the data sources (see
+   * `decodeData`), and replies with messages that have either a `progress`, a
+   * `result` or an `error` attribute.
+   *
+   * @function workerMain
+   * @private
+   */
+  function workerMain() {
+    self.onmessage = function(event) {
+      decodeData(event.data, function(message) {
+        self.postMessage({'progress': message});
+      }).then(function(result) {
+        self.postMessage({'result': result}, transferables(result));
+      }).catch(function(error) {
+        self.postMessage({'error': error.message});
+      });
+    };
+  }
+
+  /**
+   *
+   * Assemble the source code of the worker.
+   *
+   * The worker is created from the source of the functions in this module
+   * (instead of a separate file) so it can be started from standalone files
+   * and from notebooks, where the location of the scripts is not known.
+   *
+   * @return {String} The JavaScript source code of the worker.
+   * @function workerSource
+   */
+  function workerSource() {
+    var source = [
+      'var util = {',
+      '  decodeFloat32Array: ' + util.decodeFloat32Array.toString() + ',',
+      '  fetchJSON: ' + util.fetchJSON.toString(),
+      '};',
+      'var DecompositionModel = {};'
+    ];
+
+    _.each(MODEL_FUNCTIONS, function(name) {
+      source.push('DecompositionModel.' + name + ' = ' +
+                  DecompositionModel[name].toString() + ';');
+    });
+
+    source.push('var mergeData = ' + mergeData.toString() + ';',
+                'var decodeData = ' + decodeData.toString() + ';',
+                'var transferables = ' + transferables.toString() + ';',
+                '(' + workerMain.toString() + ')();');
+
+    return source.join('\n');
+  }
+
+  /**
+   *
+   * Load and decode the plot data.
+   *
+   * Embedded data is parsed in the main thread, unless it is larger than
+   * `WORKER_MIN_SIZE` and the browser supports web workers. In that case, and
+   * when the data has to be fetched, the data is parsed and decoded in a web
+   * worker and the typed arrays are transferred back to the main thread, so
+   * the page stays responsive.
+   *
+   * @param {Object[]} sources Where to read the data from, see `decodeData`.
+   * @param {Function} progress A function called with a short description of
+   * each step.
+   * @param {Function} success A function called with the plot data. The
+   * object has a `decompositions` and a `metadata_headers` attributes, and a
+   * `metadata` attribute unless the data was decoded in a worker. In both
+   * cases, each decomposition can be used to create a `DecompositionModel`
+   * with these attributes.
+   * @param {Function} failure A function called with an `Error` if the data
+   * can't be loaded.
+   * @function loadData
+   */
+  function loadData(sources, progress, success, failure) {
+    var size = 0, remote = false, worker, url;
+
+    _.each(sources, function(source) {
+      if (source.url !== undefined) {
+        remote = true;
+      }
+      else {
+        size += source.text.length;
+      }
+    });
+
+    function decodeInThisThread() {
+      var data;
+
+      if (remote) {
+        if (typeof Promise === 'undefined' || typeof fetch === 'undefined') {
+          failure(new Error('this browser cannot fetch the data files'));
+          return;
+        }
+        decodeData(sources, progress).then(success, failure);
+        return;
+      }
+
+      try {
+        data = parseData(sources);
+      }
+      catch (error) {
+        failure(error);
+        return;
+      }
+      success(data);
+    }
+
+    if (!canUseWorker() || (!remote && size < WORKER_MIN_SIZE)) {
+      decodeInThisThread();
+      return;
+    }
+
+    // the worker is created from a blob, so relative locations are resolved
+    // with respect to the document
+    sources = _.map(sources, function(source) {
+      var anchor;
+
+      if (source.url === undefined) {
+        return source;
+      }
+      anchor = document.createElement('a');
+      anchor.href = source.url;
+      return {'url': anchor.href};
+    });
+
+    try {
+      url = URL.createObjectURL(new Blob([workerSource()],
+                                         {'type': 'text/javascript'}));
+      worker = new Worker(url);
+    }
+    catch (error) {
+      decodeInThisThread();
+      return;
+    }
+
+    function finish() {
+      worker.terminate();
+      URL.revokeObjectURL(url);
+    }
+
+    worker.onmessage = function(event) {
+      if (event.data.progress !== undefined) {
+        progress(event.data.progress);
+        return;
+      }
+
+      finish();
+      if (event.data.error !== undefined) {
+        failure(new Error(event.data.error));
+      }
+      else {
+        success(event.data.result);
+      }
+    };
+
+    // the worker failed to start, use the main thread instead
+    worker.onerror = function(event) {
+      event.preventDefault();
+      finish();
+      decodeInThisThread();
+    };
+
+    worker.postMessage(sources);
+  }
+
+  return {'loadData': loadData, 'parseData': parseData,
+          'decodeData': decodeData, 'canUseWorker': canUseWorker,
+          'workerSource': workerSource, 'WORKER_MIN_SIZE': WORKER_MIN_SIZE};
+});
@@ -10,6 +10,9 @@ function($, _, util) {
    *
    * Represents a sample and the associated metadata in the ordination space.
    *
+   * The plottables of a `DecompositionModel` are read-only views of the
+   * model's data, see `DecompositionModel.getPlottableByIndex`.
+   *
    * @param {string} name A string indicating the name of the sample.
    * @param {string[]} metadata An Array of strings with the metadata values.
    * @param {float[]} coordinates An Array of floats indicating the position in
@@ -96,13 +99,21 @@ function($, _, util) {
    *
    * Models all the ordination data to be plotted.
    *
+   * The data is stored by columns: the coordinates and the confidence
+   * intervals are kept in flat typed arrays (in row-major order), and the
+   * metadata is kept as dictionary-encoded columns. `Plottable` objects are
+   * only created when they are requested, and they read their attributes from
+   * these columns.
+   *
    * @param {object} data An object with the following attributes (keys):
    * - `name` A string containing the abbreviated name of the
    *   ordination method.
    * - `ids` An array of strings where each string is a sample
    *   identifier
    * - `coords` A 2D Array of floats where each row contains the
-   *   coordinates of a sample. The rows are in ids order.
+   *   coordinates of a sample. The rows are in ids order. Alternatively, an
+   *   object with a base64-encoded float32 buffer (see
+   *   `util.decodeFloat32Array`).
    * - `names` A 1D Array of strings where each element is the name of one of
    *   the dimensions in the model.
    * - `pct_var` An Array of floats where each position contains
@@ -115,7 +126,12 @@ function($, _, util) {
    * metadata column header
    * @param {string[]} metadata A 2D Array of strings where each row contains
    * the metadata values for a given sample. The rows are in ids order. The
-   * columns are in `md_headers` order.
+   * columns are in `md_headers` order. Alternatively, an object with
+   * dictionary-encoded columns (see `DecompositionModel._encodeMetadata`).
+   *
+   * The `data` object can also have a `columns` attribute with the output of
+   * `DecompositionModel.prepareData`, in which case the coordinates,
+   * confidence intervals and metadata are not validated again.
    *
    * @throws {Error} In any of the following cases:
    * - The number of coordinates does not match the number of samples.
@@ -129,9 +145,8 @@ function($, _, util) {
    *
    */
   function DecompositionModel(data, md_headers, metadata) {
-    var coords = data.coordinates, ci = data.ci || [];
+    var columns, i;
 
-    var num_coords;
     /**
      * Abbreviated name of the ordination method used to create the data.
      * @type {string}
@@ -153,65 +168,70 @@ function($, _, util) {
      */
     this.md_headers = md_headers;
 
-    if (coords === undefined) {
-      throw new Error('Coordinates are required to initialize this object.');
+    // the columns can be prepared ahead of time, e.g. by the loader module
+    if (data.columns !== undefined) {
+      columns = data.columns;
     }
-
-    /*
-      Check that the number of coordinates set provided are the same as the
-      number of samples
-    */
-    if (this.ids.length !== coords.length) {
-      throw new Error('The number of coordinates differs from the number of ' +
-                      'samples. Coords: ' + coords.length + ' samples: ' +
-                      this.ids.length);
-    }
-
-    /*
-      Check that all the coords set have the same number of coordinates
-    */
-    num_coords = coords[0].length;
-    var res = _.find(coords, function(c) {return c.length !== num_coords;});
-    if (res !== undefined) {
-      throw new Error('Not all samples have the same number of coordinates');
+    else {
+      columns = DecompositionModel.prepareData(data, md_headers, metadata);
     }
 
-    /*
-      Check that we have the percentage explained values for all coordinates
-    */
-    if (this.percExpl.length !== num_coords) {
-      throw new Error('The number of percentage explained values does not ' +
-                      'match the number of coordinates. Perc expl: ' +
-                      this.percExpl.length + ' Num coord: ' + num_coords);
-    }
+    /**
+     * Coordinates of all the samples, one row per sample. Binary-encoded
+     * coordinates are stored with single precision, coordinates provided as
+     * arrays of numbers keep their double precision.
+     * @type {Float32Array|Float64Array}
+     * @private
+     */
+    this._coordinates = columns.coordinates;
 
-    /*
-      Check that we have the metadata for all samples
-    */
-    if (this.ids.length !== metadata.length) {
-      throw new Error('The number of metadata rows and the the number of ' +
-                      'samples do not match. Samples: ' + this.ids.length +
-                      ' Metadata rows: ' + metadata.length);
-    }
+    /**
+     * Confidence intervals of all the samples in the same layout as
+     * `_coordinates`, empty if there are no confidence intervals.
+     * @type {Float32Array|Float64Array}
+     * @private
+     */
+    this._ci = columns.ci;
 
-    /*
-      Check that we have all the metadata categories in all rows
-    */
-    res = _.find(metadata, function(m) {
-                  return m.length !== md_headers.length;
-    });
-    if (res !== undefined) {
-      throw new Error('Not all metadata rows have the same number of values');
-    }
+    /**
+     * Dictionary-encoded metadata. An object with a `values` attribute (the
+     * distinct metadata values) and a `codes` attribute (one typed array per
+     * metadata column with the index in `values` of each sample's value).
+     * @type {Object}
+     * @private
+     */
+    this._metadata = columns.metadata;
 
-    this.plottable = new Array(this.ids.length);
+    /**
+     * Object mapping sample identifiers to their position in `ids`, see
+     * `_indexOfID`.
+     * @type {Object}
+     * @private
+     */
+    this._idIndex = {};
     for (i = 0; i < this.ids.length; i++) {
-      // note that ci[i] can be empty
-      this.plottable[i] = new Plottable(this.ids[i], metadata[i], coords[i], i,
-                                        ci[i]);
+      // keep the first occurrence, as indexOf would
+      if (!_.has(this._idIndex, this.ids[i])) {
+        this._idIndex[this.ids[i]] = i;
+      }
     }
 
-    // use slice to make a copy of the array so we can modify it
+    /**
+     * Inverted indices for the metadata categories, built lazily by
+     * `_getCategoryIndex` and keyed by metadata header.
+     * @type {Object}
+     * @private
+     */
+    this._categoryIndex = {};
+
+    /**
+     * Prototype of the plottables created by this model, see
+     * `getPlottableByIndex`.
+     * @type {Object}
+     * @private
+     */
+    this._plottablePrototype = this._createPlottablePrototype();
+
     /**
      * Minimum and maximum values for each axis in the ordination. More
      * concretely this object has a `min` and a `max` attributes, each with a
@@ -219,23 +239,19 @@ function($, _, util) {
      * each axis.
      * @type {Object}
      */
-    this.dimensionRanges = {'min': coords[0].slice(),
-                            'max': coords[0].slice()};
-    this.dimensionRanges = _.reduce(this.plottable,
-                                    DecompositionModel._minMaxReduce,
-                                    this.dimensionRanges);
+    this.dimensionRanges = columns.dimensionRanges;
 
     /**
      * Number of plottables in this decomposition model
      * @type {integer}
      */
-    this.length = this.plottable.length;
+    this.length = this.ids.length;
 
     /**
      * Number of dimensions in this decomposition model
      * @type {integer}
      */
-    this.dimensions = this.dimensionRanges.min.length;
+    this.dimensions = columns.dimensions;
 
     /**
      * Names of the axes in the ordination
@@ -253,6 +269,77 @@ function($, _, util) {
     // this.serialComparison = false;
   }
 
+  /**
+   * Array with a plottable object for each sample, in ids order. The array is
+   * created the first time it is accessed, prefer `getPlottableByIndex` or
+   * `apply` when only a few plottables are needed.
+   * @type {Plottable[]}
+   */
+  Object.defineProperty(DecompositionModel.prototype, 'plottable', {
+    'get': function() {
+      var i;
+
+      if (this._plottables === undefined) {
+        this._plottables = new Array(this.length);
+        for (i = 0; i < this.length; i++) {
+          this._plottables[i] = Object.create(this._plottablePrototype);
+          this._plottables[i].idx = i;
+        }
+      }
+      return this._plottables;
+    }
+  });
+
+  /**
+   *
+   * Create the prototype of the plottables in this model.
+   *
+   * The plottables only store their index, the name, metadata, coordinates
+   * and confidence intervals are read from the model when they are accessed.
+   *
+   * @return {Object} An object that inherits from `Plottable.prototype`.
+   * @private
+   *
+   */
+  DecompositionModel.prototype._createPlottablePrototype = function() {
+    var model = this;
+
+    function row(values, idx) {
+      var dims = model.dimensions;
+      return Array.prototype.slice.call(values.subarray(idx * dims,
+                                                        (idx + 1) * dims));
+    }
+
+    return Object.create(Plottable.prototype, {
+      'name': {
+        'get': function() { return model.ids[this.idx]; },
+        'enumerable': true
+      },
+      'metadata': {
+        'get': function() {
+          var codes = model._metadata.codes, values = model._metadata.values,
+              metadata = new Array(codes.length), j;
+
+          for (j = 0; j < codes.length; j++) {
+            metadata[j] = values[codes[j][this.idx]];
+          }
+          return metadata;
+        },
+        'enumerable': true
+      },
+      'coordinates': {
+        'get': function() { return row(model._coordinates, this.idx); },
+        'enumerable': true
+      },
+      'ci': {
+        'get': function() {
+          return model._ci.length === 0 ? [] : row(model._ci, this.idx);
+        },
+        'enumerable': true
+      }
+    });
+  };
+
   /**
    *
    * Whether or not the plottables have confidence intervals
@@ -262,13 +349,64 @@ function($, _, util) {
    *
    */
   DecompositionModel.prototype.hasConfidenceIntervals = function() {
-    if (this.plottable.length <= 0) {
-      return false;
+    return this._ci.length > 0;
+  };
+
+  /**
+   *
+   * Retrieve the value of a sample in one dimension.
+   *
+   * @param {integer} index The index of the sample.
+   * @param {integer} dimension The index of the dimension.
+   *
+   * @return {float} The coordinate of the sample.
+   *
+   */
+  DecompositionModel.prototype.getCoordinate = function(index, dimension) {
+    return this._coordinates[index * this.dimensions + dimension];
+  };
+
+  /**
+   *
+   * Retrieve the confidence interval of a sample in one dimension.
+   *
+   * @param {integer} index The index of the sample.
+   * @param {integer} dimension The index of the dimension.
+   *
+   * @return {float} The confidence interval of the sample, `undefined` if the
+   * model has no confidence intervals.
+   *
+   */
+  DecompositionModel.prototype.getConfidenceInterval = function(index,
+                                                                dimension) {
+    return this._ci[index * this.dimensions + dimension];
+  };
+
+  /**
+   *
+   * Retrieve the plottable object at a given position.
+   *
+   * @param {integer} index The position of the plottable, i.e. the index of
+   * the sample in `ids`.
+   *
+   * @return {Plottable} The plottable object at the given position.
+   *
+   */
+  DecompositionModel.prototype.getPlottableByIndex = function(index) {
+    var plottable;
+
+    if (index < 0 || index >= this.length) {
+      throw new Error(index + ' is not a valid index in the Decomposition ' +
+                      'Model');
     }
-    else if (this.plottable[0].ci.length > 0) {
-      return true;
+
+    if (this._plottables !== undefined) {
+      return this._plottables[index];
     }
-    return false;
+
+    plottable = Object.create(this._plottablePrototype);
+    plottable.idx = index;
+    return plottable;
   };
 
   /**
@@ -281,11 +419,33 @@ function($, _, util) {
    *
    */
   DecompositionModel.prototype.getPlottableByID = function(id) {
-    idx = this.ids.indexOf(id);
+    var idx = this._indexOfID(id);
+
     if (idx === -1) {
       throw new Error(id + ' is not found in the Decomposition Model ids');
     }
-    return this.plottable[idx];
+    return this.getPlottableByIndex(idx);
+  };
+
+  /**
+   *
+   * Find the position of a sample identifier in `ids`.
+   *
+   * @param {string} id The identifier of the sample.
+   *
+   * @return {integer} The position of the first occurrence of `id`, or -1 if
+   * the identifier is not in this model.
+   * @private
+   *
+   */
+  DecompositionModel.prototype._indexOfID = function(id) {
+    var idx = _.has(this._idIndex, id) ? this._idIndex[id] : -1;
+
+    // the keys are strings, search the ids if the types don't match
+    if (idx !== -1 && this.ids[idx] !== id) {
+      idx = this.ids.indexOf(id);
+    }
+    return idx;
   };
 
   /**
@@ -336,15 +496,16 @@ function($, _, util) {
   DecompositionModel.prototype.getPlottablesByMetadataCategoryValue = function(
       category, value) {
 
-    var md_idx = this._getMetadataIndex(category);
-    var res = _.filter(this.plottable, function(pl) {
-      return pl.metadata[md_idx] === value; });
+    var index = this._getCategoryIndex(category), scope = this;
 
-    if (res.length === 0) {
+    if (!_.has(index.indices, value) ||
+        index.values[index.order[value]] !== value) {
       throw new Error('The value ' + value +
                       ' is not found in the metadata category ' + category);
     }
-    return res;
+    return _.map(index.indices[value], function(i) {
+      return scope.getPlottableByIndex(i);
+    });
   };
 
   /**
@@ -358,9 +519,118 @@ function($, _, util) {
    *
    */
   DecompositionModel.prototype.getUniqueValuesByCategory = function(category) {
-    var md_idx = this._getMetadataIndex(category);
-    return _.uniq(
-      _.map(this.plottable, function(pl) {return pl.metadata[md_idx];}));
+    return this._getCategoryIndex(category).values.slice();
+  };
+
+  /**
+   *
+   * Retrieve the inverted index of a metadata category.
+   *
+   * The index is built the first time a category is requested and reused
+   * until `invalidateMetadataIndex` is called.
+   *
+   * @param {string} category A string with the metadata header.
+   *
+   * @return {Object} An object with a `values` attribute (the unique values
+   * in the order they first appear), an `order` attribute (the position of
+   * each value in `values`) and an `indices` attribute (the positions of the
+   * plottables for each value).
+   * @private
+   *
+   */
+  DecompositionModel.prototype._getCategoryIndex = function(category) {
+    var md_idx = this._getMetadataIndex(category), index, codes, values,
+        positions, groups = [], value, pos, i;
+
+    if (_.has(this._categoryIndex, category)) {
+      return this._categoryIndex[category];
+    }
+
+    codes = this._metadata.codes[md_idx];
+    values = this._metadata.values;
+
+    // position in index.values of each code, -1 if the code is not used
+    positions = new Int32Array(values.length);
+    for (i = 0; i < positions.length; i++) {
+      positions[i] = -1;
+    }
+
+    index = {'values': [], 'order': {}, 'indices': {}};
+    for (i = 0; i < codes.length; i++) {
+      pos = positions[codes[i]];
+
+      if (pos === -1) {
+        value = values[codes[i]];
+
+        if (!_.has(index.order, value)) {
+          index.order[value] = index.values.length;
+          index.values.push(value);
+          groups.push([]);
+        }
+        pos = positions[codes[i]] = index.order[value];
+      }
+      groups[pos].push(i);
+    }
+
+    for (i = 0; i < groups.length; i++) {
+      index.indices[index.values[i]] = groups[i];
+    }
+
+    this._categoryIndex[category] = index;
+    return index;
+  };
+
+  /**
+   *
+   * Discard the cached metadata indices.
+   *
+   * Should be called whenever the metadata is modified, otherwise the
+   * category lookups will reflect the old values. `setMetadataValue` calls
+   * this method automatically.
+   *
+   * @param {string} [category] The metadata header to invalidate, if not
+   * provided all the categories are invalidated.
+   *
+   */
+  DecompositionModel.prototype.invalidateMetadataIndex = function(category) {
+    if (category === undefined) {
+      this._categoryIndex = {};
+    }
+    else {
+      delete this._categoryIndex[category];
+    }
+  };
+
+  /**
+   *
+   * Change the metadata value of a sample.
+   *
+   * @param {string} id The identifier of the sample.
+   * @param {string} category The metadata header to modify.
+   * @param {string} value The new metadata value.
+   *
+   */
+  DecompositionModel.prototype.setMetadataValue = function(id, category,
+                                                           value) {
+    var md_idx = this._getMetadataIndex(category), idx = this._indexOfID(id),
+        values, code;
+
+    if (idx === -1) {
+      throw new Error(id + ' is not found in the Decomposition Model ids');
+    }
+
+    values = this._metadata.values;
+    code = values.indexOf(value);
+    if (code === -1) {
+      code = values.push(value) - 1;
+
+      // the new code might not fit in the column's typed array
+      this._metadata.codes[md_idx] = DecompositionModel._codesArray(
+        this._metadata.codes[md_idx], values.length);
+    }
+
+    this._metadata.codes[md_idx][idx] = code;
+    this.invalidateMetadataIndex(category);
   };
 
   /**
@@ -375,37 +645,306 @@ function($, _, util) {
    *
    */
   DecompositionModel.prototype.apply = function(func) {
-    return _.map(this.plottable, func);
+    var res = new Array(this.length), i;
+
+    for (i = 0; i < this.length; i++) {
+      res[i] = func(this.getPlottableByIndex(i));
+    }
+    return res;
   };
 
   /**
    *
-   * Helper function used to find the minimum and maximum values every
-   * dimension in the plottable objects. This function is used with
-   * underscore.js' reduce function (_.reduce).
+   * Validate the ordination data and convert it to the columns used by
+   * `DecompositionModel`.
+   *
+   * This function and the static helpers it uses only depend on
+   * `util.decodeFloat32Array`, so they can be executed in a web worker (see
+   * the `loader` module).
    *
-   * @param {Object} accumulator An object with a "min" and "max" arrays that
-   * store the minimum and maximum values over all the plottables.
-   * @param {Plottable} plottable A plottable object to compare with.
+   * @param {object} data The ordination data, see `DecompositionModel`.
+   * @param {string[]} md_headers The metadata column headers.
+   * @param {string[]|Object} metadata The metadata, see `DecompositionModel`.
+   * @param {Function} [progress] A function called with a short description
+   * of each step.
    *
-   * @return {Object} An updated version of accumulator, integrating the ranges
-   * of the newly seen plottable object.
+   * @return {Object} An object with `coordinates`, `ci`, `metadata`,
+   * `dimensions` and `dimensionRanges` attributes. This object can be set as
+   * the `columns` attribute of `data` when creating a `DecompositionModel`.
+   * @throws {Error} In any of the cases described in `DecompositionModel`.
+   *
+   **/
+  DecompositionModel.prepareData = function(data, md_headers, metadata,
+                                            progress) {
+    var coords = data.coordinates, ci = data.ci || [], ids = data.sample_ids,
+        coordinates, codes, num_coords, num_rows, encoded = false, i;
+
+    progress = progress || function() {};
+
+    if (coords === undefined) {
+      throw new Error('Coordinates are required to initialize this object.');
+    }
+
+    // coordinates and confidence intervals can be encoded as binary buffers
+    if (Array.isArray(coords)) {
+      num_rows = coords.length;
+      num_coords = num_rows > 0 ? coords[0].length : 0;
+    }
+    else {
+      num_rows = coords.shape[0];
+      num_coords = coords.shape[1];
+      encoded = true;
+    }
+
+    /*
+      Check that the number of coordinates set provided are the same as the
+      number of samples
+    */
+    if (ids.length !== num_rows) {
+      throw new Error('The number of coordinates differs from the number of ' +
+                      'samples. Coords: ' + num_rows + ' samples: ' +
+                      ids.length);
+    }
+
+    /*
+      Check that we have the percentage explained values for all coordinates
+    */
+    if (data.percents_explained.length !== num_coords) {
+      throw new Error('The number of percentage explained values does not ' +
+                      'match the number of coordinates. Perc expl: ' +
+                      data.percents_explained.length + ' Num coord: ' +
+                      num_coords);
+    }
+
+    progress('Decoding the coordinates');
+    if (encoded) {
+      coordinates = util.decodeFloat32Array(coords);
+    }
+    else {
+      coordinates = DecompositionModel._flattenRows(coords, num_coords,
+        'Not all samples have the same number of coordinates');
+    }
+
+    if (!Array.isArray(ci)) {
+      ci = util.decodeFloat32Array(ci);
+    }
+    else {
+      ci = DecompositionModel._flattenRows(
+        ci, num_coords, "The number of confidence intervals doesn't match " +
+        'with the number of dimensions in the coordinates.');
+    }
+
+    if (ci.length !== 0 && ci.length !== coordinates.length) {
+      throw new Error('The number of confidence intervals differs from the ' +
+                      'number of samples.');
+    }
+
+    progress('Encoding the metadata');
+    if (Array.isArray(metadata)) {
+      /*
+        Check that we have the metadata for all samples
+      */
+      if (ids.length !== metadata.length) {
+        throw new Error('The number of metadata rows and the the number of ' +
+                        'samples do not match. Samples: ' + ids.length +
+                        ' Metadata rows: ' + metadata.length);
+      }
+
+      /*
+        Check that we have all the metadata categories in all rows
+      */
+      for (i = 0; i < metadata.length; i++) {
+        if (metadata[i].length !== md_headers.length) {
+          throw new Error('Not all metadata rows have the same number of ' +
+                          'values');
+        }
+      }
+
+      metadata = DecompositionModel._encodeMetadata(metadata,
+                                                    md_headers.length);
+    }
+    else {
+      num_rows = metadata.codes.length > 0 ? metadata.codes[0].length : 0;
+
+      if (ids.length !== num_rows) {
+        throw new Error('The number of metadata rows and the the number of ' +
+                        'samples do not match. Samples: ' + ids.length +
+                        ' Metadata rows: ' + num_rows);
+      }
+
+      for (i = 0; i < metadata.codes.length; i++) {
+        if (metadata.codes[i].length !== num_rows) {
+          break;
+        }
+      }
+      if (i !== metadata.codes.length ||
+          metadata.codes.length !== md_headers.length) {
+        throw new Error('Not all metadata rows have the same number of ' +
+                        'values');
+      }
+
+      codes = [];
+      for (i = 0; i < metadata.codes.length; i++) {
+        codes.push(DecompositionModel._codesArray(metadata.codes[i],
+                                                  metadata.values.length));
+      }
+      metadata = {'values': metadata.values.slice(), 'codes': codes};
+    }
+
+    progress('Computing the axes ranges');
+    return {
+      'coordinates': coordinates,
+      'ci': ci,
+      'metadata': metadata,
+      'dimensions': num_coords,
+      'dimensionRanges': DecompositionModel._ranges(coordinates, num_coords)
+    };
+  };
+
+  /**
+   *
+   * Copy an array of rows into a flat typed array.
+   *
+   * Non-finite values are serialized as `null` in JSON, these values are
+   * stored as `NaN`.
+   *
+   * @param {float[][]} rows The rows to copy.
+   * @param {integer} columns The number of values in each row.
+   * @param {string} message The error message used when a row doesn't have
+   * `columns` values.
+   *
+   * @return {Float64Array} The values of all the rows in row-major order.
+   * @throws {Error} If a row doesn't have `columns` values.
    * @private
    *
    **/
-  DecompositionModel._minMaxReduce = function(accumulator, plottable) {
+  DecompositionModel._flattenRows = function(rows, columns, message) {
+    var values = new Float64Array(rows.length * columns), value, i, j;
 
-    // iterate over every dimension
-    _.each(plottable.coordinates, function(value, index) {
-      if (value > accumulator.max[index]) {
-        accumulator.max[index] = value;
+    for (i = 0; i < rows.length; i++) {
+      if (rows[i].length !== columns) {
+        throw new Error(message);
       }
-      else if (value < accumulator.min[index]) {
-        accumulator.min[index] = value;
+
+      for (j = 0; j < columns; j++) {
+        value = rows[i][j];
+        values[i * columns + j] = value === null ? NaN : value;
       }
-    });
+    }
+
+    return values;
+  };
+
+  /**
+   *
+   * Find the minimum and maximum values of every dimension.
+   *
+   * @param {Float32Array|Float64Array} values The coordinates of all the
+   * samples in row-major order.
+   * @param {integer} columns The number of dimensions.
+   *
+   * @return {Object} An object with a "min" and "max" arrays with the
+   * minimum and maximum values in each dimension.
+   * @private
+   *
+   **/
+  DecompositionModel._ranges = function(values, columns) {
+    var min = Array.prototype.slice.call(values.subarray(0, columns)),
+        max = min.slice(), value, i, j;
+
+    for (i = columns; i < values.length; i += columns) {
+      for (j = 0; j < columns; j++) {
+        value = values[i + j];
+
+        if (value > max[j]) {
+          max[j] = value;
+        }
+        else if (value < min[j]) {
+          min[j] = value;
+        }
+      }
+    }
+
+    return {'min': min, 'max': max};
+  };
+
+  /**
+   *
+   * Dictionary-encode the metadata rows.
+   *
+   * @param {string[][]} rows The metadata rows, one per sample.
+   * @param {integer} columns The number of metadata columns.
+   *
+   * @return {Object} An object with a `values` attribute (an array with all
+   * the distinct metadata values) and a `codes` attribute (an array with one
+   * typed array per metadata column, each element is the index of the
+   * sample's value in `values`).
+   * @private
+   *
+   **/
+  DecompositionModel._encodeMetadata = function(rows, columns) {
+    var values = [], strings = Object.create(null),
+        others = Object.create(null), codes = [], lookup, key, code, i, j;
+
+    for (j = 0; j < columns; j++) {
+      codes.push(new Uint32Array(rows.length));
+    }
+
+    for (i = 0; i < rows.length; i++) {
+      for (j = 0; j < columns; j++) {
+        key = rows[i][j];
+
+        // object keys are strings, values of other types are keyed with
+        // their type so that e.g. 1 and '1' are encoded separately
+        if (typeof key === 'string') {
+          lookup = strings;
+        }
+        else {
+          lookup = others;
+          key = typeof key + ':' + key;
+        }
+        code = lookup[key];
+
+        if (code === undefined) {
+          code = values.length;
+          lookup[key] = code;
+          values.push(rows[i][j]);
+        }
+        codes[j][i] = code;
+      }
+    }
+
+    for (j = 0; j < columns; j++) {
+      codes[j] = DecompositionModel._codesArray(codes[j], values.length);
+    }
+
+    return {'values': values, 'codes': codes};
+  };
+
+  /**
+   *
+   * Store the codes of a dictionary-encoded column in the smallest typed
+   * array that can hold them.
+   *
+   * @param {integer[]} codes The codes of the column.
+   * @param {integer} size The number of distinct values in the dictionary.
+   *
+   * @return {Uint8Array|Uint16Array|Uint32Array} The codes of the column,
+   * `codes` itself if it already has the right type.
+   * @private
+   *
+   **/
+  DecompositionModel._codesArray = function(codes, size) {
+    var Type = Uint32Array;
+
+    if (size <= 256) {
+      Type = Uint8Array;
+    }
+    else if (size <= 65536) {
+      Type = Uint16Array;
+    }
 
-    return accumulator;
+    return codes instanceof Type ? codes : new Type(codes);
   };
 
   /**
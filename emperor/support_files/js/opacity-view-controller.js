@@ -48,14 +48,7 @@ define([
   OpacityViewController.prototype.setPlottableAttributes = function(scope,
                                                                     opacity,
                                                                     group) {
-    var transparent = opacity !== 1;
-
-    // webgl acts up with transparent objects, so we only set them to be
-    // explicitly transparent if the opacity is not at full
-    _.each(group, function(element) {
-      scope.markers[element.idx].material.transparent = transparent;
-      scope.markers[element.idx].material.opacity = opacity;
-    });
+    scope.setGroupOpacity(opacity, group);
     scope.needsUpdate = true;
   };
 
@@ -68,14 +61,9 @@ define([
    *
    */
   OpacityViewController.prototype.setAllPlottableAttributes = function(value) {
-    var dv = this.getView(), transparent = value !== 1;
+    var dv = this.getView();
 
-    // webgl acts up with transparent objects, so we only set them to be
-    // explicitly transparent if the opacity is not at full
-    _.each(dv.markers, function(element) {
-      element.material.transparent = transparent;
-      element.material.opacity = value;
-    });
+    dv.setGroupOpacity(value, dv.decomp.plottable);
     dv.needsUpdate = true;
   };
 
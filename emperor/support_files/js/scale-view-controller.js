@@ -46,12 +46,7 @@ define([
    */
   ScaleViewController.prototype.setPlottableAttributes = function(scope, scale,
                                                                   group) {
-    var idx;
-
-    _.each(group, function(element) {
-      idx = element.idx;
-      scope.markers[idx].scale.set(scale, scale, scale);
-    });
+    scope.setGroupScale(scale, group);
     scope.needsUpdate = true;
   };
 
@@ -68,9 +63,7 @@ define([
   ScaleViewController.prototype.setAllPlottableAttributes = function(value) {
     var dv = this.getView();
 
-    _.each(dv.markers, function(element) {
-      element.scale.set(value, value, value);
-    });
+    dv.setGroupScale(value, dv.decomp.plottable);
     dv.needsUpdate = true;
   };
 
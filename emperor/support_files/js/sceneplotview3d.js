@@ -112,6 +112,21 @@ define([
     this.light.position.set(1, 1, 1).normalize();
     this.camera.add(this.light);
 
+    /**
+     * Rotation last copied into the markers, so they are only rotated when
+     * the camera rotates.
+     * @type {THREE.Quaternion}
+     * @private
+     */
+    this._markersQuaternion = new THREE.Quaternion(0, 0, 0, 0);
+
+    /**
+     * Tubes last added to the scene for each decomposition view.
+     * @type {Object}
+     * @private
+     */
+    this._tubes = {};
+
     // add all the objects to the current scene
     this.addDecompositionsToScene();
 
@@ -287,6 +302,9 @@ define([
       }
     }
 
+    // new markers need to be pointed towards the camera
+    this._markersQuaternion.set(0, 0, 0, 0);
+
     this.needsUpdate = true;
   };
 
@@ -622,10 +640,14 @@ define([
       return dv.needsUpdate;
     });
 
-    _.each(this.decViews, function(view) {
-      view.tubes.forEach(function(tube) {
-        scope.scene.add(tube);
-      });
+    // only add the tubes when a decomposition view replaces them
+    _.each(this.decViews, function(view, name) {
+      if (scope._tubes[name] !== view.tubes) {
+        view.tubes.forEach(function(tube) {
+          scope.scene.add(tube);
+        });
+        scope._tubes[name] = view.tubes;
+      }
     });
 
     // check if the visible dimensions have changed
@@ -685,10 +707,15 @@ define([
       this.control.update();
     }
 
-    //point all samples towards the camera
-    _.each(this.decViews.scatter.markers, function(element) {
-      element.quaternion.copy(camera.quaternion);
-    });
+    //point all samples towards the camera, instanced markers face the camera
+    //in their vertex shader, the rest only change when the camera rotates
+    if (!this.decViews.scatter.instanced &&
+        !this._markersQuaternion.equals(camera.quaternion)) {
+      _.each(this.decViews.scatter.markers, function(element) {
+        element.quaternion.copy(camera.quaternion);
+      });
+      this._markersQuaternion.copy(camera.quaternion);
+    }
 
     this.needsUpdate = false;
     $.each(this.decViews, function(key, val) {
@@ -723,12 +750,17 @@ define([
 
     // Get first intersected item and call callback with it.
     if (intersects.length > 0) {
-      var intersect = intersects[0].object;
+      var intersect = intersects[0].object, name = intersect.name;
+
+      // instanced markers report the index of the sample that was hit
+      if (intersects[0].index !== undefined) {
+        name = this.decViews.scatter.decomp.ids[intersects[0].index];
+      }
 
       for (var i = 0; i < this._subscribers[eventType].length; i++) {
         // keep going if one of the callbacks fails
         try {
-          this._subscribers[eventType][i](intersect.name, intersect);
+          this._subscribers[eventType][i](name, intersect);
         } catch (e) {
           console.error(e);
         }
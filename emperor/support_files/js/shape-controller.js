@@ -2,9 +2,8 @@ define([
     'jquery',
     'underscore',
     'viewcontroller',
-    'shape-editor',
-    'shapes'
-], function($, _, ViewControllers, Shape, shapes) {
+    'shape-editor'
+], function($, _, ViewControllers, Shape) {
 
   // we only use the base attribute class, no need to get the base class
   var EmperorAttributeABC = ViewControllers.EmperorAttributeABC;
@@ -105,19 +104,7 @@ define([
    */
   ShapeController.prototype.setPlottableAttributes =
       function(scope, shape, group) {
-    var idx;
-
-    // get the appropriately sized geometry
-    var geometry = shapes.getGeometry(shape, scope.decomp.dimensionRanges);
-
-    if (geometry === undefined) {
-      throw new Error('Unknown shape ' + shape);
-    }
-
-    _.each(group, function(element) {
-      idx = element.idx;
-      scope.markers[idx].geometry = geometry;
-    });
+    scope.setGroupShape(shape, group);
     scope.needsUpdate = true;
   };
   return ShapeController;
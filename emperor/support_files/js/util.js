@@ -141,8 +141,116 @@ define(['underscore'], function(_) {
     return htmlString.replace(' xmlns="http://www.w3.org/1999/xhtml"', '');
   }
 
+  /**
+   *
+   * Decode a base64-encoded buffer of little-endian 32-bit floats.
+   *
+   * @param {Object} encoded An object with a `data` attribute (the base64
+   * string with the values in row-major order), as created by
+   * `emperor.util.encode_float32_array`.
+   *
+   * @return {Float32Array} The decoded values.
+   * @function decodeFloat32Array
+   */
+  function decodeFloat32Array(encoded) {
+    var binary = atob(encoded.data), bytes, tmp, i;
+
+    bytes = new Uint8Array(binary.length);
+    for (i = 0; i < binary.length; i++) {
+      bytes[i] = binary.charCodeAt(i);
+    }
+
+    // typed arrays use the platform's byte order, so swap the bytes of each
+    // value on big-endian systems
+    if (new Uint8Array(new Uint16Array([1]).buffer)[0] !== 1) {
+      for (i = 0; i < bytes.length; i += 4) {
+        tmp = bytes[i];
+        bytes[i] = bytes[i + 3];
+        bytes[i + 3] = tmp;
+        tmp = bytes[i + 1];
+        bytes[i + 1] = bytes[i + 2];
+        bytes[i + 2] = tmp;
+      }
+    }
+
+    return new Float32Array(bytes.buffer);
+  }
+
+  /**
+   *
+   * Decode a matrix of base64-encoded little-endian 32-bit floats.
+   *
+   * @param {Object} encoded An object with a `shape` attribute (an array with
+   * the number of rows and columns) and a `data` attribute (the base64 string
+   * with the values in row-major order), as created by
+   * `emperor.util.encode_float32_array`.
+   *
+   * @return {Float32Array[]} An array where each element is a row of the
+   * matrix. All the rows are views of a single buffer.
+   * @function decodeFloat32Matrix
+   */
+  function decodeFloat32Matrix(encoded) {
+    var values = decodeFloat32Array(encoded), rows, cols, i;
+
+    cols = encoded.shape[1];
+    rows = new Array(encoded.shape[0]);
+
+    for (i = 0; i < rows.length; i++) {
+      rows[i] = values.subarray(i * cols, (i + 1) * cols);
+    }
+
+    return rows;
+  }
+
+  /**
+   *
+   * Asynchronously fetch and parse a JSON file, decompressing it if needed.
+   *
+   * Files compressed with gzip are decompressed in the browser, unless the
+   * server already did so (i.e. when served with a `Content-Encoding`
+   * header). This requires support for the `fetch` and `DecompressionStream`
+   * APIs, the promise is rejected with an explanation if either is missing.
+   *
+   * @param {String} url Location of the file.
+   *
+   * @return {Promise} A promise that resolves to the parsed object.
+   * @function fetchJSON
+   */
+  function fetchJSON(url) {
+    if (typeof fetch === 'undefined') {
+      return Promise.reject(new Error('this browser cannot fetch ' + url +
+                                      ', try a newer browser'));
+    }
+
+    return fetch(url).then(function(response) {
+      if (!response.ok) {
+        throw new Error('Could not fetch ' + url + ': ' + response.status +
+                        ' ' + response.statusText);
+      }
+      return response.arrayBuffer();
+    }).then(function(buffer) {
+      var bytes = new Uint8Array(buffer), stream;
+
+      // gzip files start with these two bytes
+      if (bytes.length > 1 && bytes[0] === 0x1f && bytes[1] === 0x8b) {
+        if (typeof DecompressionStream === 'undefined') {
+          throw new Error('this browser cannot decompress ' + url +
+                          ', try a newer browser or serve the file with ' +
+                          'Content-Encoding: gzip');
+        }
+        stream = new Response(buffer).body.pipeThrough(
+          new DecompressionStream('gzip'));
+        return new Response(stream).json();
+      }
+
+      return JSON.parse(new TextDecoder('utf-8').decode(bytes));
+    });
+  }
+
   return {'truncateLevel': truncateLevel, 'naturalSort': naturalSort,
           'convertXMLToString': convertXMLToString,
           'escapeRegularExpression': escapeRegularExpression,
-          'cleanHTML': cleanHTML, 'splitNumericValues': splitNumericValues};
+          'cleanHTML': cleanHTML, 'splitNumericValues': splitNumericValues,
+          'decodeFloat32Array': decodeFloat32Array,
+          'decodeFloat32Matrix': decodeFloat32Matrix, 'fetchJSON': fetchJSON};
 });
@@ -13,12 +13,15 @@ define([
  *
  * @param {DecompositionModel} decomp a DecompositionModel object that will be
  * represented on screen.
+ * @param {boolean} [instanced] Whether to draw all the samples as instances
+ * of a single mesh, by default this is only done for decompositions with at
+ * least `DecompositionView.INSTANCING_THRESHOLD` samples.
  *
  * @return {DecompositionView}
  * @constructs DecompositionView
  *
  */
-function DecompositionView(decomp) {
+function DecompositionView(decomp, instanced) {
   /**
    * The decomposition model that the view represents.
    * @type {DecompositionModel}
@@ -29,6 +32,17 @@ function DecompositionView(decomp) {
    * @type {integer}
    */
   this.count = decomp.length;
+  /**
+   * Whether the samples are drawn as instances of a single mesh. When `true`
+   * `markers` (and `ellipsoids`) hold a single mesh whose per-sample
+   * position, color, scale, opacity and visibility live in attribute
+   * buffers, use the `setGroup*` methods to modify them. The instances share
+   * a single shape, so this is set to `false` (and the view switches to one
+   * mesh per sample) when the shape of a subset of the samples changes.
+   * @type {boolean}
+   */
+  this.instanced = instanced === undefined ?
+    this.count >= DecompositionView.INSTANCING_THRESHOLD : instanced;
   /**
    * Top visible dimensions
    * @type {integer[]}
@@ -60,11 +74,17 @@ function DecompositionView(decomp) {
    */
   this.tubes = [];
   /**
-   * Array of THREE.Mesh objects on screen (represent samples).
+   * Array of THREE.Mesh objects on screen (represent samples). In instanced
+   * mode this array holds a single mesh for all the samples.
    * @type {THREE.Mesh[]}
    */
   this.markers = [];
 
+  /**
+   * Array of THREE.Mesh objects on screen (represent confidence intervals).
+   * In instanced mode this array holds a single mesh for all the samples.
+   * @type {THREE.Mesh[]}
+   */
   this.ellipsoids = [];
 
   /**
@@ -84,6 +104,61 @@ function DecompositionView(decomp) {
   this.needsUpdate = true;
 }
 
+/**
+ * Number of samples from which the markers are drawn as instances of a single
+ * mesh, instead of one mesh per sample.
+ * @type {integer}
+ * @default 10000
+ */
+DecompositionView.INSTANCING_THRESHOLD = 10000;
+
+/**
+ * GLSL code for the vertex shader of the instanced meshes. When the
+ * `faceCamera` uniform is `1.0` the geometry of each instance is laid out in
+ * view space, so the markers always face the camera without updating their
+ * rotation on every frame.
+ * @private
+ */
+DecompositionView._VERTEX_SHADER = [
+  'uniform float faceCamera;',
+  'attribute vec3 instanceOffset;',
+  'attribute vec3 instanceColor;',
+  'attribute vec3 instanceScale;',
+  'attribute float instanceOpacity;',
+  'attribute float instanceVisible;',
+  'varying vec3 vColor;',
+  'varying vec3 vNormal;',
+  'varying float vOpacity;',
+  'void main() {',
+  '  vColor = instanceColor;',
+  '  vOpacity = instanceOpacity;',
+  '  vec3 n = normal / max(instanceScale, vec3(1e-6));',
+  '  vNormal = normalize(mix(normalMatrix * n, n, faceCamera));',
+  '  // hidden instances collapse into a single point',
+  '  vec3 local = position * instanceScale * instanceVisible;',
+  '  vec4 center = modelViewMatrix * vec4(instanceOffset, 1.0);',
+  '  vec4 world = modelViewMatrix * vec4(local + instanceOffset, 1.0);',
+  '  gl_Position = projectionMatrix *',
+  '                mix(world, center + vec4(local, 0.0), faceCamera);',
+  '}'
+].join('\n');
+
+/**
+ * GLSL code for the fragment shader of the instanced meshes, the light comes
+ * from the camera (same as the directional light in the scene).
+ * @private
+ */
+DecompositionView._FRAGMENT_SHADER = [
+  'varying vec3 vColor;',
+  'varying vec3 vNormal;',
+  'varying float vOpacity;',
+  'void main() {',
+  '  float light = max(dot(normalize(vNormal),',
+  '                        normalize(vec3(1.0, 1.0, 1.0))), 0.0);',
+  '  gl_FragColor = vec4(vColor * (0.4 + 0.6 * light), vOpacity);',
+  '}'
+].join('\n');
+
 /**
  *
  * Helper method to initialize the base THREE.js objects.
@@ -101,6 +176,11 @@ DecompositionView.prototype._initBaseView = function() {
 
   hasConfidenceIntervals = this.decomp.hasConfidenceIntervals();
 
+  if (this.instanced) {
+    this._initInstancedView(geometry, hasConfidenceIntervals);
+    return;
+  }
+
   this.decomp.apply(function(plottable) {
     mesh = new THREE.Mesh(geometry, new THREE.MeshPhongMaterial());
     mesh.name = plottable.name;
@@ -137,6 +217,256 @@ DecompositionView.prototype._initBaseView = function() {
 
 };
 
+/**
+ *
+ * Helper method to initialize the instanced THREE.js objects.
+ *
+ * All the samples are drawn by a single mesh, the per-sample attributes are
+ * stored in `this._attributes` (positions, colors, scales, opacities and
+ * visibility). The confidence ellipsoids share the positions, colors and
+ * visibility with the markers.
+ *
+ * @param {THREE.Geometry} geometry The geometry of each marker.
+ * @param {boolean} hasConfidenceIntervals Whether to create the ellipsoids.
+ * @private
+ *
+ */
+DecompositionView.prototype._initInstancedView = function(
+    geometry, hasConfidenceIntervals) {
+  var count = this.count, radius = geometry.parameters.radius, i;
+  var x = this.visibleDimensions[0], y = this.visibleDimensions[1],
+      z = this.visibleDimensions[2];
+
+  /**
+   * Per-sample attribute buffers used when `instanced` is `true`.
+   * @type {Object}
+   * @private
+   */
+  this._attributes = {
+    offset: new THREE.InstancedBufferAttribute(new Float32Array(count * 3),
+                                               3),
+    color: new THREE.InstancedBufferAttribute(new Float32Array(count * 3), 3),
+    scale: new THREE.InstancedBufferAttribute(new Float32Array(count * 3), 3),
+    opacity: new THREE.InstancedBufferAttribute(new Float32Array(count), 1),
+    visible: new THREE.InstancedBufferAttribute(new Float32Array(count), 1)
+  };
+
+  for (i = 0; i < count; i++) {
+    this._attributes.offset.setXYZ(i, this.decomp.getCoordinate(i, x),
+                                   this.decomp.getCoordinate(i, y),
+                                   this.decomp.getCoordinate(i, z));
+
+    // red, full size, opaque and visible, same as the non-instanced markers
+    this._attributes.color.setXYZ(i, 1, 0, 0);
+    this._attributes.scale.setXYZ(i, 1, 1, 1);
+    this._attributes.opacity.setX(i, 1);
+    this._attributes.visible.setX(i, 1);
+  }
+
+  /**
+   * Name and geometry of the shape shared by the instanced markers.
+   * @type {Object}
+   * @private
+   */
+  this._instanceShape = {name: 'Sphere', geometry: geometry};
+
+  this.markers.push(this._instancedMesh(geometry, this._attributes.scale,
+                                        this._attributes.opacity));
+  this.markers[0].name = 'markers';
+  this.markers[0].material.uniforms.faceCamera.value = 1;
+
+  if (hasConfidenceIntervals) {
+    var scale = new THREE.InstancedBufferAttribute(
+      new Float32Array(count * 3), 3);
+    var opacity = new THREE.InstancedBufferAttribute(
+      new Float32Array(count), 1);
+
+    for (i = 0; i < count; i++) {
+      scale.setXYZ(i, this.decomp.getConfidenceInterval(i, x) / radius,
+                   this.decomp.getConfidenceInterval(i, y) / radius,
+                   this.decomp.getConfidenceInterval(i, z) / radius);
+      opacity.setX(i, 0.5);
+    }
+
+    this.ellipsoids.push(this._instancedMesh(geometry, scale, opacity));
+    this.ellipsoids[0].name = 'ellipsoids';
+    this.ellipsoids[0].material.transparent = true;
+  }
+};
+
+/**
+ *
+ * Create a mesh that draws one instance of a geometry per sample.
+ *
+ * @param {THREE.Geometry} geometry The geometry of each instance.
+ * @param {THREE.InstancedBufferAttribute} scale The scale of each instance.
+ * @param {THREE.InstancedBufferAttribute} opacity The opacity of each
+ * instance.
+ *
+ * @return {THREE.Mesh} The mesh that draws all the instances.
+ * @private
+ *
+ */
+DecompositionView.prototype._instancedMesh = function(geometry, scale,
+                                                      opacity) {
+  var mesh, attributes = this._attributes, scope = this;
+
+  mesh = new THREE.Mesh(
+    this._instancedGeometry(geometry),
+    new THREE.ShaderMaterial({
+      uniforms: {faceCamera: {value: 0}},
+      vertexShader: DecompositionView._VERTEX_SHADER,
+      fragmentShader: DecompositionView._FRAGMENT_SHADER
+    }));
+
+  mesh.geometry.addAttribute('instanceOffset', attributes.offset);
+  mesh.geometry.addAttribute('instanceColor', attributes.color);
+  mesh.geometry.addAttribute('instanceVisible', attributes.visible);
+  mesh.geometry.addAttribute('instanceScale', scale);
+  mesh.geometry.addAttribute('instanceOpacity', opacity);
+
+  // the bounding sphere of the geometry only covers the first instance
+  mesh.frustumCulled = false;
+
+  // the mesh is never transformed, so the intersections are computed with
+  // the bounding sphere of each visible instance, which doesn't depend on
+  // the rotation of the instances
+  mesh.raycast = function(raycaster, intersects) {
+    var ray = raycaster.ray, center = new THREE.Vector3(), point, distance,
+        radius, size, i;
+
+    // not every shape has a radius parameter, and the geometry changes with
+    // the shape, so the bounding sphere is looked up every time
+    if (mesh.geometry.boundingSphere === null) {
+      mesh.geometry.computeBoundingSphere();
+    }
+    radius = mesh.geometry.boundingSphere.center.length() +
+             mesh.geometry.boundingSphere.radius;
+
+    for (i = 0; i < scope.count; i++) {
+      if (attributes.visible.array[i] === 0) {
+        continue;
+      }
+
+      center.fromArray(attributes.offset.array, i * 3);
+      size = radius * Math.max(scale.getX(i), scale.getY(i), scale.getZ(i));
+
+      if (ray.distanceSqToPoint(center) > size * size) {
+        continue;
+      }
+
+      point = ray.closestPointToPoint(center);
+      distance = ray.origin.distanceTo(point);
+
+      if (distance >= raycaster.near && distance <= raycaster.far) {
+        intersects.push({distance: distance, point: point, index: i,
+                         object: mesh});
+      }
+    }
+  };
+
+  return mesh;
+};
+
+/**
+ *
+ * Replace the instanced meshes with one mesh per sample.
+ *
+ * The position, color, scale, opacity, visibility and shape of every sample
+ * are kept, as are the position, color, size and visibility of the
+ * ellipsoids. If the instanced meshes were added to a scene, they are
+ * replaced by the new meshes.
+ * @private
+ *
+ */
+DecompositionView.prototype._disableInstancing = function() {
+  var attributes = this._attributes, old = this.markers.concat(this.ellipsoids);
+  var parent = old[0].parent, shape = this._instanceShape, ci, i, j;
+  var color, opacity, visible, marker, scale;
+
+  if (this.ellipsoids.length) {
+    ci = this.ellipsoids[0].geometry.attributes;
+  }
+
+  this.instanced = false;
+  this.markers = [];
+  this.ellipsoids = [];
+  this._initBaseView();
+
+  for (i = 0; i < this.count; i++) {
+    marker = this.markers[i];
+    color = new THREE.Color(attributes.color.getX(i), attributes.color.getY(i),
+                            attributes.color.getZ(i));
+    opacity = attributes.opacity.getX(i);
+    visible = attributes.visible.getX(i) === 1;
+
+    marker.geometry = shape.geometry;
+    marker.position.fromArray(attributes.offset.array, i * 3);
+    marker.material.color = color;
+    marker.scale.set(attributes.scale.getX(i), attributes.scale.getY(i),
+                     attributes.scale.getZ(i));
+    marker.material.transparent = opacity !== 1;
+    marker.material.opacity = opacity;
+    marker.visible = visible;
+
+    if (ci !== undefined) {
+      scale = ci.instanceScale;
+
+      this.ellipsoids[i].position.copy(marker.position);
+      this.ellipsoids[i].material.color = color.clone();
+      this.ellipsoids[i].scale.set(scale.getX(i), scale.getY(i),
+                                   scale.getZ(i));
+      this.ellipsoids[i].visible = visible;
+    }
+  }
+
+  for (j = 0; j < old.length; j++) {
+    if (parent) {
+      parent.remove(old[j]);
+    }
+    old[j].geometry.dispose();
+    old[j].material.dispose();
+  }
+
+  if (parent) {
+    for (j = 0; j < this.markers.length; j++) {
+      parent.add(this.markers[j]);
+    }
+    for (j = 0; j < this.ellipsoids.length; j++) {
+      parent.add(this.ellipsoids[j]);
+    }
+  }
+
+  this._attributes = undefined;
+  this._instanceShape = undefined;
+  this.needsUpdate = true;
+};
+
+/**
+ *
+ * Convert a geometry into the base geometry of an instanced mesh.
+ *
+ * @param {THREE.Geometry} geometry The geometry of each instance.
+ *
+ * @return {THREE.InstancedBufferGeometry} Geometry with the vertices and
+ * normals of `geometry` and room for one instance per sample.
+ * @private
+ *
+ */
+DecompositionView.prototype._instancedGeometry = function(geometry) {
+  var buffer = new THREE.BufferGeometry().fromGeometry(geometry);
+  var instanced = new THREE.InstancedBufferGeometry();
+
+  instanced.addAttribute('position', buffer.attributes.position);
+  instanced.addAttribute('normal', buffer.attributes.normal);
+  instanced.maxInstancedCount = this.count;
+
+  // code that sizes tubes and ellipsoids relies on the marker's parameters
+  instanced.parameters = geometry.parameters;
+
+  return instanced;
+};
+
 /**
  *
  * Get the number of visible elements
@@ -146,6 +476,13 @@ DecompositionView.prototype._initBaseView = function() {
  */
 DecompositionView.prototype.getVisibleCount = function() {
   var visible = 0;
+
+  if (this.instanced) {
+    return _.reduce(this._attributes.visible.array, function(acc, value) {
+      return acc + value;
+    }, 0);
+  }
+
   visible = _.reduce(this.markers, function(acc, marker) {
     return acc + (marker.visible + 0);
   }, 0);
@@ -201,6 +538,26 @@ DecompositionView.prototype.changeVisibleDimensions = function(newDims) {
     radius = scope.ellipsoids[0].geometry.parameters.radius;
   }
 
+  if (this.instanced) {
+    this._updateInstancedPositions();
+
+    if (hasConfidenceIntervals) {
+      var scale = this.ellipsoids[0].geometry.attributes.instanceScale;
+
+      for (i = 0; i < this.count; i++) {
+        // flatten the ellipsoids ever so slightly
+        scale.setXYZ(i, this.decomp.getConfidenceInterval(i, x) / radius,
+                     this.decomp.getConfidenceInterval(i, y) / radius,
+                     is2D ? 0.01 :
+                     this.decomp.getConfidenceInterval(i, z) / radius);
+      }
+      scale.needsUpdate = true;
+    }
+
+    this.needsUpdate = true;
+    return;
+  }
+
   this.decomp.apply(function(plottable) {
     mesh = scope.markers[plottable.idx];
 
@@ -261,6 +618,12 @@ DecompositionView.prototype.flipVisibleDimension = function(index) {
     // and update the state of the orientation
     this.axesOrientation[localIndex] *= -1;
 
+    if (this.instanced) {
+      this._updateInstancedPositions();
+      this.needsUpdate = true;
+      return;
+    }
+
     this.decomp.apply(function(plottable) {
       mesh = scope.markers[plottable.idx];
 
@@ -330,6 +693,45 @@ DecompositionView.prototype.setCategory = function(attributes,
   return dataView;
 };
 
+/**
+ *
+ * Helper method to update the position of the instanced markers from the
+ * visible dimensions and the orientation of the axes.
+ * @private
+ *
+ */
+DecompositionView.prototype._updateInstancedPositions = function() {
+  var x = this.visibleDimensions[0], y = this.visibleDimensions[1],
+      z = this.visibleDimensions[2], is2D = (z === null),
+      offset = this._attributes.offset, decomp = this.decomp,
+      orientation = this.axesOrientation, i;
+
+  for (i = 0; i < this.count; i++) {
+    // always use the original data plus the axis orientation
+    offset.setXYZ(i, decomp.getCoordinate(i, x) * orientation[0],
+                  decomp.getCoordinate(i, y) * orientation[1],
+                  is2D ? 0 : decomp.getCoordinate(i, z) * orientation[2]);
+  }
+  offset.needsUpdate = true;
+};
+
+/**
+ *
+ * Retrieve the position of a marker on screen.
+ *
+ * @param {integer} idx The index of the plottable represented by the marker.
+ *
+ * @return {THREE.Vector3} The position of the marker.
+ *
+ */
+DecompositionView.prototype.getMarkerPosition = function(idx) {
+  if (this.instanced) {
+    return new THREE.Vector3().fromArray(this._attributes.offset.array,
+                                         idx * 3);
+  }
+  return this.markers[idx].position.clone();
+};
+
 /**
  *
  * Change the color for a set of plottables.
@@ -343,6 +745,17 @@ DecompositionView.prototype.setGroupColor = function(color, group) {
 
   hasConfidenceIntervals = this.decomp.hasConfidenceIntervals();
 
+  if (this.instanced) {
+    // the ellipsoids share the colors with the markers
+    color = new THREE.Color(color);
+    _.each(group, function(element) {
+      scope._attributes.color.setXYZ(element.idx, color.r, color.g, color.b);
+    });
+    this._attributes.color.needsUpdate = true;
+    this.needsUpdate = true;
+    return;
+  }
+
   _.each(group, function(element) {
     idx = element.idx;
     scope.markers[idx].material.color = new THREE.Color(color);
@@ -351,6 +764,160 @@ DecompositionView.prototype.setGroupColor = function(color, group) {
       scope.ellipsoids[idx].material.color = new THREE.Color(color);
     }
   });
+  this.needsUpdate = true;
+};
+
+/**
+ *
+ * Change the scale for a set of plottables.
+ *
+ * @param {float} scale The new scaling factor of the markers (1.0 being
+ * the standard size).
+ * @param {Plottable[]} group Array of Plottables that will change in scale.
+ *
+ */
+DecompositionView.prototype.setGroupScale = function(scale, group) {
+  var scope = this;
+
+  if (this.instanced) {
+    _.each(group, function(element) {
+      scope._attributes.scale.setXYZ(element.idx, scale, scale, scale);
+    });
+    this._attributes.scale.needsUpdate = true;
+    this.needsUpdate = true;
+    return;
+  }
+
+  _.each(group, function(element) {
+    scope.markers[element.idx].scale.set(scale, scale, scale);
+  });
+  this.needsUpdate = true;
+};
+
+/**
+ *
+ * Change the opacity for a set of plottables.
+ *
+ * @param {float} opacity The new opacity of the markers, between 0 and 1.
+ * @param {Plottable[]} group Array of Plottables that will change in opacity.
+ *
+ */
+DecompositionView.prototype.setGroupOpacity = function(opacity, group) {
+  var scope = this, transparent = opacity !== 1, values;
+
+  if (this.instanced) {
+    values = this._attributes.opacity.array;
+
+    _.each(group, function(element) {
+      values[element.idx] = opacity;
+    });
+    this._attributes.opacity.needsUpdate = true;
+
+    // webgl acts up with transparent objects, so the mesh is only
+    // transparent if at least one of the markers is not at full opacity
+    this.markers[0].material.transparent = _.some(values, function(value) {
+      return value !== 1;
+    });
+    this.needsUpdate = true;
+    return;
+  }
+
+  // webgl acts up with transparent objects, so we only set them to be
+  // explicitly transparent if the opacity is not at full
+  _.each(group, function(element) {
+    scope.markers[element.idx].material.transparent = transparent;
+    scope.markers[element.idx].material.opacity = opacity;
+  });
+  this.needsUpdate = true;
+};
+
+/**
+ *
+ * Change the visibility for a set of plottables.
+ *
+ * @param {boolean} visible Whether the markers (and the ellipsoids if any)
+ * should be shown.
+ * @param {Plottable[]} group Array of Plottables that will change in
+ * visibility.
+ *
+ */
+DecompositionView.prototype.setGroupVisibility = function(visible, group) {
+  var idx, scope = this, hasConfidenceIntervals;
+
+  hasConfidenceIntervals = this.decomp.hasConfidenceIntervals();
+
+  if (this.instanced) {
+    // the ellipsoids share the visibility with the markers
+    _.each(group, function(element) {
+      scope._attributes.visible.array[element.idx] = visible ? 1 : 0;
+    });
+    this._attributes.visible.needsUpdate = true;
+    this.needsUpdate = true;
+    return;
+  }
+
+  _.each(group, function(element) {
+    idx = element.idx;
+    scope.markers[idx].visible = visible;
+
+    if (hasConfidenceIntervals) {
+      scope.ellipsoids[idx].visible = visible;
+    }
+  });
+  this.needsUpdate = true;
+};
+
+/**
+ *
+ * Change the shape for a set of plottables.
+ *
+ * @param {string} shape The name of the shape, see the `shapes` module.
+ * @param {Plottable[]} group Array of Plottables that will change in shape.
+ *
+ * @throws {Error} If the shape is unknown.
+ *
+ */
+DecompositionView.prototype.setGroupShape = function(shape, group) {
+  var scope = this, geometry, mesh;
+
+  // get the appropriately sized geometry
+  geometry = shapes.getGeometry(shape, this.decomp.dimensionRanges);
+
+  if (geometry === undefined) {
+    throw new Error('Unknown shape ' + shape);
+  }
+
+  // all the instances share a single geometry, if the shape of only some of
+  // the samples changes, each sample is drawn by its own mesh instead
+  if (this.instanced && shape !== this._instanceShape.name &&
+      group.length !== this.count) {
+    this._disableInstancing();
+  }
+
+  if (this.instanced) {
+    if (shape === this._instanceShape.name) {
+      return;
+    }
+    this._instanceShape = {name: shape, geometry: geometry};
+
+    mesh = this.markers[0];
+    geometry = this._instancedGeometry(geometry);
+
+    _.each(['instanceOffset', 'instanceColor', 'instanceVisible',
+            'instanceScale', 'instanceOpacity'], function(name) {
+      geometry.addAttribute(name, mesh.geometry.attributes[name]);
+    });
+    mesh.geometry.dispose();
+    mesh.geometry = geometry;
+
+    this.needsUpdate = true;
+    return;
+  }
+
+  _.each(group, function(element) {
+    scope.markers[element.idx].geometry = geometry;
+  });
+  this.needsUpdate = true;
 };
 
   return DecompositionView;
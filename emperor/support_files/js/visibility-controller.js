@@ -99,18 +99,7 @@ define([
    */
   VisibilityController.prototype.setPlottableAttributes =
       function(scope, visible, group) {
-    var idx, hasConfidenceIntervals;
-
-    hasConfidenceIntervals = scope.decomp.hasConfidenceIntervals();
-
-    _.each(group, function(plottable) {
-      idx = plottable.idx;
-      scope.markers[idx].visible = visible;
-
-      if (hasConfidenceIntervals) {
-        scope.ellipsoids[idx].visible = visible;
-      }
-    });
+    scope.setGroupVisibility(visible, group);
     scope.needsUpdate = true;
   };
 
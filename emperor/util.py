@@ -10,10 +10,17 @@ from __future__ import division
 import pandas as pd
 import numpy as np
 import warnings
-
-from os import listdir
-from os.path import abspath, dirname, join, isdir
+import json
+import gzip
+
+from base64 import b64encode
+from hashlib import sha1
+from types import GeneratorType
+from tempfile import mkstemp
+from os import listdir, fdopen, rename, remove, chmod
+from os.path import abspath, dirname, join, isdir, exists
 from copy import deepcopy
+from jinja2.utils import htmlsafe_json_dumps
 
 from emperor.qiime_backports.make_3d_plots import (get_custom_coords,
                                                    remove_nans,
@@ -749,3 +756,268 @@ def resolve_stable_url(version, base_url):
         if 'b' in version:
             version = version.replace('b', '-beta.')
         return base_url % version
+
+
+def encode_float32_array(data):
+    """Encode a numeric matrix as a base64 buffer of little-endian float32s
+
+    Parameters
+    ----------
+    data : array_like
+        Two-dimensional numeric data, for example the coordinates or the
+        confidence intervals of an ordination.
+
+    Returns
+    -------
+    dict
+        A JSON-serializable dictionary with three keys: ``dtype`` (always
+        ``'float32'``), ``shape`` (the dimensions of ``data``) and ``data``
+        (the row-major values as a base64-encoded string).
+
+    Notes
+    -----
+    The resulting object can be decoded in the browser without parsing any
+    text, see ``decodeFloat32Matrix`` in ``util.js``. Values are stored with
+    single precision.
+    """
+    data = np.ascontiguousarray(data, dtype='<f4')
+
+    return {'dtype': 'float32', 'shape': list(data.shape),
+            'data': b64encode(data.tobytes()).decode('ascii')}
+
+
+def stringify_metadata(mf):
+    """Convert the sample identifiers and metadata of a DataFrame to strings
+
+    Parameters
+    ----------
+    mf : pd.DataFrame
+        The sample metadata, indexed by sample identifier.
+
+    Returns
+    -------
+    np.ndarray
+        Two-dimensional array of ``str`` objects, with one row per sample. The
+        first column holds the sample identifiers and the remaining columns
+        hold the values in ``mf``.
+
+    Notes
+    -----
+    Values are converted column by column, but following the same rules as a
+    row-wise conversion i.e. numeric columns are upcast to a common type when
+    all the columns in ``mf`` are numeric.
+    """
+    # DataFrame.values upcasts mixed columns the same way rows are upcast
+    values = mf.values
+
+    data = np.empty((mf.shape[0], mf.shape[1] + 1), dtype=object)
+    data[:, 0] = mf.index.astype(str)
+
+    for i in range(mf.shape[1]):
+        # use the original dtype, to prevent pandas from inferring a new one
+        column = pd.Series(values[:, i], dtype=values.dtype)
+        data[:, i + 1] = column.astype(str).values
+
+    return data
+
+
+def dictionary_encode_metadata(mf):
+    """Dictionary-encode the sample identifiers and metadata of a DataFrame
+
+    Parameters
+    ----------
+    mf : pd.DataFrame
+        The sample metadata, indexed by sample identifier.
+
+    Returns
+    -------
+    dict
+        A JSON-serializable dictionary with two keys: ``values`` (a list with
+        every distinct string in the index and the columns of ``mf``) and
+        ``codes`` (a list with one list of integers per column, where each
+        integer is the position of that sample's value in ``values``). The
+        first list of codes corresponds to the index of ``mf``.
+
+    Notes
+    -----
+    All values are converted to strings with ``stringify_metadata`` before
+    being encoded. Metadata categories tend to have a small number of
+    distinct values, hence the strings are only included once regardless of
+    the number of samples.
+    """
+    data = stringify_metadata(mf)
+
+    # flatten one column at a time, so the codes can be split by column
+    codes, values = pd.factorize(data.ravel(order='F'))
+    codes = codes.reshape(data.shape[1], data.shape[0])
+
+    return {'values': values.tolist(), 'codes': codes.tolist()}
+
+
+def _replace_non_finite(value):
+    """Replace NaN and infinite floats in nested lists and dicts with None"""
+    if isinstance(value, float):
+        return value if np.isfinite(value) else None
+    elif isinstance(value, dict):
+        return {k: _replace_non_finite(v) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [_replace_non_finite(v) for v in value]
+    return value
+
+
+def strict_json_dumps(value, **kwargs):
+    """Serialize an object as standard-compliant JSON
+
+    Parameters
+    ----------
+    value : object
+        JSON-serializable object.
+    kwargs : dict
+        Keyword arguments passed to ``json.dumps``.
+
+    Returns
+    -------
+    str
+        The serialized ``value``.
+
+    Notes
+    -----
+    ``json.dumps`` writes NaN and infinite values as ``NaN`` and
+    ``Infinity``, which are not valid JSON and can't be parsed in a browser
+    with ``JSON.parse``. These values are written as ``null`` instead.
+    """
+    try:
+        return json.dumps(value, allow_nan=False, **kwargs)
+    except ValueError:
+        return json.dumps(_replace_non_finite(value), allow_nan=False,
+                          **kwargs)
+
+
+def write_compressed_json(data, directory, prefix):
+    """Write a JSON-serializable object as a gzip-compressed file
+
+    Parameters
+    ----------
+    data : dict or list
+        Object to serialize.
+    directory : str
+        Path to the directory where the file is written to.
+    prefix : str
+        Prefix for the file name.
+
+    Returns
+    -------
+    str
+        Name of the file (relative to ``directory``).
+
+    Notes
+    -----
+    The file name includes a digest of the serialized data. If a file with
+    the same name already exists, it is assumed to have the same contents and
+    is not written again, this lets multiple plots share a single file. The
+    data is written to a temporary file that is renamed once it is complete,
+    so an interrupted run doesn't leave a truncated file under this name.
+    """
+    text = strict_json_dumps(data, sort_keys=True, separators=(',', ':'))
+    text = text.encode('utf-8')
+
+    name = '%s-%s.json.gz' % (prefix, sha1(text).hexdigest()[:16])
+    path = join(directory, name)
+
+    if exists(path):
+        return name
+
+    fd, temp_path = mkstemp(dir=directory, prefix='.' + name, suffix='.tmp')
+    try:
+        # set the modification time so the output is reproducible
+        with fdopen(fd, 'wb') as f:
+            with gzip.GzipFile(filename='', mode='wb', fileobj=f,
+                               mtime=0) as gz:
+                gz.write(text)
+
+        # temporary files are only readable by their owner
+        chmod(temp_path, 0o644)
+        try:
+            rename(temp_path, path)
+        except OSError:
+            # on Windows the file can't be replaced if another process wrote
+            # it in the meantime, the contents are the same
+            if not exists(path):
+                raise
+    finally:
+        if exists(temp_path):
+            remove(temp_path)
+
+    return name
+
+
+def iter_row_chunks(data, size):
+    """Iterate over consecutive groups of rows
+
+    Parameters
+    ----------
+    data : list, np.ndarray, pd.Index or pd.DataFrame
+        Object to split by rows.
+    size : int
+        Maximum number of rows in each group.
+
+    Yields
+    ------
+    list, np.ndarray, pd.Index or pd.DataFrame
+        Consecutive slices of ``data``, of the same type as ``data``.
+
+    Raises
+    ------
+    ValueError
+        If ``size`` is not a positive number.
+    """
+    if size < 1:
+        raise ValueError('The number of rows in a chunk should be positive')
+
+    for start in range(0, len(data), size):
+        if isinstance(data, pd.DataFrame):
+            yield data.iloc[start:start + size]
+        else:
+            yield data[start:start + size]
+
+
+def json_chunks(value):
+    """Serialize an object as HTML-safe JSON one piece at a time
+
+    Parameters
+    ----------
+    value : object
+        JSON-serializable object. Generators are interpreted as a list that
+        is split in consecutive slices, each generated item should be a list.
+
+    Yields
+    ------
+    str or markupsafe.Markup
+        Consecutive pieces of the serialized ``value``.
+
+    Notes
+    -----
+    The concatenated output is identical to Jinja's ``tojson`` filter, but
+    lists produced by a generator are serialized one slice at a time. This
+    bounds the memory needed to write large lists to the size of a slice.
+    Non-finite values are written as ``null``, see ``strict_json_dumps``.
+    """
+    # the serialized values are text (a Markup object), calling str on them
+    # would fail with non-ASCII characters in Python 2
+    if not isinstance(value, GeneratorType):
+        yield htmlsafe_json_dumps(value, strict_json_dumps, sort_keys=True)
+        return
+
+    yield '['
+
+    separator = ''
+    for chunk in value:
+        if len(chunk) == 0:
+            continue
+
+        # drop the brackets, the slices are joined into a single list
+        yield separator + htmlsafe_json_dumps(chunk, strict_json_dumps,
+                                              sort_keys=True)[1:-1]
+        separator = ', '
+
+    yield ']'
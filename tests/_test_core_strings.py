@@ -70,10 +70,27 @@ if ($("#emperor-css").length == 0){{
 </script>
 
 <div id='emperor-notebook-0x9cb72f54' style="position: relative; width:100%; height:500px;">
-  <div class='loading' style="position: absolute;top: 50%;left: 50%;margin-left: -229px; margin-top: -59px; z-index: 10000;height:118px;width:458px;padding:0px"><img src='https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/img/emperor.png' alt='Emperor resources missing. Expected them to be found in https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files'></div>
+  <div class='loading' style="position: absolute;top: 50%;left: 50%;margin-left: -229px; margin-top: -59px; z-index: 10000;height:118px;width:458px;padding:0px"><img src='https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/img/emperor.png' alt='Emperor resources missing. Expected them to be found in https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files'><div class='loading-progress' style="text-align: center;"></div></div>
 </div>
 </div>
 
+<script type="application/json" id='emperor-notebook-0x9cb72f54-data'>
+{
+  "decompositions": [
+    {
+      "sample_ids": ["PC.636", "PC.635", "PC.356", "PC.481", "PC.354", "PC.593", "PC.355", "PC.607", "PC.634"],
+      "coordinates": [[-0.651995810831719, -0.3417784983371589, 0.15713116241738878, -0.15964022322388774, 0.41511600449567154], [-0.5603276951316744, 0.10857735915373172, -0.32567898978232684, 0.3750137797216106, -0.583487828830988], [0.5394835270542403, -0.3068324227225251, -0.6770043110217822, 0.203820501907719, 0.1044335488558445], [0.09964194790906594, -0.03293232371368659, 0.14978636968698092, -0.8160388524355932, -0.301343079001781], [0.661089243947507, -0.014176279685000464, 0.05537095913733857, -0.11036487613740434, -0.3456924105084198], [0.5490376828031979, 0.32957520954888647, 0.7612242145083941, 0.4322721667939822, 0.04825249860931067], [0.40202458647314415, -0.4576554852461752, -0.0728438902229666, 0.04670222577076932, 0.36567512814466946], [-0.21532604614952783, 1.0, -0.31976501999316115, -0.13561208920603846, 0.35686551552017187], [-0.8236274360749414, -0.2847775589983077, 0.27177950526966277, 0.16384736680860681, -0.05981937728235736]],
+      "axes_names": [0, 1, 2, 3, 4],
+      "percents_explained": [26.6887048633, 16.256370402199998, 13.775412916099999, 11.217215823, 10.024774995000001],
+      "ci": null,
+      "type": "ordination"
+    }
+  ],
+  "metadata_headers": ["SampleID", "Treatment", "DOB", "Description"],
+  "metadata": [["PC.636", "Fast", "20080116", "Fasting_mouse_I.D._636"], ["PC.635", "Fast", "20080116", "Fasting_mouse_I.D._635"], ["PC.356", "Control", "20061126", "Control_mouse_I.D._356"], ["PC.481", "Control", "20070314", "Control_mouse_I.D._481"], ["PC.354", "Control", "20061218", "Ctrol_mouse_I.D._354"], ["PC.593", "Control", "20071210", "Control_mouse_I.D._593"], ["PC.355", "Control", "20061218", "Control_mouse_I.D._355"], ["PC.607", "Fast", "20071112", "Fasting_mouse_I.D._607"], ["PC.634", "Fast", "20080116", "Fasting_mouse_I.D._634"]]
+}
+</script>
+
 <script type="text/javascript">
 requirejs.config({
 // the left side is the module name, and the right side is the path
@@ -114,6 +131,7 @@ requirejs.config({
   /* Emperor's objects */
   'util': 'https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/js/util',
   'model': 'https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/js/model',
+  'loader': 'https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/js/loader',
   'view': 'https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/js/view',
   'controller': 'https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/js/controller',
   'draw': 'https://cdn.rawgit.com/biocore/emperor/new-api/emperor/support_files/js/draw',
@@ -166,34 +184,21 @@ requirejs.config({
 });
 
 requirejs(
-["jquery", "model", "controller"],
-function($, model, EmperorController) {
+["jquery", "model", "controller", "loader"],
+function($, model, EmperorController, loader) {
   var DecompositionModel = model.DecompositionModel;
 
   var div = $('#emperor-notebook-0x9cb72f54');
 
-  var data = {
-    // coordinates information
-    'decompositions': [
-      {
-        'sample_ids': ["PC.636", "PC.635", "PC.356", "PC.481", "PC.354", "PC.593", "PC.355", "PC.607", "PC.634"],
-        'coordinates': [[-0.651995810831719, -0.3417784983371589, 0.15713116241738878, -0.15964022322388774, 0.41511600449567154], [-0.5603276951316744, 0.10857735915373172, -0.32567898978232684, 0.3750137797216106, -0.583487828830988], [0.5394835270542403, -0.3068324227225251, -0.6770043110217822, 0.203820501907719, 0.1044335488558445], [0.09964194790906594, -0.03293232371368659, 0.14978636968698092, -0.8160388524355932, -0.301343079001781], [0.661089243947507, -0.014176279685000464, 0.05537095913733857, -0.11036487613740434, -0.3456924105084198], [0.5490376828031979, 0.32957520954888647, 0.7612242145083941, 0.4322721667939822, 0.04825249860931067], [0.40202458647314415, -0.4576554852461752, -0.0728438902229666, 0.04670222577076932, 0.36567512814466946], [-0.21532604614952783, 1.0, -0.31976501999316115, -0.13561208920603846, 0.35686551552017187], [-0.8236274360749414, -0.2847775589983077, 0.27177950526966277, 0.16384736680860681, -0.05981937728235736]],
-        'axes_names': [0, 1, 2, 3, 4],
-        'percents_explained': [26.6887048633, 16.256370402199998, 13.775412916099999, 11.217215823, 10.024774995000001],
-        'ci': null,
-        'type': 'ordination'
-      }
-    ],
-
-    // sample information
-    'metadata_headers': ["SampleID", "Treatment", "DOB", "Description"],
-    'metadata': [["PC.636", "Fast", "20080116", "Fasting_mouse_I.D._636"], ["PC.635", "Fast", "20080116", "Fasting_mouse_I.D._635"], ["PC.356", "Control", "20061126", "Control_mouse_I.D._356"], ["PC.481", "Control", "20070314", "Control_mouse_I.D._481"], ["PC.354", "Control", "20061218", "Ctrol_mouse_I.D._354"], ["PC.593", "Control", "20071210", "Control_mouse_I.D._593"], ["PC.355", "Control", "20061218", "Control_mouse_I.D._355"], ["PC.607", "Fast", "20071112", "Fasting_mouse_I.D._607"], ["PC.634", "Fast", "20080116", "Fasting_mouse_I.D._634"]],
-    'settings': {}
-  }
+  // coordinates and sample information are embedded in this document
+  var sources = [{
+    'text': document.getElementById("emperor-notebook-0x9cb72f54-data").text
+  }];
 
+  var settings = {};
   var dm, ec;
 
-  function init() {
+  function init(data) {
     var decomp = data['decompositions'][0];
 
     // Initialize the DecompositionModel
@@ -211,15 +216,34 @@ function($, model, EmperorController) {
     ec.resize(div.innerWidth(), div.innerHeight());
   });
 
-  $(function(){
-    init();
+  function start(data) {
+    init(data);
     animate();
 
     ec.ready = function () {
       // any other code that needs to be executed when emperor is loaded should
       // go here
-      ec.loadConfig(data['settings']);
+      ec.loadConfig(settings);
     }
+  }
+
+  $(function(){
+    var progress = div.find('.loading-progress');
+
+    // large plots are decoded in a web worker so the page stays responsive
+    loader.loadData(sources, function(message) {
+      progress.text(message + '...');
+    }, function(data) {
+      progress.text('Building the plot...');
+
+      // let the browser show the message before building the plot
+      setTimeout(function() {
+        start(data);
+      }, 0);
+    }, function(error) {
+      div.find('.loading').text('Could not load the plot data (' +
+                                error.message + ')');
+    });
   });
 
 }); // END REQUIRE.JS block
@@ -265,10 +289,27 @@ if ($("#emperor-css").length == 0){{
   </head>
   <body>
     <div id='emperor-notebook-0x9cb72f54' style="position: relative; width:100%; height:500px;">
-  <div class='loading' style="position: absolute;top: 50%;left: 50%;margin-left: -229px; margin-top: -59px; z-index: 10000;height:118px;width:458px;padding:0px"><img src='./some-local-path//img/emperor.png' alt='Emperor resources missing. Expected them to be found in ./some-local-path/'></div>
+  <div class='loading' style="position: absolute;top: 50%;left: 50%;margin-left: -229px; margin-top: -59px; z-index: 10000;height:118px;width:458px;padding:0px"><img src='./some-local-path//img/emperor.png' alt='Emperor resources missing. Expected them to be found in ./some-local-path/'><div class='loading-progress' style="text-align: center;"></div></div>
 </div>
 </div>
 
+<script type="application/json" id='emperor-notebook-0x9cb72f54-data'>
+{
+  "decompositions": [
+    {
+      "sample_ids": ["PC.636", "PC.635", "PC.356", "PC.481", "PC.354", "PC.593", "PC.355", "PC.607", "PC.634"],
+      "coordinates": [[-0.651995810831719, -0.3417784983371589, 0.15713116241738878, -0.15964022322388774, 0.41511600449567154], [-0.5603276951316744, 0.10857735915373172, -0.32567898978232684, 0.3750137797216106, -0.583487828830988], [0.5394835270542403, -0.3068324227225251, -0.6770043110217822, 0.203820501907719, 0.1044335488558445], [0.09964194790906594, -0.03293232371368659, 0.14978636968698092, -0.8160388524355932, -0.301343079001781], [0.661089243947507, -0.014176279685000464, 0.05537095913733857, -0.11036487613740434, -0.3456924105084198], [0.5490376828031979, 0.32957520954888647, 0.7612242145083941, 0.4322721667939822, 0.04825249860931067], [0.40202458647314415, -0.4576554852461752, -0.0728438902229666, 0.04670222577076932, 0.36567512814466946], [-0.21532604614952783, 1.0, -0.31976501999316115, -0.13561208920603846, 0.35686551552017187], [-0.8236274360749414, -0.2847775589983077, 0.27177950526966277, 0.16384736680860681, -0.05981937728235736]],
+      "axes_names": [0, 1, 2, 3, 4],
+      "percents_explained": [26.6887048633, 16.256370402199998, 13.775412916099999, 11.217215823, 10.024774995000001],
+      "ci": null,
+      "type": "ordination"
+    }
+  ],
+  "metadata_headers": ["SampleID", "Treatment", "DOB", "Description"],
+  "metadata": [["PC.636", "Fast", "20080116", "Fasting_mouse_I.D._636"], ["PC.635", "Fast", "20080116", "Fasting_mouse_I.D._635"], ["PC.356", "Control", "20061126", "Control_mouse_I.D._356"], ["PC.481", "Control", "20070314", "Control_mouse_I.D._481"], ["PC.354", "Control", "20061218", "Ctrol_mouse_I.D._354"], ["PC.593", "Control", "20071210", "Control_mouse_I.D._593"], ["PC.355", "Control", "20061218", "Control_mouse_I.D._355"], ["PC.607", "Fast", "20071112", "Fasting_mouse_I.D._607"], ["PC.634", "Fast", "20080116", "Fasting_mouse_I.D._634"]]
+}
+</script>
+
 <script type="text/javascript">
 requirejs.config({
 // the left side is the module name, and the right side is the path
@@ -309,6 +350,7 @@ requirejs.config({
   /* Emperor's objects */
   'util': './some-local-path//js/util',
   'model': './some-local-path//js/model',
+  'loader': './some-local-path//js/loader',
   'view': './some-local-path//js/view',
   'controller': './some-local-path//js/controller',
   'draw': './some-local-path//js/draw',
@@ -361,34 +403,21 @@ requirejs.config({
 });
 
 requirejs(
-["jquery", "model", "controller"],
-function($, model, EmperorController) {
+["jquery", "model", "controller", "loader"],
+function($, model, EmperorController, loader) {
   var DecompositionModel = model.DecompositionModel;
 
   var div = $('#emperor-notebook-0x9cb72f54');
 
-  var data = {
-    // coordinates information
-    'decompositions': [
-      {
-        'sample_ids': ["PC.636", "PC.635", "PC.356", "PC.481", "PC.354", "PC.593", "PC.355", "PC.607", "PC.634"],
-        'coordinates': [[-0.651995810831719, -0.3417784983371589, 0.15713116241738878, -0.15964022322388774, 0.41511600449567154], [-0.5603276951316744, 0.10857735915373172, -0.32567898978232684, 0.3750137797216106, -0.583487828830988], [0.5394835270542403, -0.3068324227225251, -0.6770043110217822, 0.203820501907719, 0.1044335488558445], [0.09964194790906594, -0.03293232371368659, 0.14978636968698092, -0.8160388524355932, -0.301343079001781], [0.661089243947507, -0.014176279685000464, 0.05537095913733857, -0.11036487613740434, -0.3456924105084198], [0.5490376828031979, 0.32957520954888647, 0.7612242145083941, 0.4322721667939822, 0.04825249860931067], [0.40202458647314415, -0.4576554852461752, -0.0728438902229666, 0.04670222577076932, 0.36567512814466946], [-0.21532604614952783, 1.0, -0.31976501999316115, -0.13561208920603846, 0.35686551552017187], [-0.8236274360749414, -0.2847775589983077, 0.27177950526966277, 0.16384736680860681, -0.05981937728235736]],
-        'axes_names': [0, 1, 2, 3, 4],
-        'percents_explained': [26.6887048633, 16.256370402199998, 13.775412916099999, 11.217215823, 10.024774995000001],
-        'ci': null,
-        'type': 'ordination'
-      }
-    ],
-
-    // sample information
-    'metadata_headers': ["SampleID", "Treatment", "DOB", "Description"],
-    'metadata': [["PC.636", "Fast", "20080116", "Fasting_mouse_I.D._636"], ["PC.635", "Fast", "20080116", "Fasting_mouse_I.D._635"], ["PC.356", "Control", "20061126", "Control_mouse_I.D._356"], ["PC.481", "Control", "20070314", "Control_mouse_I.D._481"], ["PC.354", "Control", "20061218", "Ctrol_mouse_I.D._354"], ["PC.593", "Control", "20071210", "Control_mouse_I.D._593"], ["PC.355", "Control", "20061218", "Control_mouse_I.D._355"], ["PC.607", "Fast", "20071112", "Fasting_mouse_I.D._607"], ["PC.634", "Fast", "20080116", "Fasting_mouse_I.D._634"]],
-    'settings': {}
-  }
+  // coordinates and sample information are embedded in this document
+  var sources = [{
+    'text': document.getElementById("emperor-notebook-0x9cb72f54-data").text
+  }];
 
+  var settings = {};
   var dm, ec;
 
-  function init() {
+  function init(data) {
     var decomp = data['decompositions'][0];
 
     // Initialize the DecompositionModel
@@ -406,15 +435,34 @@ function($, model, EmperorController) {
     ec.resize(div.innerWidth(), div.innerHeight());
   });
 
-  $(function(){
-    init();
+  function start(data) {
+    init(data);
     animate();
 
     ec.ready = function () {
       // any other code that needs to be executed when emperor is loaded should
       // go here
-      ec.loadConfig(data['settings']);
+      ec.loadConfig(settings);
     }
+  }
+
+  $(function(){
+    var progress = div.find('.loading-progress');
+
+    // large plots are decoded in a web worker so the page stays responsive
+    loader.loadData(sources, function(message) {
+      progress.text(message + '...');
+    }, function(data) {
+      progress.text('Building the plot...');
+
+      // let the browser show the message before building the plot
+      setTimeout(function() {
+        start(data);
+      }, 0);
+    }, function(error) {
+      div.find('.loading').text('Could not load the plot data (' +
+                                error.message + ')');
+    });
   });
 
 }); // END REQUIRE.JS block
@@ -156,6 +156,89 @@ requirejs([
                                'pcoa 6', 'pcoa 7', 'pcoa 8']);
     });
 
+    /**
+     *
+     * Test constructor with binary-encoded coordinates and confidence
+     * intervals
+     *
+     */
+    test('Test constructor with encoded coordinates', function() {
+      var data = {
+        name: 'pcoa',
+        sample_ids: ['PC.636', 'PC.635'],
+        // [[0.5, 0.25, -1], [0.5, 0.25, -1]] as little-endian float32
+        coordinates: {dtype: 'float32', shape: [2, 3],
+                      data: 'AAAAPwAAgD4AAIC/AAAAPwAAgD4AAIC/'},
+        ci: {dtype: 'float32', shape: [2, 3],
+             data: 'AAAAPwAAgD4AAIC/AAAAPwAAgD4AAIC/'},
+        percents_explained: [50, 30, 20],
+        axes_names: []
+      };
+      var dm = new DecompositionModel(data, ['SampleID', 'Treatment'],
+                                      [['PC.636', 'Control'],
+                                       ['PC.635', 'Fast']]);
+
+      equal(dm.length, 2, 'Length set correctly');
+      equal(dm.dimensions, 3, 'Dimensions set correctly');
+      deepEqual(_.toArray(dm.plottable[1].coordinates), [0.5, 0.25, -1],
+                'Coordinates decoded correctly');
+      deepEqual(_.toArray(dm.plottable[0].ci), [0.5, 0.25, -1],
+                'Confidence intervals decoded correctly');
+      equal(dm.hasConfidenceIntervals(), true);
+      deepEqual(dm.dimensionRanges.min, [0.5, 0.25, -1]);
+      deepEqual(dm.dimensionRanges.max, [0.5, 0.25, -1]);
+    });
+
+    /**
+     *
+     * Test constructor with dictionary-encoded metadata
+     *
+     */
+    test('Test constructor with encoded metadata', function() {
+      var dm, metadata = {
+        values: ['PC.636', 'PC.635', 'PC.356', 'PC.481', 'PC.354', 'PC.593',
+                 'PC.355', 'PC.607', 'PC.634', 'YATGCTGCCTCCCGTAGGAGT',
+                 'Control', 'Fast', '20070314', '20071112', '20080116',
+                 '20071210', '20061218', '20061126'],
+        codes: [[0, 1, 2, 3, 4, 5, 6, 7, 8],
+                [9, 9, 9, 9, 9, 9, 9, 9, 9],
+                [10, 11, 11, 11, 10, 11, 10, 10, 10],
+                [12, 13, 14, 14, 15, 14, 16, 16, 17]]
+      };
+
+      dm = new DecompositionModel(this.data, this.md_headers, metadata);
+
+      equal(dm.length, 9, 'Length set correctly');
+      _.each(this.metadata, function(row, i) {
+        deepEqual(dm.plottable[i].metadata.slice(), row);
+        equal(dm.plottable[i].metadata.length, 4);
+      });
+      equal(dm.plottable[3].metadata[2], 'Fast');
+      deepEqual(dm.getUniqueValuesByCategory('Treatment'), ['Control', 'Fast']);
+      deepEqual(_.pluck(dm.getPlottablesByMetadataCategoryValue('DOB',
+                                                                '20061218'),
+                        'name'), ['PC.355', 'PC.607']);
+    });
+
+    /**
+     *
+     * Test the constructor validates dictionary-encoded metadata
+     *
+     */
+    test('Test constructor excepts encoded metadata cols != num headers',
+         function() {
+      var data = this.data, md_headers = this.md_headers;
+      throws(
+          function() {
+            var metadata = {values: ['a'],
+                            codes: [[0, 0, 0, 0, 0, 0, 0, 0, 0]]};
+            var dm = new DecompositionModel(data, md_headers, metadata);
+          },
+          Error,
+          'An error is raised if the number of encoded columns differs'
+      );
+    });
+
     /**
      *
      * Test constructor with custom axesNames
@@ -416,6 +499,28 @@ requirejs([
           );
     });
 
+    /**
+     *
+     * Test getPlottableByID with identifiers that match the properties of
+     * plain objects or that have a different type
+     *
+     */
+    test('Test getPlottableByID special identifiers', function() {
+      var dm;
+
+      this.data.sample_ids[0] = 'constructor';
+      this.data.sample_ids[1] = 1;
+      this.data.sample_ids[2] = '1';
+      dm = new DecompositionModel(this.data, this.md_headers, this.metadata);
+
+      equal(dm.getPlottableByID('constructor').idx, 0);
+      equal(dm.getPlottableByID(1).idx, 1);
+      equal(dm.getPlottableByID('1').idx, 2);
+      throws(function() {
+        dm.getPlottableByID('toString');
+      }, Error, 'An error is raised for inherited properties');
+    });
+
     /**
      *
      * Test getPlottableByIDs returns the correct list of plottables
@@ -602,18 +707,69 @@ requirejs([
      * Test the function used to find minimum and maximum values works.
      *
      */
-    test('Test the _minMaxReduce function', function() {
-        var p = new Plottable('PC.635', ['PC.635', 'YATGCTGCCTCCCGTAGGAGT',
-                              'Fast', '20071112'], [-0.237661, 0.046053,
-                              -0.138136, 0.159061, -0.247485, -0.115211,
-                              -0.112864, 0.064794], 1);
-        var accumulator = {'min': [-5, -5, -5, -5, -5, -6, -0.01, -8],
-                           'max': [0, 0, 0, 0, 0, 0, 0, 0]};
+    test('Test the _ranges function', function() {
+        var values = new Float64Array([-5, 0, -5, 0.046053, -0.138136, 0,
+                                       -0.1, 0.159061, -6]);
 
-        var val = DecompositionModel._minMaxReduce(accumulator, p);
+        var val = DecompositionModel._ranges(values, 3);
 
-        deepEqual(val.min, [-5, -5, -5, -5, -5, -6, -0.112864, -8]);
-        deepEqual(val.max, [0, 0.046053, 0, 0.159061, 0, 0, 0, 0.064794]);
+        deepEqual(val.min, [-5, -0.138136, -6]);
+        deepEqual(val.max, [0.046053, 0.159061, 0]);
+
+        val = DecompositionModel._ranges(new Float64Array(0), 3);
+        deepEqual(val.min, []);
+        deepEqual(val.max, []);
+    });
+
+    /**
+     *
+     * Test the metadata is dictionary-encoded in the smallest typed arrays.
+     *
+     */
+    test('Test the _encodeMetadata function', function() {
+        var obs = DecompositionModel._encodeMetadata([['a', 1], ['1', 'b'],
+                                                      ['a', '1']], 2);
+
+        deepEqual(obs.values, ['a', 1, '1', 'b']);
+        equal(obs.codes.length, 2);
+        ok(obs.codes[0] instanceof Uint8Array);
+        deepEqual(_.toArray(obs.codes[0]), [0, 2, 0]);
+        deepEqual(_.toArray(obs.codes[1]), [1, 3, 2]);
+    });
+
+    /**
+     *
+     * Test values that match the properties of plain objects are encoded.
+     *
+     */
+    test('Test the _encodeMetadata function special values', function() {
+        var obs = DecompositionModel._encodeMetadata([['__proto__', null],
+                                                      ['constructor', NaN],
+                                                      ['__proto__', 'null'],
+                                                      ['constructor', NaN]],
+                                                     2);
+
+        equal(obs.values.length, 5);
+        deepEqual(obs.values.slice(0, 4),
+                  ['__proto__', null, 'constructor', NaN]);
+        equal(obs.values[4], 'null');
+        deepEqual(_.toArray(obs.codes[0]), [0, 2, 0, 2]);
+        deepEqual(_.toArray(obs.codes[1]), [1, 3, 4, 3]);
+    });
+
+    /**
+     *
+     * Test the codes are stored in the smallest typed arrays.
+     *
+     */
+    test('Test the _codesArray function', function() {
+        var codes = DecompositionModel._codesArray([0, 255], 256);
+
+        ok(codes instanceof Uint8Array);
+        strictEqual(DecompositionModel._codesArray(codes, 10), codes);
+        ok(DecompositionModel._codesArray(codes, 257) instanceof Uint16Array);
+        ok(DecompositionModel._codesArray(codes, 65537) instanceof
+           Uint32Array);
     });
 
     /**
@@ -653,6 +809,197 @@ requirejs([
               );
         });
 
+    /**
+     *
+     * Tests the unique values keep the order in which they first appear
+     *
+     */
+    test('Test getUniqueValuesByCategory order', function() {
+      var dm = new DecompositionModel(this.data, this.md_headers,
+                                      this.metadata);
+      var obs = dm.getUniqueValuesByCategory('DOB');
+      var exp = ['20070314', '20071112', '20080116', '20071210', '20061218',
+                 '20061126'];
+
+      deepEqual(obs, exp);
+
+      // modifying the result should not modify the model
+      obs.pop();
+      deepEqual(dm.getUniqueValuesByCategory('DOB'), exp);
+    });
+
+    /**
+     *
+     * Tests setMetadataValue updates the metadata and the category lookups
+     *
+     */
+    test('Test setMetadataValue', function() {
+      var dm = new DecompositionModel(this.data, this.md_headers,
+                                      this.metadata);
+      var obs;
+
+      deepEqual(dm.getUniqueValuesByCategory('Treatment'), ['Control',
+                                                             'Fast']);
+      dm.setMetadataValue('PC.636', 'Treatment', 'Slow');
+
+      deepEqual(dm.getPlottableByID('PC.636').metadata,
+                ['PC.636', 'YATGCTGCCTCCCGTAGGAGT', 'Slow', '20070314']);
+      deepEqual(dm.getUniqueValuesByCategory('Treatment'), ['Slow', 'Fast',
+                                                             'Control']);
+      obs = dm.getPlottablesByMetadataCategoryValue('Treatment', 'Slow');
+      deepEqual(_.pluck(obs, 'name'), ['PC.636']);
+
+      dm.setMetadataValue('PC.635', 'Treatment', 'Slow');
+      obs = dm.getPlottablesByMetadataCategoryValue('Treatment', 'Slow');
+      deepEqual(_.pluck(obs, 'name'), ['PC.636', 'PC.635']);
+
+      throws(function() {
+        dm.setMetadataValue('Does_not_exist', 'Treatment', 'Slow');
+      }, Error, 'An error is raised if the sample does not exist');
+      throws(function() {
+        dm.setMetadataValue('PC.636', 'Does_not_exist', 'Slow');
+      }, Error, 'An error is raised if the category does not exist');
+    });
+
+    /**
+     *
+     * Tests setMetadataValue can add more values than the codes can hold
+     *
+     */
+    test('Test setMetadataValue widens the codes', function() {
+      var dm = new DecompositionModel(this.data, this.md_headers,
+                                      this.metadata), i;
+
+      ok(dm._metadata.codes[2] instanceof Uint8Array);
+      for (i = 0; i < 300; i++) {
+        dm.setMetadataValue('PC.354', 'Treatment', 'value ' + i);
+      }
+
+      ok(dm._metadata.codes[2] instanceof Uint16Array);
+      equal(dm.getPlottableByID('PC.354').metadata[2], 'value 299');
+      equal(dm.getPlottableByID('PC.636').metadata[2], 'Control');
+    });
+
+    /**
+     *
+     * Tests the category indices are reused until they are invalidated
+     *
+     */
+    test('Test invalidateMetadataIndex', function() {
+      var dm = new DecompositionModel(this.data, this.md_headers,
+                                      this.metadata);
+
+      dm.getUniqueValuesByCategory('Treatment');
+      dm.getUniqueValuesByCategory('DOB');
+      deepEqual(_.keys(dm._categoryIndex).sort(), ['DOB', 'Treatment']);
+
+      dm.invalidateMetadataIndex('Treatment');
+      deepEqual(_.keys(dm._categoryIndex), ['DOB']);
+
+      dm.getUniqueValuesByCategory('Treatment');
+      dm.invalidateMetadataIndex();
+      deepEqual(_.keys(dm._categoryIndex), []);
+    });
+
+    /**
+     *
+     * Tests the plottables are created on demand from the model's data
+     *
+     */
+    test('Test getPlottableByIndex', function() {
+      var dm = new DecompositionModel(this.data, this.md_headers,
+                                      this.metadata);
+      var obs = dm.getPlottableByIndex(1);
+      var exp = new Plottable(
+        'PC.635',
+        ['PC.635', 'YATGCTGCCTCCCGTAGGAGT', 'Fast', '20071112'],
+        [-0.237661, 0.046053, -0.138136, 0.159061, -0.247485, -0.115211,
+         -0.112864, 0.064794],
+        1);
+
+      ok(obs instanceof Plottable);
+      deepEqual(obs, exp);
+      equal(obs.toString(), exp.toString());
+
+      // once all the plottables are created the same objects are returned
+      strictEqual(dm.plottable[1], dm.getPlottableByIndex(1));
+      strictEqual(dm.getPlottableByID('PC.635'), dm.plottable[1]);
+
+      throws(function() {
+        dm.getPlottableByIndex(9);
+      }, Error, 'An error is raised if the index is out of range');
+    });
+
+    /**
+     *
+     * Tests the coordinates and confidence intervals can be read by index
+     *
+     */
+    test('Test getCoordinate and getConfidenceInterval', function() {
+      var dm;
+
+      this.data.ci = [[2, 1, 2, 0, 2, 2, 1, 1],
+                      [0, 1, 1, 0, 0, 1, 2, 0],
+                      [2, 1, 2, 1, 1, 1, 2, 0],
+                      [2, 0, 2, 2, 0, 0, 0, 2],
+                      [2, 1, 1, 0, 1, 2, 0, 2],
+                      [0, 2, 2, 2, 1, 2, 2, 2],
+                      [0, 0, 2, 0, 2, 0, 0, 2],
+                      [1, 2, 0, 0, 2, 0, 0, 1],
+                      [1, 0, 0, 1, 0, 0, 1, 1]];
+      dm = new DecompositionModel(this.data, this.md_headers, this.metadata);
+
+      equal(dm.getCoordinate(1, 0), -0.237661);
+      equal(dm.getCoordinate(8, 7), -0.059883);
+      equal(dm.getConfidenceInterval(1, 6), 2);
+      deepEqual(dm.plottable[5].ci, [0, 2, 2, 2, 1, 2, 2, 2]);
+    });
+
+    /**
+     *
+     * Tests null values (non-finite values in the JSON data) are read as NaN
+     *
+     */
+    test('Test constructor with null values', function() {
+      var dm;
+
+      this.data.ci = [];
+      for (var i = 0; i < 9; i++) {
+        this.data.ci.push([null, null, null, null, null, null, null, null]);
+      }
+      this.data.coordinates[2][3] = null;
+      dm = new DecompositionModel(this.data, this.md_headers, this.metadata);
+
+      ok(isNaN(dm.getCoordinate(2, 3)));
+      equal(dm.getCoordinate(2, 2), -0.287149);
+      ok(isNaN(dm.getConfidenceInterval(4, 0)));
+      equal(dm.hasConfidenceIntervals(), true);
+    });
+
+    /**
+     *
+     * Test the constructor validates the confidence intervals
+     *
+     */
+    test('Test constructor excepts num ci != num ids', function() {
+      var data = this.data, md_headers = this.md_headers,
+          metadata = this.metadata;
+
+      throws(function() {
+        data.ci = [[2, 1, 2, 0, 2, 2, 1, 1]];
+        var dm = new DecompositionModel(data, md_headers, metadata);
+      }, Error, 'An error is raised if there are fewer intervals than samples');
+
+      throws(function() {
+        data.ci = [[2, 1, 2, 0, 2, 2, 1, 1], [0, 1, 1, 0, 0, 1, 2],
+                   [2, 1, 2, 1, 1, 1, 2, 0], [2, 0, 2, 2, 0, 0, 0, 2],
+                   [2, 1, 1, 0, 1, 2, 0, 2], [0, 2, 2, 2, 1, 2, 2, 2],
+                   [0, 0, 2, 0, 2, 0, 0, 2], [1, 2, 0, 0, 2, 0, 0, 1],
+                   [1, 0, 0, 1, 0, 0, 1, 1]];
+        var dm = new DecompositionModel(data, md_headers, metadata);
+      }, Error, 'An error is raised if an interval has too few dimensions');
+    });
+
     /**
      *
      * Tests apply executes the provided function for all the plottables
@@ -1,12 +1,18 @@
 requirejs([
     'jquery',
     'underscore',
+    'three',
     'model',
     'view'
-], function($, _, model, DecompositionView) {
+], function($, _, THREE, model, DecompositionView) {
   $(document).ready(function() {
     var DecompositionModel = model.DecompositionModel;
 
+    // instanced markers store their positions with single precision
+    function float32(values) {
+      return _.toArray(new Float32Array(values));
+    }
+
     module('Decomposition View', {
       setup: function() {
         // setup function
@@ -269,5 +275,207 @@ requirejs([
 
       deepEqual(dv.axesOrientation, [1, -1, 1]);
     });
+
+    test('Test the instancing threshold', function() {
+      var dv = new DecompositionView(this.decomp);
+      equal(dv.instanced, false);
+      equal(dv.markers.length, 2);
+
+      dv = new DecompositionView(this.decomp, true);
+      equal(dv.instanced, true);
+      equal(dv.markers.length, 1);
+      equal(dv.ellipsoids.length, 0);
+    });
+
+    test('Test instanced constructor', function() {
+      var dv = new DecompositionView(this.decomp, true);
+
+      deepEqual(dv.getMarkerPosition(0).toArray(),
+                float32([-0.276542, -0.144964, 0.066647]));
+      deepEqual(dv.getMarkerPosition(1).toArray(),
+                float32([-0.237661, 0.046053, -0.138136]));
+      equal(dv.getVisibleCount(), 2);
+
+      deepEqual(_.toArray(dv._attributes.color.array), [1, 0, 0, 1, 0, 0]);
+      deepEqual(_.toArray(dv._attributes.scale.array), [1, 1, 1, 1, 1, 1]);
+      deepEqual(_.toArray(dv._attributes.opacity.array), [1, 1]);
+      equal(dv.markers[0].geometry.maxInstancedCount, 2);
+    });
+
+    test('Test instanced group setters', function() {
+      var dv = new DecompositionView(this.decomp, true);
+      var group = [dv.decomp.plottable[1]];
+
+      dv.setGroupColor(0x00ff00, group);
+      deepEqual(_.toArray(dv._attributes.color.array), [1, 0, 0, 0, 1, 0]);
+
+      dv.setGroupScale(2, group);
+      deepEqual(_.toArray(dv._attributes.scale.array), [1, 1, 1, 2, 2, 2]);
+
+      dv.setGroupOpacity(0.5, group);
+      deepEqual(_.toArray(dv._attributes.opacity.array), [1, 0.5]);
+      equal(dv.markers[0].material.transparent, true);
+      dv.setGroupOpacity(1, group);
+      equal(dv.markers[0].material.transparent, false);
+
+      dv.setGroupVisibility(false, group);
+      equal(dv.getVisibleCount(), 1);
+      dv.setGroupVisibility(true, group);
+      equal(dv.getVisibleCount(), 2);
+    });
+
+    test('Test group setters', function() {
+      var dv = new DecompositionView(this.decomp);
+      var group = [dv.decomp.plottable[1]];
+
+      dv.setGroupColor(0x00ff00, group);
+      equal(dv.markers[1].material.color.getHex(), 0x00ff00);
+      equal(dv.markers[0].material.color.getHex(), 0xff0000);
+
+      dv.setGroupScale(2, group);
+      deepEqual(dv.markers[1].scale.toArray(), [2, 2, 2]);
+
+      dv.setGroupOpacity(0.5, group);
+      equal(dv.markers[1].material.opacity, 0.5);
+      equal(dv.markers[1].material.transparent, true);
+
+      dv.setGroupVisibility(false, group);
+      equal(dv.getVisibleCount(), 1);
+
+      dv.setGroupShape('Diamond', group);
+      equal(dv.markers[1].geometry.type, 'OctahedronGeometry');
+      equal(dv.markers[0].geometry.type, 'SphereGeometry');
+    });
+
+    test('Test instanced shapes', function() {
+      var dv = new DecompositionView(this.decomp, true);
+      var offset = dv._attributes.offset, geometry = dv.markers[0].geometry;
+
+      // the samples already have this shape
+      dv.setGroupShape('Sphere', [dv.decomp.plottable[1]]);
+      equal(dv.instanced, true);
+      equal(dv.markers[0].geometry, geometry);
+
+      dv.setGroupShape('Diamond', dv.decomp.plottable);
+      equal(dv.instanced, true);
+      equal(dv.markers[0].geometry.parameters.detail, 0);
+      equal(dv.markers[0].geometry.attributes.instanceOffset, offset);
+      equal(dv.markers[0].geometry.maxInstancedCount, 2);
+    });
+
+    test('Test instanced shapes for a subset of the samples', function() {
+      var dv = new DecompositionView(this.decomp, true);
+      var scene = new THREE.Scene(), group = [dv.decomp.plottable[1]], old;
+
+      scene.add(dv.markers[0]);
+      old = dv.markers[0];
+
+      dv.setGroupShape('Diamond', dv.decomp.plottable);
+      dv.setGroupColor(0x00ff00, group);
+      dv.setGroupScale(2, group);
+      dv.setGroupOpacity(0.5, group);
+      dv.setGroupVisibility(false, [dv.decomp.plottable[0]]);
+
+      // each sample is now drawn by its own mesh
+      dv.setGroupShape('Square', group);
+      equal(dv.instanced, false);
+      equal(dv.markers.length, 2);
+      equal(dv.markers[0].geometry.type, 'OctahedronGeometry');
+      equal(dv.markers[1].geometry.type, 'PlaneGeometry');
+
+      deepEqual(dv.markers[0].position.toArray(),
+                float32([-0.276542, -0.144964, 0.066647]));
+      deepEqual(dv.getMarkerPosition(1).toArray(),
+                float32([-0.237661, 0.046053, -0.138136]));
+      equal(dv.markers[0].material.color.getHex(), 0xff0000);
+      equal(dv.markers[1].material.color.getHex(), 0x00ff00);
+      deepEqual(dv.markers[1].scale.toArray(), [2, 2, 2]);
+      equal(dv.markers[0].material.opacity, 1);
+      equal(dv.markers[0].material.transparent, false);
+      equal(dv.markers[1].material.opacity, 0.5);
+      equal(dv.markers[1].material.transparent, true);
+      equal(dv.getVisibleCount(), 1);
+
+      // the meshes are replaced in the scene
+      equal(scene.children.indexOf(old), -1);
+      equal(scene.children.length, 2);
+      ok(scene.children.indexOf(dv.markers[1]) !== -1);
+
+      dv.setGroupColor(0x0000ff, group);
+      equal(dv.markers[1].material.color.getHex(), 0x0000ff);
+    });
+
+    test('Test instanced ellipsoids for a subset of the samples', function() {
+      var dv, radius, ci = [[0.1, 0.2, 0.3, 0.1, 0.1, 0.1, 0.1, 0.1],
+                            [0.3, 0.2, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1]];
+
+      this.decomp = new DecompositionModel(
+        {sample_ids: ['PC.636', 'PC.635'],
+         coordinates: [_.map(_.range(8), function(i) { return i; }),
+                       _.map(_.range(8), function(i) { return -i; })],
+         percents_explained: [20, 20, 20, 10, 10, 10, 5, 5], ci: ci},
+        ['SampleID', 'Treatment'], [['PC.636', 'Control'],
+                                    ['PC.635', 'Fast']]);
+      dv = new DecompositionView(this.decomp, true);
+      dv.setGroupColor(0x00ff00, [dv.decomp.plottable[1]]);
+      dv.setGroupVisibility(false, [dv.decomp.plottable[0]]);
+
+      dv.setGroupShape('Diamond', [dv.decomp.plottable[0]]);
+      equal(dv.ellipsoids.length, 2);
+      equal(dv.ellipsoids[0].geometry.type, 'SphereGeometry');
+      deepEqual(dv.ellipsoids[1].position.toArray(), [-0, -1, -2]);
+      equal(dv.ellipsoids[1].material.color.getHex(), 0x00ff00);
+      equal(dv.ellipsoids[0].visible, false);
+      equal(dv.ellipsoids[1].visible, true);
+
+      radius = dv.ellipsoids[1].geometry.parameters.radius;
+      deepEqual(dv.ellipsoids[1].scale.toArray(),
+                float32([0.3 / radius, 0.2 / radius, 0.1 / radius]));
+    });
+
+    test('Test instanced changeVisibleDimensions and flip', function() {
+      var dv = new DecompositionView(this.decomp, true);
+
+      dv.changeVisibleDimensions([2, 3, 4]);
+      deepEqual(dv.getMarkerPosition(0).toArray(),
+                float32([0.066647, -0.067711, 0.176070]));
+
+      dv.flipVisibleDimension(3);
+      deepEqual(dv.getMarkerPosition(1).toArray(),
+                float32([-0.138136, -0.159061, -0.247485]));
+
+      dv.changeVisibleDimensions([2, 3, null]);
+      deepEqual(dv.getMarkerPosition(1).toArray(),
+                float32([-0.138136, -0.159061, 0]));
+    });
+
+    test('Test instanced raycasting', function() {
+      var dv = new DecompositionView(this.decomp, true), intersects;
+      var raycaster = new THREE.Raycaster(
+        new THREE.Vector3(-0.237661, 0.046053, 10),
+        new THREE.Vector3(0, 0, -1));
+
+      intersects = raycaster.intersectObjects(dv.markers);
+      equal(intersects.length, 1);
+      equal(intersects[0].index, 1);
+      equal(intersects[0].object, dv.markers[0]);
+
+      dv.setGroupVisibility(false, [dv.decomp.plottable[1]]);
+      intersects = raycaster.intersectObjects(dv.markers);
+      equal(intersects.length, 0);
+    });
+
+    test('Test instanced raycasting with other shapes', function() {
+      var dv = new DecompositionView(this.decomp, true), intersects;
+      var raycaster = new THREE.Raycaster(
+        new THREE.Vector3(-0.237661, 0.046053, 10),
+        new THREE.Vector3(0, 0, -1));
+
+      // squares have no radius
+      dv.setGroupShape('Square', dv.decomp.plottable);
+      intersects = raycaster.intersectObjects(dv.markers);
+      equal(intersects.length, 1);
+      equal(intersects[0].index, 1);
+    });
   });
 });
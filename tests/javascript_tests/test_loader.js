@@ -0,0 +1,216 @@
+requirejs(['jquery', 'underscore', 'model', 'loader'],
+           function($, _, model, loader) {
+  var DecompositionModel = model.DecompositionModel;
+  var decodeData = loader.decodeData, workerSource = loader.workerSource,
+      parseData = loader.parseData, loadData = loader.loadData;
+
+  $(document).ready(function() {
+
+    module('Loader', {
+
+      setup: function() {
+        this.decomposition = {
+          'sample_ids': ['PC.636', 'PC.635', 'PC.356'],
+          'coordinates': [[-0.276542, -0.144964, 0.066647],
+                          [-0.237661, 0.046053, -0.138136],
+                          [0.228820, -0.130142, -0.287149]],
+          'axes_names': ['PC1', 'PC2', 'PC3'],
+          'percents_explained': [26.6887048633, 16.2563704022, 13.7754129161],
+          'ci': null,
+          'type': 'ordination'
+        };
+        this.metadata = {
+          'metadata_headers': ['SampleID', 'Treatment', 'DOB'],
+          'metadata': [['PC.636', 'Fast', '20070314'],
+                       ['PC.635', 'Fast', '20071112'],
+                       ['PC.356', 'Control', '20061126']]
+        };
+        this.sources = [
+          {'text': JSON.stringify({'decompositions': [this.decomposition]})},
+          {'text': JSON.stringify(this.metadata)}
+        ];
+      },
+
+      teardown: function() {
+      }
+
+    });
+
+    /**
+     *
+     * Test the embedded data is parsed and merged.
+     *
+     */
+    test('Test parseData', function() {
+      var data = parseData(this.sources), dm;
+
+      deepEqual(data.metadata_headers, ['SampleID', 'Treatment', 'DOB']);
+      deepEqual(data.metadata[2], ['PC.356', 'Control', '20061126']);
+      deepEqual(data.decompositions[0].coordinates[1],
+                [-0.237661, 0.046053, -0.138136]);
+
+      dm = new DecompositionModel(data.decompositions[0],
+                                  data.metadata_headers, data.metadata);
+      equal(dm.length, 3);
+      equal(dm.getCoordinate(2, 1), -0.130142);
+    });
+
+    /**
+     *
+     * Test small embedded plots are loaded synchronously in the main thread.
+     *
+     */
+    test('Test loadData with small embedded data', function() {
+      var messages = [], loaded, failed;
+
+      loadData(this.sources, function(message) {
+        messages.push(message);
+      }, function(data) {
+        loaded = data;
+      }, function(error) {
+        failed = error;
+      });
+
+      equal(failed, undefined);
+      deepEqual(messages, []);
+      deepEqual(loaded.metadata_headers, ['SampleID', 'Treatment', 'DOB']);
+      deepEqual(loaded.decompositions[0].sample_ids,
+                ['PC.636', 'PC.635', 'PC.356']);
+      equal(loaded.metadata.length, 3);
+    });
+
+    /**
+     *
+     * Test data that can't be parsed is reported.
+     *
+     */
+    test('Test loadData with invalid JSON', function() {
+      var loaded, failed;
+
+      this.sources[0].text = '{"decompositions": [NaN]}';
+      loadData(this.sources, function() {}, function(data) {
+        loaded = data;
+      }, function(error) {
+        failed = error;
+      });
+
+      equal(loaded, undefined);
+      notEqual(failed, undefined);
+      ok(failed.message.length > 0);
+    });
+
+    // decoding the data in a worker requires promises
+    if (typeof Promise === 'undefined') {
+      return;
+    }
+
+    /**
+     *
+     * Test the data is decoded and can be used to create a model.
+     *
+     */
+    asyncTest('Test decodeData', function() {
+      var messages = [];
+
+      decodeData(this.sources, function(message) {
+        messages.push(message);
+      }).then(function(data) {
+        var decomp = data.decompositions[0], dm;
+
+        deepEqual(data.metadata_headers, ['SampleID', 'Treatment', 'DOB']);
+        equal(decomp.coordinates, undefined);
+        equal(decomp.ci, undefined);
+        deepEqual(decomp.sample_ids, ['PC.636', 'PC.635', 'PC.356']);
+        equal(decomp.columns.dimensions, 3);
+        equal(decomp.columns.coordinates.length, 9);
+        deepEqual(messages, ['Loading the data', 'Decoding the coordinates',
+                             'Encoding the metadata',
+                             'Computing the axes ranges']);
+
+        dm = new DecompositionModel(decomp, data.metadata_headers);
+        equal(dm.length, 3);
+        equal(dm.getCoordinate(2, 1), -0.130142);
+        deepEqual(dm.getPlottableByID('PC.356').metadata,
+                  ['PC.356', 'Control', '20061126']);
+        deepEqual(dm.dimensionRanges.max, [0.228820, 0.046053, 0.066647]);
+        deepEqual(dm.getUniqueValuesByCategory('Treatment'),
+                  ['Fast', 'Control']);
+        equal(dm.hasConfidenceIntervals(), false);
+
+        start(); // qunit
+      });
+    });
+
+    /**
+     *
+     * Test errors in the data reject the promise.
+     *
+     */
+    asyncTest('Test decodeData with invalid data', function() {
+      this.metadata.metadata.pop();
+      this.sources[1] = {'text': JSON.stringify(this.metadata)};
+
+      decodeData(this.sources, function() {}).then(function() {
+        ok(false, 'The data should not be decoded');
+        start(); // qunit
+      }).catch(function(error) {
+        ok(/The number of metadata rows/.test(error.message));
+        start(); // qunit
+      });
+    });
+
+    /**
+     *
+     * Test the worker's source code by running it with a mock global scope.
+     *
+     */
+    asyncTest('Test workerSource', function() {
+      var messages = [], transfers = [], worker = {};
+
+      worker.postMessage = function(message, transfer) {
+        messages.push(message);
+        transfers.push(transfer);
+
+        if (message.result !== undefined) {
+          equal(messages.length, 5);
+          equal(messages[0].progress, 'Loading the data');
+          equal(message.result.decompositions[0].columns.dimensions, 3);
+
+          // the coordinates and each metadata column can be transferred
+          equal(transfers[4].length, 5);
+          ok(transfers[4].indexOf(
+             message.result.decompositions[0].columns.coordinates.buffer) !==
+             -1);
+          start(); // qunit
+        }
+      };
+
+      new Function('self', workerSource())(worker);
+      worker.onmessage({'data': this.sources});
+    });
+
+    /**
+     *
+     * Test errors are reported by the worker.
+     *
+     */
+    asyncTest('Test workerSource with invalid data', function() {
+      var worker = {};
+
+      worker.postMessage = function(message) {
+        if (message.progress === undefined) {
+          ok(/Coordinates are required/.test(message.error));
+          start(); // qunit
+        }
+      };
+
+      delete this.decomposition.coordinates;
+      this.sources[0] = {
+        'text': JSON.stringify({'decompositions': [this.decomposition]})
+      };
+
+      new Function('self', workerSource())(worker);
+      worker.onmessage({'data': this.sources});
+    });
+  });
+});
@@ -142,6 +142,29 @@ requirejs([
       spv.control.dispose();
     });
 
+    test('Test checkUpdate only adds new tubes', function() {
+      var renderer = new THREE.SVGRenderer({antialias: true});
+      var spv = new ScenePlotView3D(renderer, this.sharedDecompositionViewDict,
+                                    'fooligans', 0, 0, 20, 20);
+      var tube = new THREE.Mesh(), other = new THREE.Mesh();
+
+      spv.decViews.scatter.tubes = [tube];
+      spv.checkUpdate();
+      equal(tube.parent, spv.scene);
+
+      // the same tubes are not added again on every poll
+      spv.scene.remove(tube);
+      spv.checkUpdate();
+      equal(tube.parent, null);
+
+      spv.decViews.scatter.tubes = [other];
+      spv.checkUpdate();
+      equal(other.parent, spv.scene);
+
+      // release the control back to the main page
+      spv.control.dispose();
+    });
+
     test('Test checkUpdate background color', function() {
       // We will use SVGRenderer here and in the other tests as we cannot use
       // WebGLRenderer and test with phantom.js
@@ -481,6 +504,31 @@ requirejs([
      * Test the render method for ScenePlotView3D
      *
      */
+    test('Test render only rotates markers with the camera', function() {
+      var renderer = new THREE.SVGRenderer({antialias: true});
+      var spv = new ScenePlotView3D(renderer, this.sharedDecompositionViewDict,
+                                    'fooligans', 0, 0, 20, 20);
+      var marker = spv.decViews.scatter.markers[0];
+
+      // the SVGRenderer can't render the scene, see the test below
+      spv.renderer = {setViewport: function() {}, render: function() {}};
+
+      spv.render();
+      deepEqual(marker.quaternion.toArray(), spv.camera.quaternion.toArray());
+
+      // markers are left alone when the camera doesn't rotate
+      marker.quaternion.set(0, 0, 0, 1);
+      spv.render();
+      deepEqual(marker.quaternion.toArray(), [0, 0, 0, 1]);
+
+      spv.camera.rotation.set(0.5, 0.2, 0);
+      spv.render();
+      deepEqual(marker.quaternion.toArray(), spv.camera.quaternion.toArray());
+
+      // release the control back to the main page
+      spv.control.dispose();
+    });
+
     test('Test render', function(assert) {
 
       var renderer = new THREE.SVGRenderer({antialias: true});
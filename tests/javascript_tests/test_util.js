@@ -158,6 +158,36 @@ requirejs(['jquery', 'underscore', 'util'], function($, _, util) {
       deepEqual(split.nonNumeric, ['0.0.0', 'boaty']);
     });
 
+    test('Test decodeFloat32Array', function() {
+      // [1, 2, 3, -4.5] as little-endian float32
+      var values = util.decodeFloat32Array({dtype: 'float32', shape: [2, 2],
+                                            data: 'AACAPwAAAEAAAEBAAACQwA=='});
+
+      ok(values instanceof Float32Array);
+      deepEqual(_.toArray(values), [1, 2, 3, -4.5]);
+
+      values = util.decodeFloat32Array({dtype: 'float32', shape: [0, 3],
+                                        data: ''});
+      equal(values.length, 0);
+    });
+
+    test('Test decodeFloat32Matrix', function() {
+      // [[1, 2], [3, -4.5]] as little-endian float32
+      var rows = util.decodeFloat32Matrix({dtype: 'float32', shape: [2, 2],
+                                           data: 'AACAPwAAAEAAAEBAAACQwA=='});
+
+      equal(rows.length, 2);
+      deepEqual(_.toArray(rows[0]), [1, 2]);
+      deepEqual(_.toArray(rows[1]), [3, -4.5]);
+
+      // all rows share the same buffer
+      equal(rows[0].buffer, rows[1].buffer);
+
+      rows = util.decodeFloat32Matrix({dtype: 'float32', shape: [0, 3],
+                                       data: ''});
+      deepEqual(rows, []);
+    });
+
     test('Test regular expressions are escaped correctly', function() {
       equal(escapeRegularExpression('some.sample.id'), 'some\\.sample\\.id');
       equal(escapeRegularExpression('some-sample.id'), 'some\\-sample\\.id');
@@ -165,5 +195,51 @@ requirejs(['jquery', 'underscore', 'util'], function($, _, util) {
                                     's/\\.\\*\\?ome\\.sample\\.id');
     });
 
+    // fetching files requires promises
+    if (typeof Promise === 'undefined') {
+      return;
+    }
+
+    asyncTest('Test fetchJSON without fetch', function() {
+      var original = window.fetch;
+
+      window.fetch = undefined;
+      util.fetchJSON('data.json.gz').then(function() {
+        ok(false, 'The file should not be fetched');
+        start(); // qunit
+      }, function(error) {
+        ok(/cannot fetch data\.json\.gz/.test(error.message));
+        start(); // qunit
+      });
+      window.fetch = original;
+    });
+
+    asyncTest('Test fetchJSON without DecompressionStream', function() {
+      var fetch = window.fetch, decompress = window.DecompressionStream;
+
+      function restore() {
+        window.fetch = fetch;
+        window.DecompressionStream = decompress;
+      }
+
+      window.DecompressionStream = undefined;
+      window.fetch = function(url) {
+        return Promise.resolve({'ok': true, 'arrayBuffer': function() {
+          // gzip header
+          return Promise.resolve(new Uint8Array([0x1f, 0x8b, 8, 0]).buffer);
+        }});
+      };
+
+      util.fetchJSON('data.json.gz').then(function() {
+        restore();
+        ok(false, 'The file should not be decompressed');
+        start(); // qunit
+      }, function(error) {
+        restore();
+        ok(/cannot decompress data\.json\.gz/.test(error.message));
+        start(); // qunit
+      });
+    });
+
   });
 });
@@ -8,12 +8,36 @@
 from __future__ import division
 
 from unittest import TestCase, main
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+try:
+    # accepts the native strings written in Python 2
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 from numpy import array
 from numpy.testing import assert_almost_equal
+from scipy.sparse import csr_matrix, issparse
 
 from emperor.util import EmperorUnsupportedComputation
-from emperor.biplots import extract_taxa_data, preprocess_otu_table
+from emperor.biplots import (extract_taxa_data, preprocess_otu_table,
+                             write_biplot_scores, _most_prevalent)
+from emperor.qiime_backports.biplots import make_biplot_scores_output
+
+
+class MockTable(object):
+    """The parts of the biom.Table interface used by preprocess_otu_table"""
+
+    def __init__(self, sample_ids, matrix_data):
+        self._sample_ids = array(sample_ids)
+        self.matrix_data = matrix_data
+
+    def ids(self, axis='sample'):
+        if axis != 'sample':
+            raise ValueError('Only the sample identifiers are available')
+        return self._sample_ids
 
 
 class TopLevelTests(TestCase):
@@ -256,6 +280,75 @@ class TopLevelTests(TestCase):
         self.assertEqual(o_prevalence, [])
         self.assertEqual(lines, '')
 
+    def test_preprocess_otu_table_top_n(self):
+        """Projecting only the N most prevalent taxa matches projecting all"""
+        full = preprocess_otu_table(self.otu_sample_ids, self.otu_table,
+                                    self.lineages, self.coords,
+                                    self.coords_header, 0)
+
+        for n in range(1, 9):
+            top = preprocess_otu_table(self.otu_sample_ids, self.otu_table,
+                                       self.lineages, self.coords,
+                                       self.coords_header, n)
+            assert_almost_equal(top[0], full[0][:n])
+            assert_almost_equal(top[1], full[1][:n])
+            self.assertEqual(top[2], full[2][:n])
+            assert_almost_equal(top[3], full[3][:n])
+
+    def test_most_prevalent_ties(self):
+        """Ties at the cutoff are resolved the same way for every N"""
+        prevalence = array([0.5, 0.2, 0.5, 0.7, 0.5, 0.2])
+
+        self.assertEqual(_most_prevalent(prevalence).tolist(),
+                         [3, 4, 2, 0, 5, 1])
+        self.assertEqual(_most_prevalent(prevalence, 2).tolist(), [3, 4])
+        self.assertEqual(_most_prevalent(prevalence, 3).tolist(), [3, 4, 2])
+        self.assertEqual(_most_prevalent(prevalence, 5).tolist(),
+                         [3, 4, 2, 0, 5])
+        self.assertEqual(_most_prevalent(prevalence, 10).tolist(),
+                         [3, 4, 2, 0, 5, 1])
+
+    def test_preprocess_otu_table_sparse(self):
+        """Sparse tables match the results of the dense tables"""
+        dense = preprocess_otu_table(self.otu_sample_ids, self.otu_table,
+                                     self.lineages, self.coords,
+                                     self.coords_header, 4)
+        sparse = preprocess_otu_table(self.otu_sample_ids,
+                                      csr_matrix(self.otu_table),
+                                      self.lineages, self.coords,
+                                      self.coords_header, 4)
+
+        assert_almost_equal(sparse[0], dense[0])
+        self.assertTrue(issparse(sparse[1]))
+        assert_almost_equal(sparse[1].toarray(), dense[1])
+        self.assertEqual(sparse[2], dense[2])
+        assert_almost_equal(sparse[3], dense[3])
+        self.assertEqual(len(sparse[4].split('\n')), 5)
+
+    def test_preprocess_otu_table_biom_table(self):
+        """biom.Table objects are processed with their sample identifiers"""
+        dense = preprocess_otu_table(self.otu_sample_ids, self.otu_table,
+                                     self.lineages, self.coords,
+                                     self.coords_header, 4)
+
+        # the samples in the table are in a different order
+        table = MockTable(self.otu_sample_ids[::-1],
+                          csr_matrix(self.otu_table[:, ::-1]))
+
+        for ids in [None, self.otu_sample_ids[::-1]]:
+            obs = preprocess_otu_table(ids, table, self.lineages, self.coords,
+                                       self.coords_header, 4)
+
+            assert_almost_equal(obs[0], dense[0])
+            self.assertTrue(issparse(obs[1]))
+            assert_almost_equal(obs[1].toarray(), dense[1])
+            self.assertEqual(obs[2], dense[2])
+            assert_almost_equal(obs[3], dense[3])
+
+        with self.assertRaises(ValueError):
+            preprocess_otu_table(self.otu_sample_ids, table, self.lineages,
+                                 self.coords, self.coords_header, 4)
+
     def test_preprocess_otu_table_exceptions(self):
         """Check the exceptions are raised appropriately"""
         # should raise an exception because the inputs contain a single row
@@ -280,6 +373,46 @@ class TopLevelTests(TestCase):
                     self.lineages_broken, self.coords,
                     self.coords_header, 4)
 
+    def test_write_biplot_scores(self):
+        """Scores are written in chunks, in the legacy line format"""
+        expected = '\n'.join(make_biplot_scores_output(
+            {'coord': self.biplot_coords, 'lineages': self.lineages})) + '\n'
+
+        for chunk_size in [1, 3, 8, 10000]:
+            fp = StringIO()
+            write_biplot_scores(fp, self.biplot_coords, self.lineages,
+                                chunk_size)
+            self.assertEqual(fp.getvalue(), expected)
+
+    def test_write_biplot_scores_format(self):
+        """Scores are written with 12 significant digits"""
+        fp = StringIO()
+        write_biplot_scores(fp, [[1 / 3, -2e-20, 1.0], [0.5, 10, -0.25]],
+                            ['k__Bacteria', 'k__Archaea'], 1)
+        self.assertEqual(fp.getvalue(), '#Taxon\tpc1\tpc2\tpc3\n'
+                                        'k__Bacteria\t0.333333333333\t'
+                                        '-2e-20\t1\n'
+                                        'k__Archaea\t0.5\t10\t-0.25\n')
+
+    def test_write_biplot_scores_path(self):
+        directory = mkdtemp()
+        try:
+            path = join(directory, 'biplot.txt')
+            write_biplot_scores(path, self.biplot_coords, self.lineages)
+
+            with open(path) as f:
+                self.assertEqual(f.read().split('\n')[:-1],
+                                 make_biplot_scores_output(
+                                     {'coord': self.biplot_coords,
+                                      'lineages': self.lineages}))
+        finally:
+            rmtree(directory)
+
+    def test_write_biplot_scores_bad_chunk_size(self):
+        with self.assertRaises(ValueError):
+            write_biplot_scores(StringIO(), self.biplot_coords,
+                                self.lineages, 0)
+
 
 OTU_TABLE = ''.join([
     '\t'.join(['Taxon', 'PC.636', 'PC.635',
@@ -9,16 +9,22 @@ from __future__ import division
 
 from unittest import TestCase, main
 from copy import deepcopy
-from os.path import exists
+from os import listdir
+from os.path import exists, join
 from shutil import rmtree
+from tempfile import mkdtemp
 from io import StringIO
+from base64 import b64decode
+import gzip
+import json
 from skbio import OrdinationResults
 from jinja2 import Template
 
 import pandas as pd
 import numpy as np
 
-from emperor.core import Emperor
+from emperor.core import Emperor, set_template_bytecode_cache
+from emperor import core
 
 # account for what's allowed in python 2 vs PY3K
 try:
@@ -154,6 +160,48 @@ class TopLevelTests(TestCase):
         self.assertTrue(isinstance(obs, Template))
         self.assertTrue(obs.filename.endswith('/standalone-template.html'))
 
+    def test_get_template_cached(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        self.assertTrue(emp._get_template(False) is emp._get_template(False))
+        self.assertTrue(emp._get_template(True) is emp._get_template(True))
+        self.assertTrue(emp._get_template(True) is not
+                        emp._get_template(False))
+
+        # the cache is shared across objects
+        other = Emperor(self.ord_res, self.mf, remote=self.url)
+        self.assertTrue(emp._get_template(True) is other._get_template(True))
+
+    def test_get_template_modified(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+        obs = emp._get_template(False)
+
+        # pretend the template files were modified after being compiled
+        mtimes, template = core._TEMPLATE_CACHE[False]
+        core._TEMPLATE_CACHE[False] = ((0, 0, 0), template)
+
+        exp = emp._get_template(False)
+        self.assertTrue(obs is not exp)
+        self.assertTrue(exp.filename.endswith('/jupyter-template.html'))
+        self.assertEqual(core._TEMPLATE_CACHE[False][0], mtimes)
+
+    def test_set_template_bytecode_cache(self):
+        directory = mkdtemp()
+        self.files_to_remove.append(directory)
+
+        set_template_bytecode_cache(directory)
+        try:
+            emp = Emperor(self.ord_res, self.mf, remote=self.url)
+            self.assertEqual(core._TEMPLATE_CACHE, {})
+
+            obs = str(emp)
+            self.assertTrue(len(listdir(directory)) > 0)
+        finally:
+            set_template_bytecode_cache(None)
+
+        self.assertEqual(tcs.HTML_STRING, obs)
+        self.assertTrue(core._BYTECODE_CACHE is None)
+
     def test_formatting(self):
         emp = Emperor(self.ord_res, self.mf, remote=self.url)
 
@@ -181,6 +229,126 @@ class TopLevelTests(TestCase):
                                   obs.split('\n'))
         self.assertEqual(tcs.STANDALONE_HTML_STRING, obs)
 
+    def test_formatting_standalone_data_dir(self):
+        directory = mkdtemp()
+        self.files_to_remove.append(directory)
+
+        emp = Emperor(self.ord_res, self.mf, remote='./some-local-path/')
+        obs = emp.make_emperor(standalone=True, data_dir=directory)
+
+        files = sorted(listdir(directory))
+        self.assertEqual(len(files), 2)
+        self.assertTrue(files[0].startswith('decomposition-'))
+        self.assertTrue(files[1].startswith('metadata-'))
+
+        # the data is not inlined, only the file names
+        self.assertTrue(files[0] in obs)
+        self.assertTrue(files[1] in obs)
+        self.assertTrue('Fasting_mouse_I.D._636' not in obs)
+        self.assertTrue("{'url': files['decomposition']}" in obs)
+
+        with gzip.open(join(directory, files[0]), 'rb') as f:
+            decomposition = json.loads(f.read().decode('utf-8'))
+        with gzip.open(join(directory, files[1]), 'rb') as f:
+            metadata = json.loads(f.read().decode('utf-8'))
+
+        decomposition = decomposition['decompositions'][0]
+        self.assertEqual(decomposition['sample_ids'],
+                         ['PC.636', 'PC.635', 'PC.356', 'PC.481', 'PC.354',
+                          'PC.593', 'PC.355', 'PC.607', 'PC.634'])
+        np.testing.assert_array_almost_equal(decomposition['coordinates'],
+                                             self.expected_coords)
+        self.assertEqual(decomposition['axes_names'], [0, 1, 2, 3, 4])
+        self.assertTrue(decomposition['ci'] is None)
+
+        self.assertEqual(metadata['metadata_headers'],
+                         ['SampleID', 'Treatment', 'DOB', 'Description'])
+        self.assertEqual(metadata['metadata'], self.expected_metadata)
+
+    def test_formatting_standalone_data_dir_shared_metadata(self):
+        directory = mkdtemp()
+        self.files_to_remove.append(directory)
+
+        Emperor(self.ord_res, self.mf,
+                remote='./').make_emperor(standalone=True, data_dir=directory)
+        Emperor(self.jackknifed[0], self.mf,
+                remote='./').make_emperor(standalone=True, data_dir=directory)
+
+        files = listdir(directory)
+        self.assertEqual(len(files), 3)
+        self.assertEqual(len([f for f in files if f.startswith('metadata')]),
+                         1)
+
+    def test_formatting_data_dir_not_standalone(self):
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        with self.assertRaises(ValueError):
+            emp.make_emperor(data_dir='./')
+
+    def test_write_emperor(self):
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        obs = StringIO()
+        emp.write_emperor(obs)
+
+        self.assertEqual(tcs.HTML_STRING, obs.getvalue())
+
+    def test_write_emperor_non_ascii(self):
+        self.mf.loc['PC.354', 'Treatment'] = u'Contr\u00f4l'
+        self.mf.loc['PC.355', 'Description'] = u'\u6771\u4eac'
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        np.random.seed(111)
+        exp = emp.make_emperor(standalone=True)
+
+        np.random.seed(111)
+        obs = StringIO()
+        emp.write_emperor(obs, standalone=True, chunk_size=2)
+
+        self.assertEqual(exp, obs.getvalue())
+        self.assertTrue(u'"PC.354", "Contr\\u00f4l"' in exp)
+        self.assertTrue(u'"\\u6771\\u4eac"' in exp)
+
+    def test_write_emperor_standalone_chunked(self):
+        emp = Emperor(self.ord_res, self.mf, remote='./some-local-path/')
+
+        # a chunk size that doesn't divide the number of samples
+        obs = StringIO()
+        emp.write_emperor(obs, standalone=True, chunk_size=2)
+
+        self.assertEqual(tcs.STANDALONE_HTML_STRING, obs.getvalue())
+
+    def test_write_emperor_jackknifed(self):
+        emp = Emperor(self.ord_res, self.mf, remote=self.url,
+                      jackknifed=self.jackknifed)
+
+        np.random.seed(111)
+        exp = emp.make_emperor(custom_axes=['DOB'])
+
+        np.random.seed(111)
+        obs = StringIO()
+        emp.write_emperor(obs, custom_axes=['DOB'], chunk_size=4)
+
+        self.assertEqual(exp, obs.getvalue())
+
+    def test_write_emperor_path(self):
+        directory = mkdtemp()
+        self.files_to_remove.append(directory)
+
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        path = join(directory, 'index.html')
+        emp.write_emperor(path)
+
+        with open(path) as f:
+            self.assertEqual(tcs.HTML_STRING, f.read())
+
+    def test_write_emperor_bad_chunk_size(self):
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        with self.assertRaises(ValueError):
+            emp.write_emperor(StringIO(), chunk_size=0)
+
     def test_remote_url(self):
         emp = Emperor(self.ord_res, self.mf, remote=False)
         self.assertEqual(emp.base_url, "/nbextensions/emperor/support_files")
@@ -249,6 +417,90 @@ class TopLevelTests(TestCase):
         self.assertEqual(metadata, self.expected_metadata)
         self.assertEqual(names, [0, 1, 2, 3, 4])
 
+    def test_process_data_binary_coords(self):
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        coord_ids, coords, pct_var, ci, headers, metadata, names = \
+            emp._process_data([], 'IQR', binary_coords=True)
+
+        self.assertEqual(coords['dtype'], 'float32')
+        self.assertEqual(coords['shape'], [9, 5])
+
+        obs = np.frombuffer(b64decode(coords['data']), dtype='<f4')
+        np.testing.assert_array_almost_equal(obs.reshape(9, 5),
+                                             self.expected_coords)
+
+        self.assertTrue(ci is None)
+        self.assertEqual(metadata, self.expected_metadata)
+        self.assertEqual(names, [0, 1, 2, 3, 4])
+
+    def test_process_jackknifed_data_binary_coords(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False,
+                      jackknifed=self.jackknifed)
+
+        _, exp_coords, _, exp_ci, _, _, _ = emp._process_data([], 'IQR')
+        _, coords, _, ci, _, _, _ = emp._process_data([], 'IQR', True)
+
+        obs = np.frombuffer(b64decode(coords['data']), dtype='<f4')
+        np.testing.assert_array_almost_equal(obs.reshape(coords['shape']),
+                                             exp_coords)
+
+        self.assertEqual(ci['shape'], [9, 5])
+        obs = np.frombuffer(b64decode(ci['data']), dtype='<f4')
+        np.testing.assert_array_almost_equal(obs.reshape(ci['shape']),
+                                             exp_ci)
+
+    def test_formatting_non_finite_ranges(self):
+        # ideal fourths are undefined for less than three replicates
+        emp = Emperor(self.ord_res, self.mf, remote=self.url,
+                      jackknifed=self.jackknifed[:1])
+
+        obs = emp.make_emperor(jackknifing_method='ideal_fourths')
+
+        self.assertTrue('NaN' not in obs)
+        self.assertTrue('"ci": [[null, null, null, null, null], ' in obs)
+
+    def test_formatting_binary_coords(self):
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        obs = emp.make_emperor(binary_coords=True)
+
+        self.assertTrue('"coordinates": {"data": ' in obs)
+        self.assertTrue('"dtype": "float32"' in obs)
+        self.assertTrue('"ci": null' in obs)
+
+    def test_process_data_columnar_metadata(self):
+        emp = Emperor(self.ord_res, self.mf, remote=self.url)
+
+        coord_ids, coords, pct_var, ci, headers, metadata, names = \
+            emp._process_data([], 'IQR', columnar_metadata=True)
+
+        self.assertEqual(headers, ['SampleID', 'Treatment', 'DOB',
+                         'Description'])
+        np.testing.assert_array_almost_equal(coords, self.expected_coords)
+
+        self.assertEqual(len(metadata['codes']), 4)
+        obs = [[metadata['values'][metadata['codes'][j][i]]
+                for j in range(4)] for i in range(9)]
+        self.assertEqual(obs, self.expected_metadata)
+
+        # Control, Fast and the six dates
+        self.assertEqual(len(metadata['values']), 9 + 2 + 6 + 9)
+
+    def test_process_data_columnar_metadata_custom_axes(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        _, exp_coords, _, _, _, exp_metadata, _ = \
+            emp._process_data(['DOB'], 'IQR')
+        _, coords, _, _, headers, metadata, names = \
+            emp._process_data(['DOB'], 'IQR', columnar_metadata=True)
+
+        np.testing.assert_array_almost_equal(coords, exp_coords)
+        obs = [[metadata['values'][metadata['codes'][j][i]]
+                for j in range(4)] for i in range(9)]
+        self.assertEqual(obs, exp_metadata)
+        self.assertEqual(names, ['DOB', 0, 1, 2, 3, 4])
+
     def test_process_data_custom_axes(self):
         emp = Emperor(self.ord_res, self.mf, remote=False)
 
@@ -299,6 +551,133 @@ class TopLevelTests(TestCase):
         self.assertEqual(metadata, self.expected_metadata)
         self.assertEqual(names, ['DOB', 0, 1, 2, 3, 4])
 
+    def test_process_arrays_engines(self):
+        for jackknifed in [None, self.jackknifed]:
+            for custom_axes in [[], ['DOB']]:
+                for method in ['IQR', 'sdev']:
+                    emp = Emperor(self.ord_res, self.mf, remote=False,
+                                  jackknifed=jackknifed)
+                    headers, mf = emp._prepare_map(custom_axes)
+
+                    exp = emp._process_arrays_legacy(headers, mf,
+                                                     custom_axes, method)
+                    obs = emp._process_arrays_native(headers, mf,
+                                                     custom_axes, method)
+
+                    self.assertEqual(obs[0].tolist(), exp[0].tolist())
+                    for o, e in zip(obs[1:], exp[1:]):
+                        if e is None:
+                            self.assertTrue(o is None)
+                        else:
+                            np.testing.assert_array_equal(o, e)
+
+    def test_process_data_custom_axes_repeated_ids(self):
+        # repeated samples are processed with the legacy engine
+        samples = pd.concat([self.ord_res.samples,
+                             self.ord_res.samples.iloc[:2]])
+        ord_res = OrdinationResults(eigvals=self.ord_res.eigvals,
+                                    samples=samples,
+                                    proportion_explained=self.ord_res.
+                                    proportion_explained,
+                                    short_method_name='PCoA',
+                                    long_method_name='Principal Coordinates '
+                                                     'Analysis')
+        emp = Emperor(ord_res, self.mf, remote=False)
+
+        coord_ids, coords, _, _, _, metadata, names = \
+            emp._process_data(['DOB'], 'IQR')
+
+        self.assertEqual(coord_ids[-2:], ['PC.636', 'PC.635'])
+        self.assertEqual(len(coords), 11)
+        self.assertEqual(coords[-2][0], coords[0][0])
+        self.assertEqual(metadata[-2:], metadata[:2])
+        self.assertEqual(names, ['DOB', 0, 1, 2, 3, 4])
+
+    def test_process_data_cached(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        exp = emp._process_data(['DOB'], 'IQR')
+        arrays = emp._processed_arrays
+
+        obs = emp._process_data(['DOB'], 'IQR')
+        self.assertEqual(obs, exp)
+        self.assertTrue(emp._processed_arrays is arrays)
+
+        # the results belong to the caller, changing them doesn't change the
+        # cached arrays
+        self.assertFalse(obs is exp)
+        obs[0][0] = 'PC.000'
+        obs[1][0][0] = -100
+        obs[2][0] = -100
+        obs[4].append('Other')
+        obs[5][0][0] = 'PC.000'
+        obs[6].append('PC6')
+        self.assertEqual(emp._process_data(['DOB'], 'IQR'), exp)
+
+        # the encodings share the arrays
+        binary = emp._process_data(['DOB'], 'IQR', binary_coords=True)
+        self.assertTrue(emp._processed_arrays is arrays)
+        self.assertEqual(binary[0], exp[0])
+
+        # only the arrays for the last arguments are kept
+        obs = emp._process_data([], 'IQR')
+        self.assertFalse(emp._processed_arrays is arrays)
+        self.assertEqual(emp._processed_arrays[0], (5, (), 'IQR'))
+        self.assertEqual(len(obs[1][0]), 5)
+
+        emp.dimensions = 3
+        obs = emp._process_data(['DOB'], 'IQR')
+        self.assertEqual(emp._processed_arrays[0], (3, ('DOB',), 'IQR'))
+        self.assertEqual(len(obs[1][0]), 4)
+
+    def test_process_data_cached_chunks(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        exp = emp._process_data([], 'IQR')
+        arrays = emp._processed_arrays
+        obs = emp._process_data([], 'IQR', chunk_size=5)
+
+        self.assertEqual(sum(list(obs[1]), []), exp[1])
+        self.assertEqual(sum(list(obs[5]), []), exp[5])
+
+        # generators are created from the cached arrays every time
+        obs = emp._process_data([], 'IQR', chunk_size=5)
+        self.assertEqual(sum(list(obs[1]), []), exp[1])
+        self.assertTrue(emp._processed_arrays is arrays)
+
+    def test_process_data_cache_invalidated(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        exp = emp._process_data([], 'IQR')
+
+        emp.mf = emp.mf.assign(Treatment='Other')
+        obs = emp._process_data([], 'IQR')
+        self.assertFalse(obs is exp)
+        self.assertEqual(obs[5][0][1], 'Other')
+
+        emp.ordination = self.jackknifed[0]
+        exp, obs = obs, emp._process_data([], 'IQR')
+        self.assertFalse(obs is exp)
+        self.assertTrue(all(c >= 0 for row in obs[1] for c in row))
+
+        emp.jackknifed = self.jackknifed[1:]
+        exp, obs = obs, emp._process_data([], 'IQR')
+        self.assertFalse(obs is exp)
+        self.assertTrue(obs[3] is not None)
+
+    def test_make_emperor_after_settings_reuses_data(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        first = emp.make_emperor()
+        arrays = emp._processed_arrays
+
+        emp.set_background_color('white')
+        second = emp.make_emperor()
+
+        self.assertTrue(emp._processed_arrays is arrays)
+        self.assertNotEqual(first, second)
+        self.assertTrue('"backgroundColor": "white"' in second)
+
     def test_custom_axes_missing_headers(self):
         emp = Emperor(self.ord_res, self.mf, remote=False)
 
@@ -381,10 +760,72 @@ class TopLevelTests(TestCase):
         with self.assertRaises(TypeError):
             Emperor(self.ord_res, self.mf, jackknifed=self.jackknifed + [1])
 
+    def test_jackknifed_aligned_not_copied(self):
+        exp = [j.samples for j in self.jackknifed]
+
+        emp = Emperor(self.ord_res, self.mf, jackknifed=self.jackknifed)
+
+        for e, j in zip(exp, emp.jackknifed):
+            self.assertTrue(j.samples is e)
+
+    def test_jackknifed_alignment(self):
+        exp = [j.samples.copy() for j in self.jackknifed]
+
+        # two replicates share an ordering, and the third one has another
+        order = self.ord_res.samples.index[::-1]
+        self.jackknifed[0].samples = self.jackknifed[0].samples.loc[order]
+        self.jackknifed[1].samples = self.jackknifed[1].samples.loc[order]
+        self.jackknifed[2].samples = \
+            self.jackknifed[2].samples.sort_index()
+
+        emp = Emperor(self.ord_res, self.mf, jackknifed=self.jackknifed)
+
+        for e, j in zip(exp, emp.jackknifed):
+            pd.testing.assert_frame_equal(j.samples, e)
+
+    def test_jackknifed_bad_data_extra_sample_ids(self):
+        samples = self.jackknifed[1].samples
+        self.jackknifed[1].samples = pd.concat([samples, samples.iloc[:1]])
+
+        with self.assertRaises(ValueError) as context:
+            Emperor(self.ord_res, self.mf, jackknifed=self.jackknifed)
+        self.assertEqual(str(context.exception), 'The ordination at index (1) '
+                         'has duplicated samples: PC.636.')
+
     def test_jackknifed_bad_data_sample_ids(self):
         self.jackknifed[0].samples.index = pd.Series(list('abcdefghi'))
-        with self.assertRaises(ValueError):
+        with self.assertRaises(ValueError) as context:
+            Emperor(self.ord_res, self.mf, jackknifed=self.jackknifed)
+        self.assertEqual(str(context.exception), 'The ordination at index (0) '
+                         'does not represent the exact same samples. '
+                         'Mismatches are: PC.354, PC.355, PC.356, PC.481, '
+                         'PC.593, PC.607, PC.634, PC.635, PC.636, a, b, c, d, '
+                         'e, f, g, h, i.')
+
+    def test_jackknifed_bad_data_numeric_sample_ids(self):
+        self.ord_res.samples.index = pd.Index(range(9))
+        self.mf.index = pd.Index(range(9))
+        for j in self.jackknifed:
+            j.samples.index = pd.Index(range(9))
+        self.jackknifed[0].samples.index = pd.Index(range(1, 10))
+
+        with self.assertRaises(ValueError) as context:
             Emperor(self.ord_res, self.mf, jackknifed=self.jackknifed)
+        self.assertEqual(str(context.exception), 'The ordination at index (0) '
+                         'does not represent the exact same samples. '
+                         'Mismatches are: 0, 9.')
+
+    def test_jackknifed_bad_data_mixed_sample_ids(self):
+        # sorting a mix of str and int would fail in Python 3
+        ids = self.jackknifed[0].samples.index.tolist()
+        self.jackknifed[0].samples.index = pd.Index(ids[:-1] + [1],
+                                                    dtype=object)
+
+        with self.assertRaises(ValueError) as context:
+            Emperor(self.ord_res, self.mf, jackknifed=self.jackknifed)
+        self.assertEqual(str(context.exception), 'The ordination at index (0) '
+                         'does not represent the exact same samples. '
+                         'Mismatches are: 1, %s.' % ids[-1])
 
 
 class EmperorSettingsTests(TestCase):
@@ -415,6 +856,46 @@ class EmperorSettingsTests(TestCase):
         obs = emp._base_data_checks('DOB', data, str)
         self.assertEqual(obs, data)
 
+    def test_category_index(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        values, codes, counts = emp._category_index('Treatment')
+
+        # the metadata is in the same order as the ordination
+        self.assertEqual(values.tolist(), ['Fast', 'Control'])
+        self.assertEqual(codes.tolist(), [0, 0, 1, 1, 1, 1, 1, 0, 0])
+        self.assertEqual(counts.tolist(), [4, 5])
+
+        # the index is shared until the metadata is replaced
+        self.assertTrue(emp._category_index('Treatment')[0] is values)
+        emp.mf = emp.mf.assign(Treatment='Other')
+        values, codes, counts = emp._category_index('Treatment')
+        self.assertEqual(values.tolist(), ['Other'])
+        self.assertEqual(counts.tolist(), [9])
+
+    def test_category_index_missing_values(self):
+        self.mf.loc['PC.354', 'Treatment'] = np.nan
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        values, codes, counts = emp._category_index('Treatment')
+
+        self.assertEqual(values.tolist(), ['Fast', 'Control'])
+        self.assertEqual(codes[4], -1)
+        self.assertEqual(counts.tolist(), [4, 4])
+
+    def test_base_data_checks_shared_index(self):
+        emp = Emperor(self.ord_res, self.mf, remote=False)
+
+        emp.color_by('Treatment', {'Control': '#ff0000', 'Fast': '#00ff00'})
+        values = emp._category_index('Treatment')[0]
+
+        emp.shape_by('Treatment', {'Control': 'Sphere', 'Fast': 'Cube'})
+        emp.visibility_by('Treatment', ['Control'])
+
+        self.assertTrue(emp._category_index('Treatment')[0] is values)
+        self.assertEqual(emp.settings['visibility']['data'],
+                         {'Control': True, 'Fast': False})
+
     def test_base_data_checks_with_data_series(self):
         emp = Emperor(self.ord_res, self.mf, remote=False)
         exp = {'20061126': '#ff00ff', '20061218': '#ff0000',
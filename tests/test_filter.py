@@ -58,6 +58,31 @@ class TopLevelTests(TestCase):
         assert_almost_equal(out_coords, array([[-0.3, 0.04, -0.1, 0.15],
                                                [0.04, -0.01, 0.06, -0.34]]))
 
+    def test_filter_samples_from_coords_lists(self):
+        """Check it filters lists of coordinates and non-string ids"""
+        out_headers, out_coords = \
+            filter_samples_from_coords([3, 1, 2], [[1.0, 2.0], [3.0, 4.0],
+                                                   [5.0, 6.0]], set([1, 2]))
+        self.assertEqual(out_headers, [1, 2])
+        assert_almost_equal(out_coords, array([[3.0, 4.0], [5.0, 6.0]]))
+
+        # the result is not a view of the input
+        out_coords[0, 0] = 100
+        assert_almost_equal(self.coords_data[0], COORDS_DATA[0])
+
+    def test_remove_samples_from_pcoa_data_different_orders(self):
+        """Check each jackknifed replicate is filtered using its own order"""
+        headers = [['1', '2', '3'], ['3', '2', '1'], ['1', '2', '3']]
+        coords = [self.jk_coords_data[0], self.jk_coords_data[0][::-1],
+                  self.jk_coords_data[1]]
+
+        out_headers, out_coords = keep_samples_from_pcoa_data(headers, coords,
+                                                              ['1', '3'])
+        self.assertEqual(out_headers, [['1', '3'], ['3', '1'], ['1', '3']])
+        assert_almost_equal(out_coords[0], out_coords[1][::-1])
+        assert_almost_equal(out_coords[2], array([[-1.4, 0.05, 1.3],
+                                                  [0.14, 2.00, -1.11]]))
+
     def test_remove_samples_from_pcoa_data(self):
         """ """
         # check it keeps the requested samples
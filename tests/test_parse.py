@@ -8,8 +8,10 @@
 from __future__ import division
 
 from unittest import TestCase, main
-from tempfile import mkstemp
+from tempfile import mkstemp, mkdtemp
 from os import close
+from os.path import join, dirname, abspath
+from shutil import rmtree
 try:
     from StringIO import StringIO
 except ImportError:
@@ -18,11 +20,18 @@ except ImportError:
 import numpy as np
 import numpy.testing as npt
 
-from emperor.parse import parse_coords
+from emperor.parse import parse_coords, parse_jackknifed_coords
 
 
 class ParseTests(TestCase):
 
+    def setUp(self):
+        self.dirs_to_delete = []
+
+    def tearDown(self):
+        for path in self.dirs_to_delete:
+            rmtree(path, ignore_errors=True)
+
     def test_parse_coords_ordination_results(self):
         """parse_coords should handle skbio's OrdinationResults file"""
         coords = StringIO(ordination_results_file)
@@ -52,6 +61,22 @@ class ParseTests(TestCase):
         npt.assert_almost_equal(obs[2], exp[2])
         npt.assert_almost_equal(obs[3], exp[3])
 
+    def test_parse_coords_qiime_lines(self):
+        """parse_coords should handle old qiime PCoA coords lines"""
+        obs = parse_coords(qiime_pcoa_file.splitlines())
+        self.assertEqual(obs[0], ['A', 'B', 'C'])
+        npt.assert_almost_equal(obs[1], np.array([[.11, .09, .23],
+                                                  [.03, .07, -.26],
+                                                  [.12, .06, -.32]]))
+
+    def test_parse_coords_qiime_rewinds(self):
+        """Detecting the qiime format shouldn't consume the first line"""
+        coords = StringIO('\n' + qiime_pcoa_file)
+        coords.readline()
+
+        obs = parse_coords(coords)
+        self.assertEqual(obs[0], ['A', 'B', 'C'])
+
     def test_parse_coords_qiime_file(self):
         """parse_coords should handle old qiime PCoA coords file"""
         fd, fp = mkstemp()
@@ -73,6 +98,76 @@ class ParseTests(TestCase):
         npt.assert_almost_equal(obs[2], exp[2])
         npt.assert_almost_equal(obs[3], exp[3])
 
+    def _write_coords_dir(self, contents):
+        dir_path = mkdtemp()
+        self.dirs_to_delete.append(dir_path)
+
+        for i, content in enumerate(contents):
+            with open(join(dir_path, 'coords_%d.txt' % i), 'w') as f:
+                f.write(content)
+        return dir_path
+
+    def test_parse_jackknifed_coords(self):
+        dir_path = join(dirname(abspath(__file__)), 'scripts_test_data',
+                        'make_emperor', 'unweighted_unifrac_pc')
+
+        obs = parse_jackknifed_coords(dir_path)
+        exp = parse_jackknifed_coords(dir_path, processes=1)
+
+        self.assertEqual(len(obs), 10)
+        for o, e in zip(obs, exp):
+            self.assertEqual(o.samples.index.tolist(),
+                             obs[0].samples.index.tolist())
+            npt.assert_almost_equal(o.samples.values, e.samples.values)
+            npt.assert_almost_equal(o.eigvals.values, e.eigvals.values)
+
+    def test_parse_jackknifed_coords_aligned(self):
+        shuffled = qiime_pcoa_file.replace('A\t0.11\t0.09\t0.23\n', '')
+        shuffled = shuffled.replace('C\t0.12\t0.06\t-0.32\n',
+                                    'C\t0.12\t0.06\t-0.32\n'
+                                    'A\t0.11\t0.09\t0.23\n')
+        dir_path = self._write_coords_dir([ordination_results_file,
+                                           shuffled])
+
+        obs = parse_jackknifed_coords(dir_path, processes=1)
+
+        self.assertEqual(obs[1].samples.index.tolist(), ['A', 'B', 'C'])
+        for ores in obs:
+            npt.assert_almost_equal(ores.samples.values,
+                                    [[.11, .09, .23], [.03, .07, -.26],
+                                     [.12, .06, -.32]])
+            npt.assert_almost_equal(ores.proportion_explained.values,
+                                    [0.143, 0.052, 0.043])
+
+    def test_parse_jackknifed_coords_mismatched_samples(self):
+        missing = qiime_pcoa_file.replace('A\t0.11\t0.09\t0.23\n', '')
+        dir_path = self._write_coords_dir([ordination_results_file,
+                                           missing])
+
+        with self.assertRaises(ValueError):
+            parse_jackknifed_coords(dir_path, processes=1)
+
+    def test_parse_jackknifed_coords_duplicated_samples(self):
+        duplicated = qiime_pcoa_file.replace('C\t0.12\t0.06\t-0.32\n',
+                                             'C\t0.12\t0.06\t-0.32\n'
+                                             'A\t0.12\t0.06\t-0.32\n')
+
+        # the same samples, but one of them twice
+        for contents in [[ordination_results_file, duplicated],
+                         [duplicated, ordination_results_file]]:
+            dir_path = self._write_coords_dir(contents)
+
+            with self.assertRaises(ValueError) as context:
+                parse_jackknifed_coords(dir_path, processes=1)
+            self.assertTrue(str(context.exception).endswith(
+                'have duplicated sample identifiers: A'))
+
+    def test_parse_jackknifed_coords_no_files(self):
+        dir_path = self._write_coords_dir([])
+
+        with self.assertRaises(ValueError):
+            parse_jackknifed_coords(dir_path)
+
 
 ordination_results_file = u"""Eigvals\t3
 4.94\t1.79\t1.50
@@ -17,6 +17,7 @@ import numpy as np
 from os import system
 from unittest import TestCase, main
 from numpy.testing import assert_almost_equal, assert_array_almost_equal
+from scipy.sparse import csr_matrix, csc_matrix
 
 class BiplotTests(TestCase):
     
@@ -58,6 +59,24 @@ class BiplotTests(TestCase):
         # self.assertFloatEqual(res, np.array([3,4,5])/12) # if no normalize
         assert_almost_equal(res, [0,.5,1])
 
+    def test_get_taxa_coords_sparse(self):
+        """sparse tables give the same coords as dense tables"""
+        otu_table = np.array([  [2,0,0,1],
+                                [1,1,1,1],
+                                [0,2,2,1]],float)
+        coords = np.array([[.4,.1],[.2,.3],[.1,.5],[.9,.7]])
+        res = bp.get_taxa_coords(csr_matrix(otu_table), coords)
+        self.assertTrue(isinstance(res, np.ndarray))
+        assert_almost_equal(res, bp.get_taxa_coords(otu_table, coords))
+
+    def test_get_taxa_prevalence_sparse(self):
+        """sparse tables give the same prevalence as dense tables"""
+        otu_table = np.array([  [2,0,0,1],
+                                [1,1,1,1],
+                                [0,0,0,0]],float)
+        res = bp.get_taxa_prevalence(csc_matrix(otu_table))
+        assert_almost_equal(res, bp.get_taxa_prevalence(otu_table))
+
 
     def test_make_biplot_scores_output(self):
         """make_biplot_scores_output correctly formats biplot scores"""
@@ -61,6 +61,29 @@ class TopLevelTests(TestCase):
                            [30,50,0.080504323,-0.212014503,-0.088353435]])
         assert_almost_equal(coords[1],exp)
 
+    def test_get_custom_coords_order_and_nans(self):
+        """get_custom_coords: Uses the coords order and nans for non-numbers"""
+        mapping = [["Sample-ID", "Height", "Weight"],
+                   ["Sample3", "30", "x"],
+                   ["Sample1", "10", "60"],
+                   ["Sample2", "20", "55"],
+                   ["Sample1", "15", "65"]]
+        coords = [self.coord_header, self.coords]
+        get_custom_coords(['Weight', 'Height'], mapping, coords)
+        exp = array([[60, 10, -0.219044992, 0.079674486, 0.09233683],
+                     [55, 20, -0.042258081, 0.000204041, 0.024837603],
+                     [nan, 30, 0.080504323, -0.212014503, -0.088353435]])
+        assert_almost_equal(coords[1], exp)
+
+    def test_get_custom_coords_missing_samples(self):
+        """get_custom_coords: Fails when samples are not in the mapping"""
+        coords = [self.coord_header, self.coords]
+        with self.assertRaises(ValueError):
+            get_custom_coords(['Height'], self.mapping2[:3], coords)
+
+        with self.assertRaises(ValueError):
+            get_custom_coords(['Age'], self.mapping2, coords)
+
     def test_scale_custom_coords(self):
         """scale_custom_coords: \
         Scales custom coordinates to match min/max of PC1"""
@@ -136,6 +136,35 @@ eigvals\t4.94\t1.79\t1.50
         self.assertEqual(obs[0], exp[0])
         assert_almost_equal(obs[1], exp[1])
 
+    def test_parse_coords_irregular_lines(self):
+        """parse_coords should handle spacing, odd labels and empty tables"""
+        coords = """pc vector number\t1\t2\t3
+ A#1 \t 0.11\t0.09\t0.23\t
+10\t0.03\t0.07\t-0.26\t\r
+
+NA\t0.12\t0.06\t-0.32\t
+
+
+eigvals\t4.94\t1.79\t1.50
+% variation explained\t14.3\t5.2\t4.3
+""".splitlines(True)
+        obs = parse_coords(coords)
+        self.assertEqual(obs[0], ['A#1', '10', 'NA'])
+        assert_almost_equal(obs[1],
+            array([[.11,.09,.23],[.03,.07,-.26],[.12,.06,-.32]]))
+        assert_almost_equal(obs[2], array([4.94,1.79,1.50]))
+        assert_almost_equal(obs[3], array([14.3,5.2,4.3]))
+
+        obs = parse_coords(['pc vector number\t1', '', 'eigvals\t1',
+                            '% variation explained\t100'])
+        self.assertEqual(obs[0], [])
+        self.assertEqual(obs[1].size, 0)
+
+        # ragged tables can't be parsed
+        with self.assertRaises(ValueError):
+            parse_coords(['pc vector number\t1\t2', 'A\t1\t2', 'B\t1',
+                          'eigvals\t1\t2', '% variation explained\t9\t1'])
+
     def test_parse_coords_exceptions(self):
         """Check exceptions are raised accordingly with missing information"""
 
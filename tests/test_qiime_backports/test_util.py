@@ -15,8 +15,9 @@ __status__ = "Development"
 
 
 from unittest import TestCase, main
+from tempfile import gettempdir
 
-from numpy.testing import assert_almost_equal
+from numpy.testing import assert_almost_equal, assert_allclose
 from numpy import array, isnan, asarray, arange
 from builtins import chr as py_unichr
 
@@ -41,6 +42,20 @@ class TopLevelTests(TestCase):
         new_matrix = _flip_vectors(jn_matrix, m_matrix)
         assert_almost_equal(new_matrix, array([[1.2, 0.1, 1.2], [2.5, 4.0, 4.5]]))
 
+    def test_flip_vectors_stacked(self):
+        """_flip_vectors flips a stack of matrices like individual matrices"""
+        m_matrix = array([[1.0, 0.0, 1.0], [2.0, 4.0, 4.0]])
+        jn_matrices = array([[[1.2, 0.1, -1.2], [2.5, 4.0, -4.5]],
+                             [[-1.2, -0.1, 1.2], [-2.5, -4.0, 4.5]],
+                             [[1.0, 0.0, 1.0], [2.0, 4.0, 4.0]]])
+        new_matrices = _flip_vectors(jn_matrices, m_matrix)
+        self.assertEqual(new_matrices.shape, (3, 2, 3))
+        for jn_matrix, new_matrix in zip(jn_matrices, new_matrices):
+            assert_almost_equal(new_matrix, _flip_vectors(jn_matrix,
+                                                          m_matrix))
+        assert_almost_equal(new_matrices[1],
+                            array([[1.2, 0.1, 1.2], [2.5, 4.0, 4.5]]))
+
     def test_compute_jn_pcoa_avg_ranges(self):
         """_compute_jn_pcoa_avg_ranges works
         """
@@ -61,10 +76,78 @@ class TopLevelTests(TestCase):
         avg_matrix, low_matrix, high_matrix = _compute_jn_pcoa_avg_ranges(\
                 jn_flipped_matrices, 'sdev')
         x = array([m[0,0] for m in jn_flipped_matrices])
-        self.assertEqual(x.mean(),avg_matrix[0,0])
-        self.assertEqual(-x.std(ddof=1)/2,low_matrix[0,0])
-        self.assertEqual(x.std(ddof=1)/2,high_matrix[0,0])
+        assert_allclose(avg_matrix[0,0], x.mean())
+        assert_allclose(low_matrix[0,0], -x.std(ddof=1)/2)
+        assert_allclose(high_matrix[0,0], x.std(ddof=1)/2)
         
+    def test_compute_jn_pcoa_avg_ranges_blocks(self):
+        """_compute_jn_pcoa_avg_ranges is the same regardless of block size
+        """
+        jn_flipped_matrices = array([[[2.0, 4.0], [-1.2, -0.1], [0.3, 1.0]],
+                                     [[3.0, 4.1], [-1.1, -0.2], [0.2, 1.2]],
+                                     [[4.0, 3.9], [-1.5, -0.3], [0.4, 0.9]],
+                                     [[1.0, 4.2], [-1.0, 0.0], [0.1, 1.1]]])
+        for method in ['IQR', 'ideal_fourths', 'sdev']:
+            exp = _compute_jn_pcoa_avg_ranges(list(jn_flipped_matrices),
+                                              method)
+            obs = _compute_jn_pcoa_avg_ranges(jn_flipped_matrices, method,
+                                              block_size=2)
+            for e, o in zip(exp, obs):
+                assert_almost_equal(o, e)
+
+        avg_matrix, low_matrix, high_matrix = _compute_jn_pcoa_avg_ranges(
+            jn_flipped_matrices, 'IQR', block_size=1)
+        assert_almost_equal(low_matrix[0, 0], 1.5)
+        assert_almost_equal(high_matrix[0, 0], 3.5)
+
+    def test_compute_jn_pcoa_avg_ranges_unknown_method(self):
+        """_compute_jn_pcoa_avg_ranges fails with an unknown method"""
+        with self.assertRaises(ValueError):
+            _compute_jn_pcoa_avg_ranges([array([[1.0]]), array([[2.0]])],
+                                        'range')
+
+    def test_summarize_pcoas_memmap(self):
+        """summarize_pcoas with a memory-mapped stack of replicates works
+        """
+        master_pcoa = [['1', '2', '3'],
+            array([[-1.0, 0.0, 1.0], [2.0, 4.0, -4.0], [0.5, 1.0, 2.0]]),
+            array([.76, .24, .1])]
+        support_pcoas = [[['1', '2', '3'],
+            array([[1.2, 0.1, -1.2], [-2.5, -4.0, 4.5], [-0.4, -1.1, -2.1]]),
+            array([0.80, .20, .1])],
+            [['1', '2', '3'],
+            array([[-1.4, 0.05, 1.3], [2.6, 4.1, -4.7], [0.6, 0.9, 2.2]]),
+            array([0.76, .24, .1])],
+            [['1', '2', '3'],
+            array([[-1.5, 0.05, 1.6], [2.4, 4.0, -4.8], [0.4, 1.2, 1.8]]),
+            array([0.84, .16, .1])]]
+
+        for method in ['IQR', 'ideal_fourths', 'sdev']:
+            for apply_procrustes in [True, False]:
+                exp = summarize_pcoas(master_pcoa, support_pcoas, method,
+                                      apply_procrustes)
+                # a generator is consumed only once
+                obs = summarize_pcoas(master_pcoa,
+                                      (pcoa for pcoa in support_pcoas),
+                                      method, apply_procrustes,
+                                      memmap_dir=gettempdir(), block_size=2)
+                for e, o in zip(exp[:4], obs[:4]):
+                    assert_almost_equal(o, e)
+                self.assertEqual(obs[4], ['1', '2', '3'])
+
+    def test_summarize_pcoas_no_replicates(self):
+        """summarize_pcoas fails without support pcoas
+        """
+        master_pcoa = [['1', '2'], array([[-1.0, 0.0], [2.0, 4.0]]),
+                       array([.76, .24])]
+
+        for memmap_dir in [None, gettempdir()]:
+            with self.assertRaises(ValueError):
+                summarize_pcoas(master_pcoa, [], memmap_dir=memmap_dir)
+            with self.assertRaises(ValueError):
+                summarize_pcoas(master_pcoa, iter([]), 'sdev', False,
+                                memmap_dir=memmap_dir)
+
     def test_summarize_pcoas(self):
         """summarize_pcoas works
         """
@@ -114,9 +197,9 @@ class TopLevelTests(TestCase):
                             apply_procrustes=True)
 
         x = array([m1[0,0],m2[0,0],m3[0,0],m4[0,0]])
-        self.assertEqual(x.mean(),matrix_average[0,0])
-        self.assertEqual(-x.std(ddof=1)/2,matrix_low[0,0])
-        self.assertEqual(x.std(ddof=1)/2,matrix_high[0,0])
+        assert_allclose(matrix_average[0,0], x.mean())
+        assert_allclose(matrix_low[0,0], -x.std(ddof=1)/2)
+        assert_allclose(matrix_high[0,0], x.std(ddof=1)/2)
 
     def test_IQR(self):
         "IQR returns the interquartile range for list x"
@@ -11,6 +11,7 @@ from unittest import TestCase, main
 
 from numpy import array
 from numpy.testing import assert_almost_equal
+from scipy.sparse import csr_matrix, issparse
 
 from emperor.sort import (sort_taxa_table_by_pcoa_coords,
                           sort_comparison_filenames)
@@ -133,6 +134,32 @@ class TopLevelTests(TestCase):
              [0., 0.01333333, 0.],
              [0.14765101, 0.02666667, 0.16107383]]))
 
+    def test_sort_taxa_table_by_pcoa_coords_missing_samples(self):
+        """Samples missing from the OTU table are skipped"""
+        o_headers, o_otu_table = sort_taxa_table_by_pcoa_coords(
+            ['PC.354', 'PC.XXX', 'PC.635'], self.otu_table, self.otu_headers)
+        self.assertEqual(o_headers, ['PC.354', 'PC.635'])
+        assert_almost_equal(o_otu_table[:, 1], [0.04697987, 0.02013423,
+                                                0.27516779, 0.02013423,
+                                                0.45637584, 0.02013423,
+                                                0., 0.16107383])
+
+        o_headers, o_otu_table = sort_taxa_table_by_pcoa_coords(
+            ['PC.XXX'], self.otu_table, self.otu_headers)
+        self.assertEqual(o_headers, [])
+        self.assertEqual(o_otu_table.shape, (8, 0))
+
+    def test_sort_taxa_table_by_pcoa_coords_sparse(self):
+        """Sparse OTU tables are sorted without being densified"""
+        o_headers, o_otu_table = sort_taxa_table_by_pcoa_coords(
+            self.coords_header, csr_matrix(self.otu_table), self.otu_headers)
+
+        self.assertTrue(issparse(o_otu_table))
+        self.assertEqual(o_headers, ['PC.354', 'PC.356', 'PC.481', 'PC.593',
+                                     'PC.355', 'PC.607', 'PC.634', 'PC.636',
+                                     'PC.635'])
+        assert_almost_equal(o_otu_table.toarray(), OTU_TABLE_A)
+
     def test_sort_comparison_filenames_regular(self):
         """Check filenames are sorted correctly"""
 
@@ -10,20 +10,29 @@ from __future__ import division
 from unittest import TestCase, main
 from os.path import exists, join, abspath, dirname
 from shutil import rmtree
-from tempfile import gettempdir
+from tempfile import gettempdir, mkdtemp
+from base64 import b64decode
+from os import listdir
+import gzip
+import json
 
 import pandas as pd
 import warnings
-from numpy import array
+from numpy import array, frombuffer, arange, float64, nan
+from jinja2 import Template
 from numpy.testing import assert_almost_equal
 
+import emperor.util
 from emperor.util import (keep_columns_from_mapping_file,
                           preprocess_mapping_file, preprocess_coords_file,
                           EmperorInputFilesError,
                           fill_mapping_field_from_mapping_file,
                           sanitize_mapping_file, guess_coordinates_files,
                           nbinstall, validate_and_process_custom_axes,
-                          resolve_stable_url, EmperorWarning)
+                          resolve_stable_url, encode_float32_array,
+                          dictionary_encode_metadata, stringify_metadata,
+                          write_compressed_json, iter_row_chunks,
+                          json_chunks, strict_json_dumps, EmperorWarning)
 
 
 warnings.simplefilter('always', category=EmperorWarning)
@@ -593,6 +602,196 @@ class TopLevelTests(TestCase):
             self.assertTrue(issubclass(w[-1].category, EmperorWarning))
             self.assertEqual(obs, url % 'new-api')
 
+    def test_encode_float32_array(self):
+        obs = encode_float32_array([[1, 2], [3, -4.5]])
+        exp = {'dtype': 'float32', 'shape': [2, 2],
+               'data': 'AACAPwAAAEAAAEBAAACQwA=='}
+        self.assertEqual(obs, exp)
+
+    def test_encode_float32_array_roundtrip(self):
+        data = array([[0.1, -0.2, 0.3], [1e-7, 2.5, -1e4]])
+        obs = encode_float32_array(data)
+
+        self.assertEqual(obs['shape'], [2, 3])
+        decoded = frombuffer(b64decode(obs['data']), dtype='<f4')
+        assert_almost_equal(decoded.reshape(obs['shape']), data, decimal=6)
+
+    def test_stringify_metadata(self):
+        mf = pd.DataFrame(data=[['Control', 20061218, 1.5, True],
+                                ['Fast', 20061218, None, False]],
+                          columns=['Treatment', 'DOB', 'Weight', 'Alive'],
+                          index=pd.Index(['PC.354', 'PC.355'],
+                                         name='SampleID'))
+        obs = stringify_metadata(mf).tolist()
+        exp = [['PC.354', 'Control', '20061218', '1.5', 'True'],
+               ['PC.355', 'Fast', '20061218', 'nan', 'False']]
+        self.assertEqual(obs, exp)
+
+    def test_stringify_metadata_numeric_upcast(self):
+        # when all columns are numeric, integers are upcast like in a row
+        mf = pd.DataFrame(data=[[1, 1.5], [2, 0.25]], columns=['a', 'b'],
+                          index=[10, 11])
+        obs = stringify_metadata(mf).tolist()
+        exp = [['10', '1.0', '1.5'], ['11', '2.0', '0.25']]
+        self.assertEqual(obs, exp)
+
+        exp = mf.apply(lambda x: [str(x.name)] + x.astype('str').tolist(),
+                       axis=1).values.tolist()
+        self.assertEqual(obs, exp)
+
+    def test_stringify_metadata_no_columns(self):
+        mf = pd.DataFrame(index=['a', 'b'])
+        self.assertEqual(stringify_metadata(mf).tolist(), [['a'], ['b']])
+
+    def test_dictionary_encode_metadata(self):
+        mf = pd.DataFrame(data=[['Control', 20061218], ['Fast', 20061218],
+                                ['Control', 20070314]],
+                          columns=['Treatment', 'DOB'],
+                          index=pd.Index(['PC.354', 'PC.355', 'PC.356'],
+                                         name='SampleID'))
+        obs = dictionary_encode_metadata(mf)
+        exp = {'values': ['PC.354', 'PC.355', 'PC.356', 'Control', 'Fast',
+                          '20061218', '20070314'],
+               'codes': [[0, 1, 2], [3, 4, 3], [5, 5, 6]]}
+        self.assertEqual(obs, exp)
+
+    def test_dictionary_encode_metadata_shared_values(self):
+        mf = pd.DataFrame(data=[['a', 'b'], ['b', 'a']], columns=['x', 'y'],
+                          index=['a', 'c'])
+        obs = dictionary_encode_metadata(mf)
+        exp = {'values': ['a', 'c', 'b'],
+               'codes': [[0, 1], [0, 2], [2, 0]]}
+        self.assertEqual(obs, exp)
+
+    def test_dictionary_encode_metadata_no_columns(self):
+        mf = pd.DataFrame(index=['a', 'c'])
+        obs = dictionary_encode_metadata(mf)
+        self.assertEqual(obs, {'values': ['a', 'c'], 'codes': [[0, 1]]})
+
+    def test_write_compressed_json(self):
+        directory = mkdtemp()
+        self.files_to_delete.append(directory)
+
+        data = {'metadata_headers': ['SampleID', 'Treatment'],
+                'metadata': [['PC.354', 'Control'], ['PC.355', 'Fast']]}
+        obs = write_compressed_json(data, directory, 'metadata')
+
+        self.assertTrue(obs.startswith('metadata-'))
+        self.assertTrue(obs.endswith('.json.gz'))
+        with gzip.open(join(directory, obs), 'rb') as f:
+            self.assertEqual(json.loads(f.read().decode('utf-8')), data)
+
+        # the same data is written only once
+        self.assertEqual(write_compressed_json(data, directory, 'metadata'),
+                         obs)
+        self.assertEqual(listdir(directory), [obs])
+
+        data['metadata'][1][1] = 'Control'
+        self.assertNotEqual(write_compressed_json(data, directory,
+                                                  'metadata'), obs)
+        self.assertEqual(len(listdir(directory)), 2)
+
+    def test_write_compressed_json_interrupted(self):
+        directory = mkdtemp()
+        self.files_to_delete.append(directory)
+        data = {'metadata_headers': ['SampleID'], 'metadata': [['PC.354']]}
+
+        class InterruptedGzipFile(gzip.GzipFile):
+            def write(self, data):
+                raise KeyboardInterrupt()
+
+        original = emperor.util.gzip.GzipFile
+        emperor.util.gzip.GzipFile = InterruptedGzipFile
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                write_compressed_json(data, directory, 'metadata')
+        finally:
+            emperor.util.gzip.GzipFile = original
+
+        # neither a truncated nor a temporary file are left behind
+        self.assertEqual(listdir(directory), [])
+
+        obs = write_compressed_json(data, directory, 'metadata')
+        with gzip.open(join(directory, obs), 'rb') as f:
+            self.assertEqual(json.loads(f.read().decode('utf-8')), data)
+
+    def test_write_compressed_json_non_finite(self):
+        directory = mkdtemp()
+        self.files_to_delete.append(directory)
+
+        obs = write_compressed_json({'ci': [[float('nan'), 1.0]]}, directory,
+                                    'decomposition')
+        with gzip.open(join(directory, obs), 'rb') as f:
+            self.assertEqual(f.read().decode('utf-8'), '{"ci":[[null,1.0]]}')
+
+    def test_iter_row_chunks(self):
+        obs = list(iter_row_chunks(list(range(5)), 2))
+        self.assertEqual(obs, [[0, 1], [2, 3], [4]])
+
+        obs = list(iter_row_chunks(arange(6).reshape(3, 2), 3))
+        self.assertEqual(len(obs), 1)
+        self.assertEqual(obs[0].tolist(), [[0, 1], [2, 3], [4, 5]])
+
+        df = pd.DataFrame([[1], [2], [3]], index=[10, 20, 30])
+        obs = list(iter_row_chunks(df, 2))
+        self.assertEqual([c.index.tolist() for c in obs], [[10, 20], [30]])
+
+        self.assertEqual(list(iter_row_chunks([], 2)), [])
+
+    def test_iter_row_chunks_bad_size(self):
+        with self.assertRaises(ValueError):
+            list(iter_row_chunks([1, 2], 0))
+
+    def test_json_chunks(self):
+        template = Template('{{ value | tojson }}')
+
+        data = [['PC.354', '<b>'], ['PC.355', "it's"], ['PC.356', '&']]
+        exp = template.render(value=data)
+
+        self.assertEqual(''.join(json_chunks(data)), exp)
+
+        obs = list(json_chunks(c for c in iter_row_chunks(data, 2)))
+        self.assertEqual(len(obs), 4)
+        self.assertEqual(''.join(obs), exp)
+
+        for value in [None, {'b': 1, 'a': [1.5]}, []]:
+            self.assertEqual(''.join(json_chunks(value)),
+                             template.render(value=value))
+
+    def test_json_chunks_non_ascii(self):
+        template = Template('{{ value | tojson }}')
+
+        data = [['PC.354', u'G\u00fcemes'], ['PC.355', u'\u6771\u4eac']]
+        exp = template.render(value=data)
+
+        self.assertEqual(u''.join(json_chunks(data)), exp)
+        self.assertEqual(u''.join(json_chunks(c for c in
+                                              iter_row_chunks(data, 1))),
+                         exp)
+
+    def test_json_chunks_empty_generator(self):
+        self.assertEqual(''.join(json_chunks(c for c in [[], []])), '[]')
+
+    def test_json_chunks_non_finite(self):
+        data = [[0.5, float('nan')], [float('inf'), -float('inf')]]
+
+        self.assertEqual(''.join(json_chunks(data)),
+                         '[[0.5, null], [null, null]]')
+        self.assertEqual(''.join(json_chunks(c for c in
+                                             iter_row_chunks(data, 1))),
+                         '[[0.5, null], [null, null]]')
+
+    def test_strict_json_dumps(self):
+        self.assertEqual(strict_json_dumps({'b': [1.5, 2], 'a': 'x'},
+                                           sort_keys=True),
+                         '{"a": "x", "b": [1.5, 2]}')
+
+        data = {'ci': [[nan, 1.0], (float64('inf'), 2)], 'name': 'PC1'}
+        obs = strict_json_dumps(data, sort_keys=True)
+        self.assertEqual(obs, '{"ci": [[null, 1.0], [null, 2]], '
+                              '"name": "PC1"}')
+        self.assertEqual(json.loads(obs)['ci'][0], [None, 1.0])
+
 
 MAPPING_FILE_DATA = [
     ['PC.354', 'AGCACGAGCCTA', 'YATGCTGCCTCCCGTAGGAGT', 'Control', '20061218',